@@ -173,6 +173,92 @@ LOGIN_REDIRECT_URL = '/'
 # Not: Eğer logout yapıldığında ana sayfaya yönlendirmek isterseniz:
 LOGOUT_REDIRECT_URL = '/'
 
+# ----------------------------------------------------------------------
+# FATURA NUMARALANDIRMA
+# ----------------------------------------------------------------------
+# True: her yıl için ayrı seri (2025000001, 2025000002, ...)
+# False: tek genel seri (100000, 100001, ...)
+INVOICE_NUMBER_SERIES_PER_YEAR = False
+
+# Toplu fatura PDF'leri web sürecinde üretilmez; admin işi sıraya yazar. Sıradaki işler zamanlanmış
+# görevle işlenir (örn. her dakika): python manage.py process_invoice_batches
+# Toplu faturalamada aynı anda üretilecek PDF sayısı. wkhtmltopdf iş parçacıklarıyla, süreç içi
+# motorlar (xhtml2pdf, reportlab) ayrı Python süreçleriyle paralel çalıştırılır.
+INVOICE_PDF_WORKERS = 4
+# Bu kadar saniye ilerleme kaydetmeyen (İşleniyor) toplu fatura işi yarıda kalmış sayılır ve
+# process_invoice_batches'in bir sonraki çalışmasında yeniden başlatılır (görev süreci durduğunda vb.)
+INVOICE_BATCH_STALE_AFTER = 5 * 60
+
+# ----------------------------------------------------------------------
+# PDF MOTORLARI
+# ----------------------------------------------------------------------
+# Belge bazında PDF motoru: 'wkhtmltopdf' (harici program), 'xhtml2pdf' veya 'reportlab' (süreç içi)
+# Karşılaştırma için: python manage.py benchmark_pdf_engines
+PDF_ENGINES = {
+    'invoice': 'wkhtmltopdf',
+    'order': 'xhtml2pdf',
+    'production_list': 'xhtml2pdf',
+}
+
+# reportlab motoru için Türkçe karakter destekli TTF font (boş bırakılırsa DejaVu Sans aranır)
+PDF_FONT_PATH = None
+
+# ----------------------------------------------------------------------
+# KURYE UYGULAMASI SENKRONİZASYONU
+# ----------------------------------------------------------------------
+# Silinme izleri bu kadar gün saklanır; daha eski imleçle gelen istemci tam listeyi yeniden indirir.
+# Temizlik için: python manage.py prune_delivery_tombstones
+COURIER_SYNC_TOMBSTONE_RETENTION_DAYS = 30
+# Değişiklik zamanı (auto_now) commit'ten önce yazılır; daha erken damgalı bir satır daha geç commit
+# edilebilir. Bu yüzden her senkronizasyon imleçten bu kadar saniye öncesinden başlar (istemci
+# satırları id ile günceller, tekrar gelen satırlar sorun olmaz). En uzun yazma işleminden uzun olmalı.
+COURIER_SYNC_OVERLAP_SECONDS = 30
+
+# ----------------------------------------------------------------------
+# ÖNBELLEK
+# ----------------------------------------------------------------------
+# Bayi fiyat listeleri, ürün ağaçları, çevrim grafı ve ayarlar sürüm anahtarıyla önbelleklenir
+# (management/cache_versions.py). Bir süreçteki değişikliğin (yeni sürüm) diğer çalışan süreçlere de
+# ulaşması için önbellek paylaşımlı olmalıdır: FileBasedCache aynı sunucudaki süreçler için yeterlidir,
+# birden fazla sunucuda Redis/Memcached backend'i verilmelidir. Sürüm artırılmaz (incr atomik
+# olmayabilir), her değişiklikte yeni zaman damgası yazılır; anahtarın temizlenmesi (MAX_ENTRIES)
+# eski kayıtları geri getirmez.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# ----------------------------------------------------------------------
+# KÂR HESABI
+# ----------------------------------------------------------------------
+# True: aylık kârdan satılan malın maliyeti de düşülür (teslim edilen miktar x reçete birim maliyeti).
+# Hammadde alımları zaten 'Hammadde' gideri olarak giriliyorsa False kalmalı (çift sayım olur).
+PROFIT_DEDUCT_COST_OF_GOODS = False
+
+# ----------------------------------------------------------------------
+# BİRİM ÇEVRİM GRAFI ÖNBELLEĞİ (get_conversion_graph)
+# ----------------------------------------------------------------------
+# Her süreç çevrim grafını bellekte tutar; paylaşılan önbellekteki sürümü en fazla bu kadar
+# saniyede bir kontrol eder (admin'de değiştirilen çevrimin diğer süreçlere ulaşma süresi).
+UNIT_CONVERSION_CHECK_INTERVAL = 5
+# Sürüm artışı kaçırılsa bile graf en geç bu kadar saniyede veritabanından yeniden okunur.
+UNIT_CONVERSION_MAX_AGE = 5 * 60
+
+# ----------------------------------------------------------------------
+# SİPARİŞ AYARI ÖNBELLEĞİ (OrderConfiguration.get_solo)
+# ----------------------------------------------------------------------
+# Her süreç ayarı bellekte tutar; paylaşılan önbellekteki sürümü en fazla bu kadar saniyede bir
+# kontrol eder (admin'de sipariş alımı kapatılınca diğer süreçlere ulaşma süresi).
+ORDER_CONFIGURATION_CHECK_INTERVAL = 5
+# Sürüm artışı kaçırılsa bile ayar en geç bu kadar saniyede veritabanından yeniden okunur.
+ORDER_CONFIGURATION_MAX_AGE = 5 * 60
+
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
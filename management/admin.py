@@ -1,47 +1,42 @@
 from django.contrib.auth.models import User # User modelini import ettiğinizden emin olun.
 from datetime import timedelta
 from django.conf import settings
-import platform
-import pdfkit
 from decimal import Decimal
 from .forms import BulkDeliveryForm
 from django import forms
 from django.contrib import admin, messages
-from django.db.models import Sum, F, DecimalField
+from django.db.models import Sum, F, DecimalField, Value
+from django.db.models.functions import Coalesce
 from django.http import HttpResponseRedirect, HttpResponse, FileResponse
 from django.urls import path, reverse
 from django.utils.html import format_html
 from django.db import transaction, models
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
-from .views import DeliveryConfirmationView
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .views import DeliveryConfirmationView, complete_fully_delivered_orders
 from .models import (
     Order, Dealer, OrderItem, Collection, Expense, Product, DealerPrice,
     RawMaterial, Recipe, RecipeItem,
     OrderConfiguration, Partner,
     ProfitDistribution, Courier,
     Delivery, Transaction,
-    Invoice,PartnerProfitShare,
+    Invoice,PartnerProfitShare, PartnerLedgerEntry, InvoiceSequence, InvoiceBatch, InvoiceLine,
     Unit, ReturnRequest, ReturnRequestItem,
-    UnitConversion
+    UnitConversion, DailySalesRollup
 
 )
-# convert_unit fonksiyonunu models.py'den import ettiğiniz varsayılır.
-# Eğer models.py'ye eklediyseniz, bu satırı kullanın:
-from .models import convert_unit
-
-# **********************************************************************
-# KRİTİK AYAR: wkhtmltopdf YOLU (OTOMATİK SİSTEM KONTROLÜ)
-# **********************************************************************
-if platform.system() == "Windows":
-    # Kendi bilgisayarınız (Local) için
-    WKHTMLTOPDF_PATH = 'C:/Program Files/wkhtmltopdf/bin/wkhtmltopdf.exe'
-else:
-    # PythonAnywhere (Linux) için
-    WKHTMLTOPDF_PATH = '/usr/bin/wkhtmltopdf'
-# **********************************************************************
-
-
+from .models import record_delivery_tombstones
+from .production import update_recipe_costs
+from .pricing import get_price_book, get_unit_price
+from .reporting import calculate_monthly_profits, schedule_sales_rollup_update, settle_profit_distributions
+from .pdf import PdfRenderError, get_pdf_engine_name
+from .invoicing import (
+    create_invoice_lines, build_invoice_context,
+    get_invoice_pdf_filename, get_claimable_batch_filter,
+    compute_invoice_pdf_hash, has_cached_invoice_pdf, get_invoice_pdf
+)
 
 def confirm_delivery_action(self, request, queryset):
     # KURYEYİ TESPİT ETME
@@ -178,37 +173,73 @@ class OrderItemAdminForm(forms.ModelForm):
 def send_to_delivery(modeladmin, request, queryset):
     """
     Seçilen siparişler için Delivery kayıtları oluşturur ve sipariş durumunu günceller.
+    Eksik teslimatlar tek sorguyla bulunur, toplu oluşturulur ve durumlar tek UPDATE ile değişir.
     """
-    total_deliveries_created = 0
+    with transaction.atomic():
+        # Aynı siparişler eşzamanlı sevk edilirse ikinci işlem birincinin bitmesini bekler.
+        # Admin sorgusu fatura ile LEFT JOIN içerir (FOR UPDATE dış birleşime uygulanamaz);
+        # kilit yalın sipariş sorgusuyla alınır
+        new_order_ids = list(
+            Order.objects.filter(pk__in=queryset.values('pk'), status='NEW')
+            .select_for_update().values_list('id', flat=True)
+        )
+
+        if not new_order_ids:
+            modeladmin.message_user(
+                request,
+                "Seçilen siparişlerden hiçbiri 'Yeni Sipariş' durumunda değildi. Hiçbir işlem yapılmadı.",
+                level='WARNING'
+            )
+            return HttpResponseRedirect(request.get_full_path())
 
-    new_orders = queryset.filter(status='NEW')
+        # Teslimatı olmayan kalemler (anti-join)
+        missing_items = list(
+            OrderItem.objects.filter(order_id__in=new_order_ids, delivery__isnull=True)
+            .values_list('id', 'order_id', 'ordered_quantity')
+        )
 
-    for order in new_orders:
-        with transaction.atomic():
-            order_items = OrderItem.objects.filter(order=order)
+        Delivery.objects.bulk_create([
+            Delivery(order_item_id=item_id, delivered_quantity=ordered_quantity)
+            for item_id, _, ordered_quantity in missing_items
+        ])
 
-            for item in order_items:
-                if not Delivery.objects.filter(order_item=item).exists():
-                    Delivery.objects.create(
-                        order_item=item,
-                        delivered_quantity=item.ordered_quantity,
-                    )
-                    total_deliveries_created += 1
+        created_per_order = {}
+        for _, order_id, _ in missing_items:
+            created_per_order[order_id] = created_per_order.get(order_id, 0) + 1
 
-            if total_deliveries_created > 0:
-                order.status = 'TESLİMATTA'
-                order.save(update_fields=['status'])
+        # Kilitli siparişlerin durumu değiştirilmez (Order.save ile aynı kural).
+        # Satırlar yukarıda kilitlendiği için bu liste UPDATE'e kadar değişmez.
+        shipped_ids = list(
+            Order.objects.filter(id__in=created_per_order, is_locked=False)
+            .values_list('id', flat=True)
+        )
+        Order.objects.filter(id__in=shipped_ids).update(status='TESLİMATTA', updated_at=timezone.now())
+        locked_ids = sorted(set(created_per_order) - set(shipped_ids))
 
-    if new_orders.count() == 0:
+    total_deliveries_created = len(missing_items)
+    modeladmin.message_user(
+        request,
+        f"{len(new_order_ids)} siparişteki toplam {total_deliveries_created} adet sipariş kalemi, sevkiyata hazırlandı."
+    )
+    if shipped_ids:
+        details = ", ".join(
+            f"#{order_id}: {created_per_order[order_id]}" for order_id in sorted(shipped_ids)
+        )
+        modeladmin.message_user(request, f"{len(shipped_ids)} sipariş teslimata gönderildi (sipariş: kalem) — {details}")
+    if locked_ids:
         modeladmin.message_user(
             request,
-            "Seçilen siparişlerden hiçbiri 'Yeni Sipariş' durumunda değildi. Hiçbir işlem yapılmadı.",
+            "Kilitli siparişlerin kalemleri sevkiyata hazırlandı ancak durumları değiştirilmedi: "
+            + ", ".join(f"#{order_id}" for order_id in locked_ids),
             level='WARNING'
         )
-    else:
+
+    skipped_count = len(new_order_ids) - len(created_per_order)
+    if skipped_count:
         modeladmin.message_user(
             request,
-            f"{new_orders.count()} siparişteki toplam {total_deliveries_created} adet sipariş kalemi, sevkiyata hazırlandı."
+            f"{skipped_count} siparişte sevk edilecek yeni kalem bulunamadı; durumları değiştirilmedi.",
+            level='WARNING'
         )
     return HttpResponseRedirect(request.get_full_path())
 
@@ -229,170 +260,108 @@ def is_order_fully_delivered(order):
 
 
 
+def create_invoice_for_order(order, invoice_num):
+    """
+    Sipariş için fatura kaydını oluşturur ve siparişi INVOICED durumuna alır.
+    Çağıran transaction içinde kullanılmalı, ardından create_invoice_lines çağrılmalıdır
+    (nihai tutar fatura satırlarının toplamı olarak orada yazılır).
+    """
+    invoice = Invoice.objects.create(
+        order=order,
+        dealer=order.dealer,
+        invoice_number=invoice_num,
+        final_amount=Decimal('0.00'),
+        invoice_date=timezone.now()
+    )
+
+    # Sipariş Durumunu Güncelleme
+    order.status = 'INVOICED'
+    order.save(update_fields=['status'])
+
+    return invoice
+
+
 @admin.action(description="Seçili siparişler için Fatura Oluştur")
 def generate_invoice(modeladmin, request, queryset):
     """
-    CONFIRMED durumundaki siparişler için fatura kaydı oluşturur ve PDF döndürür.
+    CONFIRMED durumundaki siparişler için fatura kaydı oluşturur.
+    Tek sipariş seçildiyse PDF hemen döndürülür; birden fazla siparişte faturalar tek
+    transaction'da kesilir, PDF'ler process_invoice_batches görevinde üretilip ZIP olarak sunulur.
     """
-    invoices_created = 0
-    invoices_skipped = 0
+    ready_orders = list(queryset.filter(status='CONFIRMED', invoice__isnull=True).select_related('dealer'))
+    is_single_order = len(ready_orders) == 1
 
-    ready_orders = queryset.filter(status='CONFIRMED', invoice__isnull=True)
+    orders_to_invoice = [order for order in ready_orders if is_order_fully_delivered(order)]
+    invoices_skipped = len(ready_orders) - len(orders_to_invoice)
 
-    is_single_order = ready_orders.count() == 1
+    if invoices_skipped > 0:
+        modeladmin.message_user(request, f"{invoices_skipped} adet sipariş (CONFIRMED durumunda değil veya tam teslimat onaylanmadı) atlandı.", level=messages.WARNING)
 
-    for order in ready_orders:
-        if not is_order_fully_delivered(order):
-            invoices_skipped += 1
-            continue
+    if not orders_to_invoice:
+        return HttpResponseRedirect(request.get_full_path())
 
+    # ----------------------------------------------------------------------
+    # 1. TEK SİPARİŞ: FATURA KAYDI + PDF (PDF, transaction dışında üretilir)
+    # ----------------------------------------------------------------------
+    if is_single_order:
+        order = orders_to_invoice[0]
         try:
             with transaction.atomic():
-
-                # Fatura Numarası Oluşturma
-                last_invoice = Invoice.objects.all().order_by('-invoice_number').first()
-                invoice_num = '100000'
-                if last_invoice and last_invoice.invoice_number.isdigit():
-                    next_number = int(last_invoice.invoice_number) + 1
-                    invoice_num = str(next_number).zfill(6)
-
-                # Nihai Tutarı Hesaplama (Transaction'dan)
-                delivery_ids = Delivery.objects.filter(
-                    order_item__order=order,
-                    is_confirmed=True
-                ).values_list('id', flat=True)
-
-                final_amount = Transaction.objects.filter(
-                    source_model='Delivery',
-                    source_id__in=delivery_ids
-                ).aggregate(models.Sum('amount'))['amount__sum']
-
-                if final_amount is None:
-                    final_amount = Decimal('0.00')
-
-                # ----------------------------------------------------------------------
-                # 1. FATURA SATIR VE KDV DETAY HESAPLAMALARI (Görünüm için)
-                # ----------------------------------------------------------------------
-                invoice_lines = []
-                total_kdv = Decimal('0.00')
-                total_vat_excluded = Decimal('0.00')
-
-                deliveries_to_invoice = Delivery.objects.filter(id__in=delivery_ids)
-
-                for delivery in deliveries_to_invoice:
-                    order_item = delivery.order_item
-                    product = order_item.product
-
-                    try:
-                        vat_rate_decimal = product.vat_rate if hasattr(product, 'vat_rate') and product.vat_rate else Decimal('0.20')
-                        if vat_rate_decimal > Decimal('1'):
-                            vat_rate_decimal = vat_rate_decimal / Decimal('100')
-                    except AttributeError:
-                        vat_rate_decimal = Decimal('0.20')
-
-                    delivered_qty = Decimal(str(delivery.delivered_quantity))
-                    unit_price_at_order = Decimal(str(order_item.unit_price_at_order))
-
-                    vat_factor = Decimal('1') + vat_rate_decimal
-                    unit_price_vat_excluded = unit_price_at_order / vat_factor
-
-                    subtotal = unit_price_vat_excluded * delivered_qty
-                    vat_amount = subtotal * vat_rate_decimal
-                    line_total_vat_included = subtotal + vat_amount
-
-                    total_vat_excluded += subtotal
-                    total_kdv += vat_amount
-
-                    invoice_lines.append({
-                        'product_name': product.name,
-                        'unit': product.unit,
-                        'quantity': delivered_qty,
-                        'unit_price_vat_excluded': unit_price_vat_excluded,
-                        'subtotal': subtotal,
-                        'vat_rate': vat_rate_decimal * Decimal('100'),
-                        'vat_amount': vat_amount,
-                        'line_total': line_total_vat_included,
-                    })
-
-                # ----------------------------------------------------------------------
-                # 2. FATURA KAYDINI OLUŞTURMA
-                # ----------------------------------------------------------------------
-                Invoice.objects.create(
-                    order=order,
-                    dealer=order.dealer,
-                    invoice_number=invoice_num,
-                    final_amount=final_amount,
-                    invoice_date=timezone.now()
-                )
-
-                # 3. Sipariş Durumunu Güncelleme
-                order.status = 'INVOICED'
-                order.save(update_fields=['status'])
-
-                invoices_created += 1
-
-                # ----------------------------------------------------------------------
-                # 4. TEK SİPARİŞ İSE PDF ÇIKTISINI OLUŞTUR VE DÖNDÜR
-                # ----------------------------------------------------------------------
-                if is_single_order:
-                    invoice_data_for_view = {
-                        'invoice_number': invoice_num,
-                        'invoice_date': timezone.now(),
-                        'dealer': order.dealer,
-                        'order_id': order.id,
-                        'invoice_lines': invoice_lines,
-                        'vat_excluded_total': total_vat_excluded,
-                        'total_vat': total_kdv,
-                        'grand_total': final_amount,
-                    }
-
-                    context = dict(
-                        modeladmin.admin_site.each_context(request),
-                        invoice=invoice_data_for_view,
-                        order=order,
-                        title=f"Fatura Detayı: {invoice_num}",
-                        is_pdf=True,
-                    )
-
-                    html_string = render(request, "admin/management/invoice_view.html", context).content.decode('utf-8')
-
-                    try:
-                        config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
-
-                        # KRİTİK: ENCODING VE FONT AYARLARI EKLENDİ (Türkçe karakter çözümü)
-                        options = {
-                            'encoding': "UTF-8",
-                            'quiet': '',
-                            #'default-font': 'sans-serif'
-                        }
-
-                        pdf_content = pdfkit.from_string(
-                            html_string,
-                            False,
-                            configuration=config,
-                            options=options
-                        )
-
-                        pdf_filename = f"FATURA_{invoice_data_for_view['invoice_number']}_{order.dealer.name.replace(' ', '_')}.pdf"
-
-                        response = HttpResponse(pdf_content, content_type='application/pdf')
-                        response['Content-Disposition'] = f'attachment; filename="{pdf_filename}"'
-
-                        return response
-
-                    except IOError as e:
-                        error_message = f"PDF Oluşturma Hatası: wkhtmltopdf programına erişim sağlanamadı. Lütfen '{WKHTMLTOPDF_PATH}' yolunu kontrol edin. Hata: {e}"
-                        modeladmin.message_user(request, error_message, level=messages.ERROR)
-                        continue
-
+                invoice = create_invoice_for_order(order, InvoiceSequence.next_number())
+                create_invoice_lines([invoice])
         except Exception as e:
             modeladmin.message_user(request, f"Hata oluştu: Sipariş #{order.id} - {e}", level=messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
 
-    if invoices_created > 0:
-        modeladmin.message_user(request, f"{invoices_created} adet fatura başarıyla oluşturuldu.", level=messages.SUCCESS)
-    if invoices_skipped > 0:
-        modeladmin.message_user(request, f"{invoices_skipped} adet sipariş (CONFIRMED durumunda değil veya tam teslimat onaylanmadı) atlandı.", level=messages.WARNING)
+        try:
+            pdf_content = get_invoice_pdf(invoice)
+        except (OSError, ImportError, PdfRenderError) as e:
+            # Fatura kaydı commit edildi; PDF fatura listesinden tekrar indirilebilir
+            error_message = (
+                f"Fatura #{invoice.invoice_number} oluşturuldu ancak PDF üretilemedi "
+                f"('{get_pdf_engine_name('invoice')}' motoru). PDF motoru ayarlarını (PDF_ENGINES) "
+                f"kontrol edip faturayı listeden tekrar indirebilirsiniz. Hata: {e}"
+            )
+            modeladmin.message_user(request, error_message, level=messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+        response = HttpResponse(pdf_content, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{get_invoice_pdf_filename(invoice)}"'
+        return response
 
+    # ----------------------------------------------------------------------
+    # 2. TOPLU FATURALAMA: TEK TRANSACTION + ARKA PLANDA PDF/ZIP
+    # ----------------------------------------------------------------------
+    try:
+        with transaction.atomic():
+            # Numaralar tek seferde blok olarak ayrılır
+            invoice_numbers = InvoiceSequence.allocate(len(orders_to_invoice))
+            invoices = [
+                create_invoice_for_order(order, invoice_num)
+                for order, invoice_num in zip(orders_to_invoice, invoice_numbers)
+            ]
+            # Tüm faturaların satırları tek sorgu + tek bulk_create ile yazılır
+            create_invoice_lines(invoices)
+
+            batch = InvoiceBatch.objects.create(
+                created_by=request.user if request.user.is_authenticated else None,
+                total_count=len(invoices),
+            )
+            # PDF'ler bu istekte değil, process_invoice_batches görevinde üretilir
+            batch.invoices.add(*invoices)
+    except Exception as e:
+        modeladmin.message_user(request, f"Hata oluştu, hiçbir fatura kesilmedi: {e}", level=messages.ERROR)
+        return HttpResponseRedirect(request.get_full_path())
+
+    batch_url = reverse('admin:management_invoicebatch_change', args=(batch.pk,))
+    modeladmin.message_user(
+        request,
+        format_html(
+            '{} adet fatura başarıyla oluşturuldu. PDF\'ler sıraya alındı, arka planda hazırlanacak: <a href="{}">Toplu Fatura #{}</a>',
+            len(invoices), batch_url, batch.pk
+        ),
+        level=messages.SUCCESS
+    )
     return HttpResponseRedirect(request.get_full_path())
 
 
@@ -415,8 +384,8 @@ class OrderItemInline(admin.TabularInline):
 
     @admin.display(description="Toplam Fiyat (Çevrimli)")
     def get_converted_total_tl(self, obj):
-        # Modeldeki get_converted_total metodu kullanılır
-        total = obj.get_converted_total()
+        # Kayıt sırasında hesaplanan satır toplamı kullanılır (satır başına çevrim sorgusu yapılmaz)
+        total = obj.line_total_amount
         return format_to_turkish_currency(total, align_right=False)
 
     # KRİTİK DÜZELTME: Salt okunur alanlar sadece metotları ve özel durumları içerecek.
@@ -448,19 +417,49 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
-    list_display = ('id', 'dealer', 'order_date', 'get_estimated_total_tl', 'status', 'get_delivery_link', 'get_total_amount')
+    list_display = ('id', 'get_dealer_name', 'order_date', 'get_estimated_total_tl', 'status', 'get_delivery_link', 'get_total_amount')
     list_filter = ('status', 'order_date', 'dealer')
     search_fields = ('dealer__name', 'id')
     inlines = [OrderItemInline]
     readonly_fields = ('get_estimated_total_tl', 'get_total_amount')
     ordering = ('-order_date',)
+    list_select_related = ('dealer',)
 
+    def get_queryset(self, request):
+        """
+        Liste sayfasında satır başına sorgu atılmaması için toplam tutar, fatura ve
+        bayi bilgileri tek sorguda hesaplanır.
+        """
+        qs = super().get_queryset(request)
+        items_total = OrderItem.objects.filter(
+            order=models.OuterRef('pk')
+        ).values('order').annotate(
+            total=Sum('line_total_amount')
+        ).values('total')
+
+        return qs.annotate(
+            items_total_amount=Coalesce(
+                models.Subquery(items_total, output_field=DecimalField(max_digits=14, decimal_places=2)),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            ),
+            invoice_pk=F('invoice__id'),
+            invoice_no=F('invoice__invoice_number'),
+            dealer_name=F('dealer__name'),
+        )
 
+    @admin.display(description='Bayi', ordering='dealer_name')
+    def get_dealer_name(self, obj):
+        dealer_name = getattr(obj, 'dealer_name', None)
+        return dealer_name if dealer_name is not None else obj.dealer.name
 
-    @admin.display(description='Toplam Tutar')
+    @admin.display(description='Toplam Tutar', ordering='items_total_amount')
     def get_total_amount(self, obj):
-        # Order modelindeki @property total_amount'u çağırır
-        return f"{obj.total_amount} TL"
+        # Liste sayfasında annotate edilen değer, diğer durumlarda total_amount kullanılır
+        total = getattr(obj, 'items_total_amount', None)
+        if total is None:
+            total = obj.total_amount
+        return f"{Decimal(total).quantize(Decimal('0.01'))} TL"
 
     actions = [
         send_to_delivery, generate_invoice,
@@ -473,7 +472,7 @@ class OrderAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
     def print_production_list(self, request, queryset):
         selected_ids = ",".join([str(q.id) for q in queryset])
         # views.py'daki fonksiyona yönlendiriyoruz
-        return redirect(f"/management/production-report/pdf/?ids={selected_ids}")
+        return redirect(f"{reverse('management:production_pdf')}?ids={selected_ids}")
 
 
     # Yeni Action: Siparişi Onayla ve Tüm Teslimatları Yapılmış Olarak İşaretle
@@ -490,46 +489,42 @@ class OrderAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
                 # Bağlı değilse (Admin sadece sistem işlemi yapıyor), kurye None kalır (Delivery.courier null=True olmalıdır)
                 pass
 
-        updated_orders = 0
-        updated_deliveries = 0
-
+        # Sabit sayıda sorgu: siparişleri kilitle, siparişleri onayla, bekleyen teslimatları tamamla
         with transaction.atomic():
-            for order in queryset:
-                # Sadece henüz onaylanmamış siparişleri işleyelim
-                if order.is_confirmed: # Varsayım: Order modelinde is_confirmed alanı var
-                    continue
-
-                # 1. Siparişi Onayla
-                order.is_confirmed = True
-                order.save()
-                updated_orders += 1
-
-                # 2. İlgili Teslimat Kayıtlarını Güncelle
-
-                # Bu siparişe ait OrderItem'ları al
-                order_items_qs = OrderItem.objects.filter(order=order)
-
-                # OrderItem'lar üzerinden Delivery kayıtlarını bul (henüz teslim edilmemiş olanları)
-                for order_item in order_items_qs:
-                    delivery_qs = Delivery.objects.filter(
-                        order_item=order_item,
-                        is_confirmed=False
-                    )
-
-                    if delivery_qs.exists():
-                        # Delivery kayıtlarını güncelle:
-                        # - delivered_quantity: Sipariş edilen miktarın tamamı (F ile OrderItem'dan çekilir)
-                        # - is_confirmed: True
-                        # - delivery_date: İşlem anı
-                        # - courier: Sistemi kullanan kurye/admin
-                        delivery_qs.update(
-                            delivered_quantity=F('order_item__ordered_quantity'),
-                            is_confirmed=True,
-                            delivery_date=timezone.now(),
-                            courier=system_courier # None veya Admin'in Kurye objesi
-                        )
-                        updated_deliveries += delivery_qs.count()
+            # Admin sorgusundaki fatura LEFT JOIN'i FOR UPDATE ile kullanılamaz; yalın sorgu kilitlenir
+            order_ids = list(
+                Order.objects.filter(pk__in=queryset.values('pk'), is_confirmed=False)
+                .select_for_update().values_list('id', flat=True)
+            )
+            now = timezone.now()
 
+            # 1. Siparişleri Onayla (yalnızca is_confirmed değişir; durum kilidi etkilenmez)
+            updated_orders = Order.objects.filter(id__in=order_ids).update(is_confirmed=True, updated_at=now)
+
+            pending_deliveries = Delivery.objects.filter(order_item__order_id__in=order_ids, is_confirmed=False)
+
+            # Başka kuryeye atanmış teslimatlar o kuryenin listesinden düşer (senkronizasyon izi)
+            record_delivery_tombstones(
+                pending_deliveries.exclude(courier=system_courier).exclude(courier__isnull=True)
+                .values_list('id', 'courier_id')
+            )
+
+            # 2. Bekleyen Teslimat Kayıtlarını Güncelle:
+            # - delivered_quantity: Sipariş edilen miktarın tamamı (update() birleştirme yapamadığı için alt sorgu)
+            # - is_confirmed: True
+            # - delivery_date: İşlem anı
+            # - courier: Sistemi kullanan kurye/admin
+            updated_deliveries = pending_deliveries.update(
+                delivered_quantity=models.Subquery(
+                    OrderItem.objects.filter(pk=models.OuterRef('order_item_id')).values('ordered_quantity')[:1]
+                ),
+                is_confirmed=True,
+                delivery_date=now,
+                courier=system_courier, # None veya Admin'in Kurye objesi
+                updated_at=now
+            )
+            # Toplu update() sinyal göndermez; satış özeti açıkça güncellenir
+            schedule_sales_rollup_update(order_ids=order_ids)
 
         if updated_orders > 0:
             self.message_user(
@@ -577,40 +572,26 @@ class OrderAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
              return format_html('<span style="color: blue;">Fatura Bekliyor</span>')
 
         elif obj.status == 'INVOICED':
-             try:
-                 invoice_url = reverse('admin:management_invoice_change', args=(obj.invoice.id,))
-                 return format_html('<a href="{}">Fatura {}</a>', invoice_url, obj.invoice.invoice_number)
-             except Invoice.DoesNotExist:
+             # get_queryset'te annotate edilen fatura bilgileri kullanılır (ek sorgu yok)
+             if hasattr(obj, 'invoice_pk'):
+                 invoice_id, invoice_number = obj.invoice_pk, obj.invoice_no
+             else:
+                 invoice = Invoice.objects.filter(order=obj).values_list('id', 'invoice_number').first()
+                 invoice_id, invoice_number = invoice or (None, None)
+
+             if invoice_id is None:
                  return format_html('<span style="color: orange;">Faturalandı (Kayıt Yok)</span>')
+             invoice_url = reverse('admin:management_invoice_change', args=(invoice_id,))
+             return format_html('<a href="{}">Fatura {}</a>', invoice_url, invoice_number)
 
         return obj.get_status_display()
 
     def check_orders_completion(self, orders_queryset):
         """
         Verilen siparişlerin tüm teslimat kalemlerinin onaylanıp onaylanmadığını kontrol eder
-        ve tamamlandıysa siparişin durumunu günceller.
+        ve tamamlandıysa siparişin durumunu günceller (tek UPDATE sorgusu).
         """
-        completed_orders = 0
-
-        for order in orders_queryset:
-            # Varsayım: Order modelinde status alanı var (models.py'de kontrol edin).
-            if order.status == 'CONFIRMED':
-                continue
-
-            # 1. Siparişe ait onaylanmamış (is_confirmed=False) Delivery kayıtlarını say
-            unconfirmed_deliveries = Delivery.objects.filter(
-                order_item__order=order,
-                is_confirmed=False # Modelinizdeki doğru alan: 'is_confirmed'
-            ).count()
-
-            # 2. Kontrol: Eğer onaylanmamış kalem kalmadıysa
-            if unconfirmed_deliveries == 0:
-                # Siparişin durumunu CONFIRMED olarak güncelle
-                order.status = 'CONFIRMED' # Sipariş modelinizin status alanını günceller
-                order.save()
-                completed_orders += 1
-
-        return completed_orders
+        return complete_fully_delivered_orders(orders_queryset.values('id'))
 
     @transaction.atomic
     def bulk_delivery_view(self, request):
@@ -652,56 +633,42 @@ class OrderAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
 
             if form.is_valid():
                 helper = DeliveryConfirmationView()
-                updated_count = 0
-                orders_to_check_ids = set() # İşlenen siparişlerin ID'lerini tutmak için
 
                 # Kurye objesini belirle
                 courier_obj = current_courier if current_courier else form.cleaned_data.get('courier')
+                delivery_date = timezone.now()
+
+                # 1. TESLİMATLARI TEK bulk_update İLE GÜNCELLE
+                # (deliveries_qs form oluşturulurken okunduğu için burada yeniden sorgulanmaz)
+                deliveries = list(deliveries_qs)
+                # Başka kuryeye atanmış teslimatlar o kuryenin listesinden düşer (senkronizasyon izi)
+                record_delivery_tombstones(
+                    (delivery.id, delivery.courier_id) for delivery in deliveries
+                    if delivery.courier_id != (courier_obj.pk if courier_obj else None)
+                )
+                for delivery in deliveries:
+                    delivery.delivered_quantity = form.cleaned_data[f'delivered_quantity_{delivery.id}']
+                    delivery.is_confirmed = True
+                    delivery.delivery_date = delivery_date
+                    delivery.courier = courier_obj
+                    delivery.updated_at = delivery_date
+
+                Delivery.objects.bulk_update(
+                    deliveries, ['delivered_quantity', 'is_confirmed', 'delivery_date', 'courier', 'updated_at']
+                )
 
-                for delivery in deliveries_qs:
-
-                    delivered_quantity = form.cleaned_data[f'delivered_quantity_{delivery.id}']
-
-                    # 1. TESLİMAT OBJESİNİ GÜNCELLE (HATA DÜZELTİLDİ!)
-                    Delivery.objects.filter(pk=delivery.pk).update(
-                        delivered_quantity=delivered_quantity,
-                        # KRİTİK DÜZELTME: is_confirmed kullanılıyor
-                        is_confirmed=True,
-                        delivery_date=timezone.now(),
-                        courier=courier_obj,
-                    )
-
-                    # 2. CARİ HESAP İŞLEMİNİ OLUŞTUR (Mevcut Logic)
-                    try:
-                        qty = Decimal(str(delivered_quantity))
-                        price = Decimal(str(delivery.order_item.unit_price_at_order))
-                        # convert_unit fonksiyonunuz models.py'den alınmıştır
-                        converted_qty = convert_unit(
-                            qty,
-                            delivery.order_item.ordered_unit,
-                            delivery.order_item.product.unit
-                        )
-                        new_amount = converted_qty * price
-
-                        # helper.create_debt_transaction metodu
-                        helper.create_debt_transaction(delivery.order_item.order.dealer, delivery, new_amount)
-
-                    except Exception:
-                         # Hata yönetimi (loglama yapılabilir)
-                         pass
-
-
-                    updated_count += 1
-                    orders_to_check_ids.add(delivery.order_item.order_id)
-
+                # 2. CARİ HESAP İŞLEMLERİ: tek DELETE + tek bulk_create
+                helper.create_debt_transactions_bulk(deliveries)
 
-                # KRİTİK 3. ADIM: SİPARİŞ DURUMUNU KONTROL ET VE ONAYLA
-                if orders_to_check_ids:
-                    orders_to_check = Order.objects.filter(id__in=orders_to_check_ids)
-                    completed_count = self.check_orders_completion(orders_to_check)
+                updated_count = len(deliveries)
 
-                    if completed_count > 0:
-                         self.message_user(request, f"{completed_count} adet sipariş TAMAMLANDI olarak işaretlendi.")
+                # KRİTİK 3. ADIM: SİPARİŞ DURUMUNU KONTROL ET VE ONAYLA (tek UPDATE)
+                order_ids = {delivery.order_item.order_id for delivery in deliveries}
+                completed_count = complete_fully_delivered_orders(order_ids)
+                # bulk_update sinyal göndermez; satış özeti açıkça güncellenir
+                schedule_sales_rollup_update(order_ids=order_ids)
+                if completed_count > 0:
+                     self.message_user(request, f"{completed_count} adet sipariş TAMAMLANDI olarak işaretlendi.")
 
                 self.message_user(request, f"{updated_count} adet teslimat kalemi onaylandı.")
                 return HttpResponseRedirect(request.get_full_path())
@@ -734,6 +701,8 @@ class OrderAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
                 pass
 
         instances = formset.save(commit=False)
+        # Bayinin fiyat listesi (özel fiyat, yoksa satış fiyatı) tek seferde alınır
+        price_book = get_price_book(current_dealer)
 
         for instance in instances:
             if isinstance(instance, OrderItem):
@@ -743,18 +712,7 @@ class OrderAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
                     if instance.pk and instance.unit_price_at_order > 0:
                         continue
 
-                    final_price = instance.product.price_vat_included
-                    if current_dealer:
-                        try:
-                            special_price_entry = DealerPrice.objects.get(
-                                dealer=current_dealer,
-                                product=instance.product
-                            )
-                            final_price = special_price_entry.price
-                        except DealerPrice.DoesNotExist:
-                            pass
-
-                    instance.unit_price_at_order = final_price
+                    instance.unit_price_at_order = get_unit_price(instance.product, price_book=price_book)
 
                 elif instance.unit_price_at_order is None:
                     instance.unit_price_at_order = Decimal('0.00')
@@ -766,12 +724,10 @@ class OrderAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
         # KRİTİK GÜNCELLEME: Çevrim Fonksiyonu Kullanılarak Toplam Hesaplama
         # ------------------------------------------------------------------
 
-        new_estimated_total = Decimal('0.00')
-        order_items = OrderItem.objects.filter(order=order_instance).select_related('product')
-
-        for item in order_items:
-            # Her bir sipariş kaleminin çevrimli toplamını topla
-            new_estimated_total += item.get_converted_total()
+        # Satır toplamları kalemlerde saklandığı için tek bir SUM sorgusu yeterlidir
+        new_estimated_total = OrderItem.objects.filter(order=order_instance).aggregate(
+            total=Sum('line_total_amount')
+        )['total'] or Decimal('0.00')
 
         order_instance.estimated_total = new_estimated_total
         order_instance.save(update_fields=['estimated_total'])
@@ -909,7 +865,7 @@ class DealerAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
     inlines = [TransactionInline]
 
     # Bakiye alanını formatlı göstermek için
-    @admin.display(description="Cari Bakiye")
+    @admin.display(description="Cari Bakiye", ordering='balance')
     def get_current_balance_tl(self, obj):
         # format_to_turkish_currency fonksiyonu zaten admin.py'de tanımlı
         return format_to_turkish_currency(obj.current_balance, align_right=True)
@@ -990,60 +946,18 @@ class CollectionAdmin(admin.ModelAdmin):
 # ----------------------------------------------------------------------
 # 6. FATURA YÖNETİMİ
 # ----------------------------------------------------------------------
-# ------------------------------------------------------------------
-# YARDIMCI FONKSİYON: Fatura Satırı Hesaplama Mantığı
-# (Bu fonksiyonu InvoiceAdmin sınıfının DIŞINA, üstüne ekleyin)
-# ------------------------------------------------------------------
-def calculate_invoice_lines(deliveries):
-    """Teslimatları alır, birim çevrimlerini yaparak fatura satırlarını ve doğru toplamları hesaplar."""
-    invoice_lines = []
-    total_vat_excluded = Decimal('0.00')
-    total_kdv = Decimal('0.00')
-    grand_total = Decimal('0.00')
-
-    for delivery in deliveries:
-        order_item = delivery.order_item
-        product = order_item.product
-
-        # ... (KDV, Miktar, Birim kontrolü) ...
-
-        # 3. Fiyat Dönüştürme (KRİTİK HESAPLAMA)
-        base_unit_price = Decimal(str(order_item.unit_price_at_order)) # Ürün Ana Birim Fiyatı
-
-        # Birim Çevrimi: 1 Sipariş Birimi kaç Ana Birim eder?
-        conversion_factor = convert_unit(1, order_item.ordered_unit, product.unit)
-        conversion_factor = Decimal(str(conversion_factor))
-        if conversion_factor == 0: conversion_factor = Decimal('1.0')
-
-        # Faturada görünecek Birim Fiyat (KDV Dahil, Sipariş Birimine Göre)
-        display_unit_price_included = base_unit_price * conversion_factor
-
-        # KDV Hariç Birim Fiyat
-        vat_rate = product.vat_rate / 100 if product.vat_rate else Decimal('0.20')
-        vat_factor = Decimal('1') + vat_rate
-        display_unit_price_excluded = display_unit_price_included / vat_factor
-
-        # 4. Satır Toplamları (KDV Hariç Fiyat * Miktar)
-        delivered_qty = Decimal(str(delivery.delivered_quantity))
-        line_subtotal = display_unit_price_excluded * delivered_qty
-        # Genel Toplamlara Ekle
-        total_vat_excluded += line_subtotal
-        total_kdv += line_vat_amount
-        grand_total += line_total
-
-        invoice_lines.append({
-            'product_name': product.name,
-            'unit': unit_name,
-            'quantity': delivered_qty,
-            'unit_price': display_unit_price_excluded,
-            'subtotal': line_subtotal,
-            'vat_rate': vat_rate * 100,
-            'vat_amount': line_vat_amount,
-            'line_total': line_total,
-        })
-
-    return invoice_lines, total_vat_excluded, total_kdv, grand_total
+class InvoiceLineInline(admin.TabularInline):
+    model = InvoiceLine
+    extra = 0
+    can_delete = False
+    fields = ('product_name', 'quantity', 'unit_name', 'unit_price', 'subtotal', 'vat_rate', 'vat_amount', 'line_total')
+    readonly_fields = fields
 
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Invoice)
@@ -1051,6 +965,7 @@ class InvoiceAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
     list_display = ('invoice_number', 'order', 'dealer', 'get_final_amount_tl', 'invoice_date', 'get_pdf_link')
     search_fields = ('invoice_number', 'dealer__name', 'order__id')
     list_filter = ('invoice_date', 'dealer')
+    inlines = [InvoiceLineInline]
 
     readonly_fields = ('invoice_number', 'order', 'dealer', 'final_amount', 'invoice_date', 'get_final_amount_tl')
 
@@ -1066,63 +981,31 @@ class InvoiceAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
         return custom_urls + urls
 
     def regenerate_pdf_view(self, request, invoice_id, *args, **kwargs):
-        invoice = get_object_or_404(Invoice, pk=invoice_id)
-        order = invoice.order
+        invoice = get_object_or_404(Invoice.objects.select_related('order', 'dealer'), pk=invoice_id)
 
         try:
-            # 1. Teslimat Verilerini Çek
-            # Fatura, onaylanmış teslimatlar üzerinden oluşturulur.
-            deliveries = Delivery.objects.filter(order_item__order=order, is_confirmed=True)
-
-            # Eğer onaylı teslimat yoksa (örn: test verisi), onaysızları da çekmeyi deneyebiliriz
-            # veya boş fatura döner. Test için şunu açabilirsiniz:
-            if not deliveries.exists():
-                 deliveries = Delivery.objects.filter(order_item__order=order)
-
-            # 2. Verileri Hesapla (Yukarıdaki fonksiyonu çağırıyoruz)
-            lines, vat_excluded, total_vat, grand_total = calculate_invoice_lines(deliveries)
-
-            # 3. Görünüm Verisini Hazırla
-            invoice_data_for_view = {
-                'invoice_number': invoice.invoice_number,
-                'invoice_date': invoice.invoice_date,
-                'dealer': order.dealer,
-                'order_id': order.id,
-                'invoice_lines': lines,          # <--- ARTIK DOLU VERİ GİDİYOR
-                'vat_excluded_total': vat_excluded,
-                'total_vat': total_vat,
-                'grand_total': grand_total,
-            }
-
-            context = dict(
-                self.admin_site.each_context(request),
-                invoice=invoice_data_for_view,
-                order=order,
-                title=f"Fatura Detayı: {invoice.invoice_number}",
-                is_pdf=True,
-            )
-
-            html_string = render(request, "admin/management/invoice_view.html", context).content.decode('utf-8')
-
-            config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
+            # PDF, fatura verisi + şablon sürümünün özetiyle önbelleğe alınır.
+            # Özet değişmediyse dosya yeniden üretilmez; tarayıcı önbelleği için ETag/Last-Modified verilir.
+            context = build_invoice_context(invoice)
+            pdf_hash = compute_invoice_pdf_hash(context)
+            etag = quote_etag(pdf_hash)
+
+            if has_cached_invoice_pdf(invoice, pdf_hash):
+                not_modified = get_conditional_response(
+                    request,
+                    etag=etag,
+                    last_modified=int(invoice.pdf_generated_at.timestamp()),
+                )
+                if not_modified is not None:
+                    return not_modified
 
-            # Türkçe karakter desteği için ayarlar
-            options = {
-                'encoding': "UTF-8",
-                'quiet': '',
-                # 'default-font': 'sans-serif' # Hata verirse bu satırı silin
-            }
+            pdf_content = get_invoice_pdf(invoice, context=context, pdf_hash=pdf_hash)
 
-            pdf_content = pdfkit.from_string(
-                html_string,
-                False,
-                configuration=config,
-                options=options
-            )
-
-            pdf_filename = f"FATURA_{invoice.invoice_number}_{order.dealer.name.replace(' ', '_')}.pdf"
             response = HttpResponse(pdf_content, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{pdf_filename}"'
+            response['Content-Disposition'] = f'attachment; filename="{get_invoice_pdf_filename(invoice)}"'
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(invoice.pdf_generated_at.timestamp())
+            response['Cache-Control'] = 'private, no-cache'
             return response
 
         except Exception as e:
@@ -1148,220 +1031,92 @@ class InvoiceAdmin(DealerFilteringAdminMixin, admin.ModelAdmin):
         return request.user.is_superuser
 
 
-# ------------------------------------------------------------------
-# YARDIMCI FONKSİYON: Fatura Satırı Hesaplama Mantığı
-# (Kod tekrarını önlemek için bu mantığı bir fonksiyona aldık)
-# ------------------------------------------------------------------
-def calculate_invoice_lines(deliveries):
-    invoice_lines = []
-    total_vat_excluded = Decimal('0.00')
-    total_kdv = Decimal('0.00')
-    grand_total = Decimal('0.00')
-
-    for delivery in deliveries:
-        order_item = delivery.order_item
-        product = order_item.product
-
-        # 1. KDV Oranı
-        try:
-            vat_rate = product.vat_rate if product.vat_rate else Decimal('0.20')
-            if vat_rate > 1: vat_rate = vat_rate / 100
-        except:
-            vat_rate = Decimal('0.20')
-
-        # 2. Miktar ve Birim
-        # Teslim edilen miktar (Örn: 5)
-        delivered_qty = Decimal(str(delivery.delivered_quantity))
-
-        # Sipariş Birimi (Örn: Koli)
-        unit_name = order_item.ordered_unit.name if order_item.ordered_unit else product.unit.name
-
-        # 3. Fiyat Dönüştürme (KRİTİK ADIM)
-        # Veritabanındaki fiyat (Ana Birim, örn: Adet Fiyatı)
-        base_unit_price = Decimal(str(order_item.unit_price_at_order))
-
-        # Birim Çevrimi: 1 Sipariş Birimi (Koli) kaç Ana Birim (Adet) eder?
-        # Örn: 1 Koli = 10 Adet ise factor = 10
-        from .models import convert_unit # convert_unit fonksiyonunu kullanıyoruz
-        conversion_factor = convert_unit(1, order_item.ordered_unit, product.unit)
-        conversion_factor = Decimal(str(conversion_factor))
-
-        # Faturada görünecek Birim Fiyat (KDV Dahil) -> Koli Fiyatı
-        display_unit_price_included = base_unit_price * conversion_factor
-
-        # KDV Hariç Birim Fiyatı Bulma
-        vat_factor = Decimal('1') + vat_rate
-        display_unit_price_excluded = display_unit_price_included / vat_factor
-
-        # 4. Satır Toplamları
-        line_subtotal = display_unit_price_excluded * delivered_qty # KDV Hariç Tutar
-        line_vat_amount = line_subtotal * vat_rate # KDV Tutarı
-        line_total = line_subtotal + line_vat_amount # KDV Dahil Toplam
-
-        # Genel Toplamlara Ekle
-        total_vat_excluded += line_subtotal
-        total_kdv += line_vat_amount
-        grand_total += line_total
-
-        invoice_lines.append({
-            'product_name': product.name,
-            'unit': unit_name, # <-- YENİ: Birim Adı
-            'quantity': delivered_qty,
-            'unit_price': display_unit_price_excluded, # Dönüştürülmüş Fiyat
-            'subtotal': line_subtotal,
-            'vat_rate': vat_rate * 100,
-            'vat_amount': line_vat_amount,
-            'line_total': line_total,
-        })
-
-    return invoice_lines, total_vat_excluded, total_kdv, grand_total
-
-
-# ------------------------------------------------------------------
-# AKSİYON: generate_invoice (Güncellenmiş Hali)
-# ------------------------------------------------------------------
-@admin.action(description="Seçili siparişler için Fatura Oluştur")
-def generate_invoice(modeladmin, request, queryset):
-    # ... (Başlangıçtaki ready_orders filtreleme kodları aynı) ...
-    invoices_created = 0
-    invoices_skipped = 0
-    ready_orders = queryset.filter(status='CONFIRMED', invoice__isnull=True)
-    is_single_order = ready_orders.count() == 1
-
-    for order in ready_orders:
-        if not is_order_fully_delivered(order):
-            invoices_skipped += 1
-            continue
-
-        try:
-            with transaction.atomic():
-                # ... (Fatura No oluşturma kodları aynı) ...
-                last_invoice = Invoice.objects.all().order_by('-invoice_number').first()
-                invoice_num = '100000'
-                if last_invoice and last_invoice.invoice_number.isdigit():
-                    next_number = int(last_invoice.invoice_number) + 1
-                    invoice_num = str(next_number).zfill(6)
-
-                # Teslimatları çek
-                delivery_ids = Delivery.objects.filter(
-                    order_item__order=order,
-                    is_confirmed=True
-                ).values_list('id', flat=True)
-                deliveries = Delivery.objects.filter(id__in=delivery_ids)
-
-                # --- YENİ HESAPLAMA FONKSİYONUNU ÇAĞIR ---
-                lines, vat_excluded, total_vat, grand_total = calculate_invoice_lines(deliveries)
-
-                # Fatura Kaydı
-                Invoice.objects.create(
-                    order=order,
-                    dealer=order.dealer,
-                    invoice_number=invoice_num,
-                    final_amount=grand_total, # Transaction yerine hesaplanan tutarı kullanmak daha güvenli
-                    invoice_date=timezone.now()
-                )
-
-                # Transaction güncelleme (Eğer Transaction modeliniz varsa)
-                # Burayı mevcut Transaction mantığınıza göre güncelleyebilirsiniz.
-
-                order.status = 'INVOICED'
-                order.save(update_fields=['status'])
-                invoices_created += 1
-
-                if is_single_order:
-                    invoice_data = {
-                        'invoice_number': invoice_num,
-                        'invoice_date': timezone.now(),
-                        'dealer': order.dealer,
-                        'order_id': order.id,
-                        'invoice_lines': lines, # Hesaplanan satırlar
-                        'vat_excluded_total': vat_excluded,
-                        'total_vat': total_vat,
-                        'grand_total': grand_total,
-                    }
-
-                    context = dict(
-                        modeladmin.admin_site.each_context(request),
-                        invoice=invoice_data,
-                        order=order,
-                        title=f"Fatura: {invoice_num}",
-                        is_pdf=True,
-                    )
-
-                    # ... (PDF Oluşturma kodları - encoding options ile birlikte aynı kalacak) ...
-                    html_string = render(request, "admin/management/invoice_view.html", context).content.decode('utf-8')
-                    config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
-                    options = {'encoding': "UTF-8", 'quiet': '', 'default-font': 'sans-serif'}
-                    pdf_content = pdfkit.from_string(html_string, False, configuration=config, options=options)
-
-                    response = HttpResponse(pdf_content, content_type='application/pdf')
-                    response['Content-Disposition'] = f'attachment; filename="FATURA_{invoice_num}.pdf"'
-                    return response
-
-        except Exception as e:
-            modeladmin.message_user(request, f"Hata: {e}", level=messages.ERROR)
-
-    return HttpResponseRedirect(request.get_full_path())
-
-
-# ------------------------------------------------------------------
-# METOT: InvoiceAdmin.regenerate_pdf_view (Güncellenmiş Hali)
-# ------------------------------------------------------------------
-# InvoiceAdmin sınıfı içinde regenerate_pdf_view metodunu bununla değiştirin:
-
-    def regenerate_pdf_view(self, request, invoice_id, *args, **kwargs):
-        invoice = get_object_or_404(Invoice, pk=invoice_id)
-        order = invoice.order
+@admin.register(InvoiceBatch)
+class InvoiceBatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at', 'created_by', 'status', 'get_progress', 'get_download_link')
+    list_filter = ('status',)
+    readonly_fields = (
+        'status', 'created_by', 'created_at', 'started_at', 'finished_at',
+        'total_count', 'completed_count', 'failed_count', 'get_progress', 'get_download_link', 'error_log'
+    )
+    exclude = ('invoices', 'archive')
 
-        try:
-            # Teslimatları bul
-            deliveries = Delivery.objects.filter(order_item__order=order, is_confirmed=True)
-
-            # --- YENİ HESAPLAMA FONKSİYONUNU ÇAĞIR ---
-            # Fatura tekrar oluşturulurken güncel verilerle yeniden hesaplanır
-            lines, vat_excluded, total_vat, grand_total = calculate_invoice_lines(deliveries)
-
-            invoice_data = {
-                'invoice_number': invoice.invoice_number,
-                'invoice_date': invoice.invoice_date,
-                'dealer': order.dealer,
-                'order_id': order.id,
-                'invoice_lines': lines, # Detaylı satırlar
-                'vat_excluded_total': vat_excluded,
-                'total_vat': total_vat,
-                'grand_total': grand_total,
-            }
-
-            context = dict(
-                self.admin_site.each_context(request),
-                invoice=invoice_data,
-                order=order,
-                title=f"Fatura: {invoice.invoice_number}",
-                is_pdf=True,
+    def changelist_view(self, request, extra_context=None):
+        # İşler process_invoice_batches görevinde çalışır; görev çalışmıyorsa işler sırada bekler
+        cutoff = timezone.now() - timedelta(seconds=settings.INVOICE_BATCH_STALE_AFTER)
+        waiting = InvoiceBatch.objects.filter(get_claimable_batch_filter(), created_at__lt=cutoff).count()
+        if waiting:
+            self.message_user(
+                request,
+                f"{waiting} toplu fatura işi bekliyor veya yarıda kalmış. Zamanlanmış görevin "
+                f"(python manage.py process_invoice_batches) çalıştığını kontrol edin.",
+                level=messages.WARNING
             )
+        return super().changelist_view(request, extra_context)
 
-            html_string = render(request, "admin/management/invoice_view.html", context).content.decode('utf-8')
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                '<int:batch_id>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='management_invoicebatch_download'
+            ),
+        ]
+        return custom_urls + urls
 
-            config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
-            options = {'encoding': "UTF-8", 'quiet': '', 'default-font': 'sans-serif'}
+    def download_view(self, request, batch_id):
+        batch = get_object_or_404(InvoiceBatch, pk=batch_id)
+        if not batch.archive:
+            self.message_user(request, "PDF arşivi henüz hazır değil.", level=messages.WARNING)
+            return HttpResponseRedirect(reverse('admin:management_invoicebatch_change', args=(batch.pk,)))
+        return FileResponse(batch.archive.open('rb'), as_attachment=True, filename=f"toplu_fatura_{batch.pk}.zip")
+
+    @admin.display(description="İlerleme")
+    def get_progress(self, obj):
+        text = f"{obj.completed_count}/{obj.total_count} (%{obj.progress_percent})"
+        if obj.failed_count:
+            text += f" - {obj.failed_count} hatalı"
+        return text
+
+    @admin.display(description="PDF Arşivi")
+    def get_download_link(self, obj):
+        if not obj.archive:
+            return "-"
+        url = reverse('admin:management_invoicebatch_download', args=[obj.pk])
+        return format_html('<a class="button" href="{}">ZIP İndir</a>', url)
 
-            pdf_content = pdfkit.from_string(html_string, False, configuration=config, options=options)
+    def has_add_permission(self, request):
+        return False
 
-            response = HttpResponse(pdf_content, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="FATURA_{invoice.invoice_number}.pdf"'
-            return response
+    def has_change_permission(self, request, obj=None):
+        return False
 
-        except Exception as e:
-            messages.error(request, f"Hata: {e}")
-            return HttpResponseRedirect(reverse('admin:management_invoice_changelist'))
+    def has_module_permission(self, request):
+        return request.user.is_superuser
 
 
 # ----------------------------------------------------------------------
 # 7. ORTAKLAR VE KÂR DAĞITIMI
 # ----------------------------------------------------------------------
 
+class PartnerLedgerEntryInline(admin.TabularInline):
+    """Ortağın kâr payı hareketleri (salt okunur; kâr dağıtımı tarafından yazılır)."""
+    model = PartnerLedgerEntry
+    fk_name = 'partner'
+    fields = ('created_at', 'distribution', 'description', 'amount', 'balance_after')
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+    ordering = ('-created_at', '-id')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Partner)
 class PartnerAdmin(admin.ModelAdmin):
+    inlines = [PartnerLedgerEntryInline]
 
     list_display = (
         'get_partner_name',
@@ -1373,6 +1128,8 @@ class PartnerAdmin(admin.ModelAdmin):
     list_filter = ('distribution_ratio', 'share_percentage')
     ordering = ('-distribution_ratio', '-share_percentage')
     search_fields = ('user__username', 'user__first_name', 'user__last_name',)
+    # Toplamlar yalnızca kâr dağıtımıyla değişir; formdan geri yazılmaz
+    readonly_fields = Partner.LEDGER_FIELDS
 
     # Ortak adını (User modelindeki bilgiyi) göstermek için yeni bir metot
     def get_partner_name(self, obj):
@@ -1397,31 +1154,6 @@ class PartnerAdmin(admin.ModelAdmin):
     # ***************************************************************
     # KAR DAĞITIM ACTION METODU (GÜNCELLENMİŞ)
     # ***************************************************************
-# Aylık karı hesaplayan yardımcı fonksiyon
-def calculate_net_profit_for_period(start_date, end_date):
-
-    # 1. Toplam Gelirleri Hesapla (Tahsilatlar)
-    #Collection: Bayilerden yapılan tahsilatlar
-    # Tahsilat (Collection) modelinizde 'amount' alanı olduğunu varsayıyorum.
-    collections_sum = Collection.objects.filter(
-        collection_date__gte=start_date,  # <-- Düzeltildi
-        collection_date__lt=end_date      # <-- Düzeltildi
-    ).aggregate(total_sum=Sum('amount'))['total_sum'] or Decimal('0.00')
-
-    # 2. Toplam Giderleri Hesapla (Masraflar)
-    # Expense: Yapılan masraflar
-    # Masraf (Expense) modelinizde 'amount' alanı olduğunu varsayıyorum.
-    expenses_sum = Expense.objects.filter(
-        date__gte=start_date,
-        date__lt=end_date
-    ).aggregate(total_sum=Sum('amount'))['total_sum'] or Decimal('0.00')
-
-    # 3. Net Karı Hesapla
-    net_profit = collections_sum - expenses_sum
-
-    return net_profit
-
-
 class PartnerProfitShareInline(admin.TabularInline):
     model = PartnerProfitShare
     extra = 0 # Yeni boş satır gösterme
@@ -1490,11 +1222,8 @@ class ProfitDistributionAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         if change or not obj.pk:
-            start_date, end_date = self.get_month_dates(obj)
-
-            # Kârı hesapla (calculate_net_profit_for_period end_date'i dışladığı için +1 gün ekliyoruz)
-            calculated_profit = calculate_net_profit_for_period(start_date, end_date + timedelta(days=1))
-            obj.total_net_profit = calculated_profit
+            period = (obj.year, obj.month)
+            obj.total_net_profit = calculate_monthly_profits([period])[period]['net_profit']
 
         super().save_model(request, obj, form, change)
 
@@ -1502,16 +1231,13 @@ class ProfitDistributionAdmin(admin.ModelAdmin):
     def calculate_profit_action(self, request, queryset):
         # ... (Action kodunun devamı) ...
 
-        updated_count = 0
-        for obj in queryset:
-            start_date, end_date = self.get_month_dates(obj)
-
-            # Kârı hesapla (calculate_net_profit_for_period end_date'i dışladığı için +1 gün ekliyoruz)
-            calculated_profit = calculate_net_profit_for_period(start_date, end_date + timedelta(days=1))
-
-            obj.total_net_profit = calculated_profit
-            obj.save(update_fields=['total_net_profit'])
-            updated_count += 1
+        # Tüm aylar kaynak başına tek gruplu sorguyla hesaplanır, tek bulk_update ile yazılır
+        distributions = list(queryset)
+        profits = calculate_monthly_profits((obj.year, obj.month) for obj in distributions)
+        for obj in distributions:
+            obj.total_net_profit = profits[(obj.year, obj.month)]['net_profit']
+        ProfitDistribution.objects.bulk_update(distributions, ['total_net_profit'], batch_size=500)
+        updated_count = len(distributions)
 
         self.message_user(request, f"{updated_count} adet kayıt için kâr başarıyla yeniden hesaplandı.")
 
@@ -1534,54 +1260,15 @@ class ProfitDistributionAdmin(admin.ModelAdmin):
             self.message_user(request, "Sistemde dağıtım oranı tanımlanmış aktif ortak bulunamadı.", level=messages.ERROR)
             return
 
-        total_distributed_count = 0
-
-        for distribution_record in undistributed_queryset:
-
-            total_profit = distribution_record.total_net_profit
-            total_ratio = sum([p.distribution_ratio for p in partners])
-
-            # Kâr payı dağıtım detaylarını temizle (varsa eski kayıtları sil)
-            PartnerProfitShare.objects.filter(distribution=distribution_record).delete()
-
-            # Sadece pozitif kâr varsa dağıtım yap
-            if total_profit > Decimal('0.00'):
-
-                shares_to_create = []
-
-                for partner in partners:
-                    ratio = partner.distribution_ratio
-
-                    # Oran (örneğin 30.00) / 100
-                    share_multiplier = ratio / Decimal('100.00')
-
-                    calculated_share = total_profit * share_multiplier
-
-                    shares_to_create.append(
-                        PartnerProfitShare(
-                            distribution=distribution_record,
-                            partner=partner,
-                            share_ratio=ratio,
-                            calculated_amount=calculated_share
-                        )
-                    )
-
-                # Toplu kayıt işlemi
-                PartnerProfitShare.objects.bulk_create(shares_to_create)
-
-                # Dağıtım tamamlandı olarak işaretle
-                distribution_record.is_distributed = True
-                distribution_record.save(update_fields=['is_distributed'])
-                total_distributed_count += 1
-
-            elif total_profit < Decimal('0.00'):
-                # Negatif kâr (zarar) durumunda uyarı verebiliriz veya paylaştırmayız
-                 self.message_user(request, f"{distribution_record.month}/{distribution_record.year} ayı KÂR yerine ZARAR içerdiği için dağıtım yapılmadı.", level=messages.WARNING)
-                 continue
+        # Tüm aylar tek geçişte: paylar, ortak cari hareketleri ve ortak bakiyeleri toplu yazılır
+        settled, losses = settle_profit_distributions(undistributed_queryset)
 
+        for distribution_record in losses:
+            # Negatif kâr (zarar) durumunda paylaştırma yapılmaz
+            self.message_user(request, f"{distribution_record.month}/{distribution_record.year} ayı KÂR yerine ZARAR içerdiği için dağıtım yapılmadı.", level=messages.WARNING)
 
-        if total_distributed_count > 0:
-            self.message_user(request, f"{total_distributed_count} adet ayın kârı ortaklara başarıyla dağıtıldı.", level=messages.SUCCESS)
+        if settled:
+            self.message_user(request, f"{len(settled)} adet ayın kârı ortaklara başarıyla dağıtıldı.", level=messages.SUCCESS)
 
 
 
@@ -1598,10 +1285,14 @@ class ProductAdmin(admin.ModelAdmin):
         'price_vat_included',
         'vat_rate',
         'get_price_vat_excluded',
+        'get_unit_cost_tl',
+        'get_margin',
         'is_active'
     )
     #fields = ('name', 'code', 'selling_price', 'unit', 'is_active', 'image', 'description')
     list_filter = ('is_active', 'unit')
+    # Maliyet reçetede saklanır; liste tek sorguda gelir
+    list_select_related = ('unit', 'recipe')
     search_fields = ('name','unit', 'is_active','price_vat_included', 'vat_rate')
 
     @admin.display(description="Satış Fiyatı (TL)")
@@ -1626,9 +1317,25 @@ class ProductAdmin(admin.ModelAdmin):
                 return "Hesaplama Hatası"
         return "N/A"
 
+    @admin.display(description="Birim Maliyet (TL)")
+    def get_unit_cost_tl(self, obj):
+        recipe = getattr(obj, 'recipe', None)
+        if recipe is None:
+            return "Reçete yok"
+        return format_to_turkish_currency(recipe.unit_cost)
+
+    @admin.display(description="Brüt Kâr Marjı")
+    def get_margin(self, obj):
+        recipe = getattr(obj, 'recipe', None)
+        if recipe is None or not obj.selling_price:
+            return "N/A"
+        margin = (obj.selling_price - recipe.unit_cost) / obj.selling_price * 100
+        return f"%{margin:.1f}"
+
 @admin.register(RawMaterial)
 class RawMaterialAdmin(admin.ModelAdmin):
-    list_display = ('name', 'unit', 'get_cost_price_tl', 'is_active')
+    list_display = ('name', 'unit', 'get_cost_price_tl', 'intermediate_product', 'is_active')
+    list_select_related = ('unit', 'intermediate_product')
     list_filter = ('is_active', 'unit')
     search_fields = ('name',)
 
@@ -1665,10 +1372,17 @@ class RecipeItemInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('product', 'is_active', 'get_total_cost_tl')
+    list_display = ('product', 'is_active', 'get_total_cost_tl', 'cost_updated_at')
     list_filter = ('is_active',)
     search_fields = ('product__name',)
     inlines = [RecipeItemInline]
+    list_select_related = ('product',)
+    actions = ['recompute_costs']
+
+    @admin.action(description="Seçili reçetelerin maliyetini yeniden hesapla")
+    def recompute_costs(self, request, queryset):
+        updated = update_recipe_costs(recipe_ids=list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f"{updated} reçetenin birim maliyeti güncellendi (ara ürün olarak kullananlar dahil).")
 
     def get_urls(self):
         urls = super().get_urls()
@@ -1717,13 +1431,10 @@ class RecipeAdmin(admin.ModelAdmin):
 
 
 
-    @admin.display(description="Toplam Hammadde Maliyeti (1 Birim)")
+    @admin.display(description="Toplam Hammadde Maliyeti (1 Birim)", ordering='unit_cost')
     def get_total_cost_tl(self, obj):
-        try:
-            # Yeni hesaplama metodu çağrılıyor
-            return format_to_turkish_currency(obj.calculate_total_cost())
-        except:
-            return format_to_turkish_currency(0)
+        # Kayıtlı maliyet; hammadde/çevrim değişince otomatik güncellenir
+        return format_to_turkish_currency(obj.unit_cost)
 
 # ----------------------------------------------------------------------
 # 9. KURYE YÖNETİMİ
@@ -1801,7 +1512,7 @@ actions = ['mark_as_delivered']
 
 @admin.action(description='Seçili Teslimatları Onaylandı Olarak İşaretle')
 def mark_as_delivered(self, request, queryset):
-    updated = queryset.update(is_confirmed=True)
+    updated = queryset.update(is_confirmed=True, updated_at=timezone.now())
     self.message_user(request, f"{updated} adet teslimat başarıyla onaylandı.")
 
 
@@ -1866,4 +1577,42 @@ class ReturnRequestAdmin(admin.ModelAdmin):
 
         # 3. Veritabanına doğrudan yaz (update kullanarak save sinyallerini bypass ederiz)
         # Bu işlem, IntegrityError (NOT NULL) hatasını da kesin engeller.
-        ReturnRequest.objects.filter(pk=instance.pk).update(amount=total)
\ No newline at end of file
+        ReturnRequest.objects.filter(pk=instance.pk).update(amount=total)
+
+# ----------------------------------------------------------------------
+# 13. RAPORLAMA: GÜNLÜK SATIŞ ÖZETİ
+# ----------------------------------------------------------------------
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    """Salt okunur; satırlar sipariş/teslimat/fatura değiştikçe otomatik yeniden hesaplanır."""
+    list_display = (
+        'date', 'dealer', 'product', 'quantity', 'delivered_quantity',
+        'get_net_amount_tl', 'get_vat_amount_tl', 'get_invoiced_net_amount_tl',
+    )
+    list_filter = ('date', 'dealer')
+    search_fields = ('dealer__name', 'product__name')
+    date_hierarchy = 'date'
+    ordering = ('-date', 'dealer__name', 'product__name')
+    list_select_related = ('dealer', 'product')
+
+    @admin.display(description="Net Tutar (TL)", ordering='net_amount')
+    def get_net_amount_tl(self, obj):
+        return format_to_turkish_currency(obj.net_amount)
+
+    @admin.display(description="KDV (TL)", ordering='vat_amount')
+    def get_vat_amount_tl(self, obj):
+        return format_to_turkish_currency(obj.vat_amount)
+
+    @admin.display(description="Faturalanan Net (TL)", ordering='invoiced_net_amount')
+    def get_invoiced_net_amount_tl(self, obj):
+        return format_to_turkish_currency(obj.invoiced_net_amount)
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
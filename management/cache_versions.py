@@ -0,0 +1,36 @@
+# ----------------------------------------------------------------------
+# management/cache_versions.py
+# Paylaşılan önbellekteki sürüm anahtarları (fiyat listesi, çevrim grafı, ürün ağacı, ayarlar)
+# ----------------------------------------------------------------------
+import time
+
+from django.core.cache import cache
+
+
+# Sürüm sayı olarak artırılmaz (incr), her değişiklikte yeni bir zaman damgası yazılır (set):
+# - FileBasedCache'in incr'i atomik değildir (oku-yaz); eşzamanlı iki artış aynı sürüme düşebilir
+#   ve aradaki eski veri o sürümle önbellekte kalırdı. İki damga aynı olmaz.
+# - Anahtar önbellekten düşerse (MAX_ENTRIES temizliği) yeni damga daha önce kullanılmamıştır,
+#   eski sürümle yazılmış kayıtlar tekrar okunmaz.
+def new_cache_version():
+    return time.time_ns()
+
+
+def get_cache_versions(keys):
+    """{anahtar: sürüm}; önbellekte olmayan sürüm anahtarları yeni bir damgayla oluşturulur."""
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_cache_version(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def get_cache_version(key):
+    return get_cache_versions([key]).get(key)
+
+
+def bump_cache_version(key):
+    """Sürümü değiştirir: bu sürümle önbelleğe yazılmış tüm kayıtlar artık okunmaz."""
+    cache.set(key, new_cache_version(), timeout=None)
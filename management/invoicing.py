@@ -0,0 +1,391 @@
+# ----------------------------------------------------------------------
+# management/invoicing.py
+# Fatura satırı hesaplama, fatura PDF üretimi ve toplu (arka plan) faturalama
+# ----------------------------------------------------------------------
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import django
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.db.models import F
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Delivery, Invoice, InvoiceBatch, InvoiceLine, convert_units_bulk, normalize_vat_rate
+from .pdf import DOCUMENT_TEMPLATES, render_pdf, get_pdf_backend, get_pdf_engine_name
+from .reporting import schedule_sales_rollup_update
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+INVOICE_TEMPLATE = DOCUMENT_TEMPLATES['invoice']
+
+# Şablonun görünümünü etkileyen (şablon dışı) bir değişiklik yapıldığında artırın;
+# önbellekteki tüm fatura PDF'leri yeniden üretilir. Şablon dosyasının içeriği zaten özete dahildir.
+INVOICE_TEMPLATE_VERSION = '1'
+
+
+# ----------------------------------------------------------------------
+# 1. FATURA SATIRLARI
+# ----------------------------------------------------------------------
+def build_invoice_lines(deliveries):
+    """
+    Teslimatlardan (kaydedilmemiş) InvoiceLine nesneleri üretir. Fatura satırı ve KDV
+    hesabının tek kaynağıdır; birim çevrimleri bellekteki çevrim tablosundan yapılır.
+    """
+    # Teslimat, kalem, ürün ve birimler tek sorguda çekilir
+    deliveries = list(deliveries.select_related(
+        'order_item__product__unit', 'order_item__ordered_unit'
+    ))
+
+    # Birim Çevrimi: 1 Sipariş Birimi (Koli) kaç Ana Birim (Adet) eder?
+    # Tüm satırların çarpanları tek çevrim tablosundan, tek geçişte hesaplanır.
+    conversion_factors = convert_units_bulk([
+        (1, delivery.order_item.ordered_unit_id, delivery.order_item.product.unit_id)
+        for delivery in deliveries
+    ])
+
+    lines = []
+    for position, (delivery, conversion_factor) in enumerate(zip(deliveries, conversion_factors), start=1):
+        order_item = delivery.order_item
+        product = order_item.product
+
+        # 1. KDV Oranı (0.10 veya 10 olarak girilmiş olabilir)
+        vat_rate = normalize_vat_rate(product.vat_rate)
+
+        # 2. Miktar ve Birim (Sipariş Birimi, örn: Koli)
+        delivered_qty = Decimal(str(delivery.delivered_quantity))
+        if order_item.ordered_unit:
+            unit_name = order_item.ordered_unit.name
+        else:
+            unit_name = product.unit.name if product.unit else ''
+
+        # 3. Fiyat Dönüştürme: Ana birim fiyatı (örn: Adet) -> sipariş birimi fiyatı (örn: Koli)
+        # Örn: 1 Koli = 10 Adet ise factor = 10. Çevrim tanımlı değilse ana birim fiyatı kullanılır.
+        conversion_factor = Decimal(str(conversion_factor)) or Decimal('1')
+        unit_price_vat_included = Decimal(str(order_item.unit_price_at_order)) * conversion_factor
+        unit_price = unit_price_vat_included / (Decimal('1') + vat_rate)
+
+        # 4. Satır Toplamları (kuruşa yuvarlanır; fatura toplamları satırların toplamıdır)
+        subtotal = (unit_price * delivered_qty).quantize(CENT, rounding=ROUND_HALF_UP)
+        vat_amount = (subtotal * vat_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+        lines.append(InvoiceLine(
+            delivery=delivery,
+            product=product,
+            position=position,
+            product_name=product.name,
+            unit_name=unit_name,
+            quantity=delivered_qty,
+            unit_price=unit_price.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP),
+            vat_rate=(vat_rate * 100).quantize(CENT, rounding=ROUND_HALF_UP),
+            subtotal=subtotal,
+            vat_amount=vat_amount,
+            line_total=subtotal + vat_amount,
+        ))
+
+    return lines
+
+
+def create_invoice_lines(invoices):
+    """
+    Faturaların satırlarını teslimatlardan hesaplayıp tek bulk_create ile yazar ve faturaların
+    nihai tutarını satır toplamı olarak günceller.
+    Teslimatlar tüm faturalar için tek sorguda okunur. Onaylı teslimatı olmayan
+    siparişlerde (eski kayıtlar) siparişin tüm teslimatları kullanılır.
+    """
+    invoices = list(invoices)
+    if not invoices:
+        return []
+
+    invoices_by_order = {invoice.order_id: invoice for invoice in invoices}
+    deliveries = Delivery.objects.filter(order_item__order_id__in=invoices_by_order)
+    confirmed_orders = deliveries.filter(is_confirmed=True).values('order_item__order_id')
+    deliveries = deliveries.filter(
+        models.Q(is_confirmed=True) | ~models.Q(order_item__order_id__in=confirmed_orders)
+    ).order_by('order_item__order_id', 'order_item_id')
+
+    lines = build_invoice_lines(deliveries)
+    positions = {}
+    for line in lines:
+        line.invoice = invoices_by_order[line.delivery.order_item.order_id]
+        positions[line.invoice.pk] = line.position = positions.get(line.invoice.pk, 0) + 1
+
+    lines = InvoiceLine.objects.bulk_create(lines)
+
+    # Nihai tutar, PDF'te ve fatura ekranında gösterilen satır toplamlarıyla aynı olmalı
+    totals = {}
+    for line in lines:
+        totals[line.invoice.pk] = totals.get(line.invoice.pk, Decimal('0.00')) + line.line_total
+    for invoice in invoices:
+        invoice.final_amount = totals.get(invoice.pk, Decimal('0.00'))
+    Invoice.objects.bulk_update(invoices, ['final_amount'])
+
+    # bulk_create sinyal göndermez; faturalanan tutarlar satış özetine commit sonrasında yansır
+    schedule_sales_rollup_update(order_ids=invoices_by_order)
+    return lines
+
+
+def get_invoice_line_rows(invoice):
+    """
+    Faturanın kayıtlı satırlarını şablon için sözlük olarak döndürür (tek sorgu).
+    Satırları hiç yazılmamış eski faturalarda satırlar bir kez oluşturulur.
+    """
+    fields = ('product_name', 'quantity', 'unit_price', 'subtotal', 'vat_rate', 'vat_amount', 'line_total')
+    rows = list(invoice.lines.order_by('position').values(*fields, unit=F('unit_name')))
+    if not rows:
+        with transaction.atomic():
+            create_invoice_lines([invoice])
+        rows = list(invoice.lines.order_by('position').values(*fields, unit=F('unit_name')))
+    return rows
+
+
+# ----------------------------------------------------------------------
+# 2. FATURA PDF ÜRETİMİ
+# ----------------------------------------------------------------------
+def build_invoice_context(invoice):
+    """Fatura şablonu için gerekli context'i hazırlar (tüm veritabanı okumaları burada yapılır)."""
+    order = invoice.order
+    lines = get_invoice_line_rows(invoice)
+
+    invoice_data = {
+        'invoice_number': invoice.invoice_number,
+        'invoice_date': invoice.invoice_date,
+        'dealer': invoice.dealer,
+        'order_id': order.id,
+        'invoice_lines': lines,
+        'vat_excluded_total': sum((line['subtotal'] for line in lines), Decimal('0.00')),
+        'total_vat': sum((line['vat_amount'] for line in lines), Decimal('0.00')),
+        'grand_total': sum((line['line_total'] for line in lines), Decimal('0.00')),
+    }
+    return {
+        'invoice': invoice_data,
+        'order': order,
+        'title': f"Fatura Detayı: {invoice.invoice_number}",
+        'is_pdf': True,
+    }
+
+
+def render_invoice_pdf(context, engine=None):
+    """
+    Hazır context'ten PDF üretir. Veritabanına erişmez; bu sayede transaction dışında
+    ve paralel iş parçacıklarında/süreçlerde güvenle çağrılabilir.
+    """
+    # Motor verilmezse settings.PDF_ENGINES['invoice'] ile seçilir (varsayılan: wkhtmltopdf)
+    return render_pdf('invoice', context, engine)
+
+
+def get_invoice_pdf_filename(invoice):
+    return f"FATURA_{invoice.invoice_number}_{invoice.dealer.name.replace(' ', '_')}.pdf"
+
+
+# ----------------------------------------------------------------------
+# 3. PDF ÖNBELLEĞİ (İÇERİK ÖZETİ İLE)
+# ----------------------------------------------------------------------
+_template_signatures = {}
+
+
+def get_invoice_template_signature():
+    """
+    PDF motoru, şablon sürümü ve şablon dosyası içeriğinin özeti (motor başına bir kez hesaplanır).
+    Motor değiştirildiğinde önbellekteki PDF'ler de yeniden üretilir.
+    """
+    engine = get_pdf_engine_name('invoice')
+    if engine not in _template_signatures or settings.DEBUG:
+        source = get_template(INVOICE_TEMPLATE).template.source
+        _template_signatures[engine] = hashlib.sha256(
+            f"{engine}:{INVOICE_TEMPLATE_VERSION}:{source}".encode('utf-8')
+        ).hexdigest()
+    return _template_signatures[engine]
+
+
+def compute_invoice_pdf_hash(context):
+    """PDF'e giren tüm fatura verisi ve şablon imzasından SHA-256 özeti üretir."""
+    invoice_data = dict(context['invoice'])
+    dealer = invoice_data.get('dealer')
+    invoice_data['dealer'] = getattr(dealer, 'name', dealer)
+
+    payload = json.dumps(
+        {'template': get_invoice_template_signature(), 'invoice': invoice_data},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def has_cached_invoice_pdf(invoice, pdf_hash):
+    return bool(invoice.pdf_file) and invoice.pdf_hash == pdf_hash and invoice.pdf_file.storage.exists(invoice.pdf_file.name)
+
+
+def store_invoice_pdf(invoice, pdf_hash, pdf_content):
+    """Üretilen PDF'i invoices/<hash>.pdf olarak kaydeder; eski (geçersiz) dosyayı siler."""
+    storage = invoice._meta.get_field('pdf_file').storage
+    old_name = invoice.pdf_file.name if invoice.pdf_file else None
+    name = f"invoices/{pdf_hash}.pdf"
+
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(pdf_content))
+
+    invoice.pdf_file.name = name
+    invoice.pdf_hash = pdf_hash
+    invoice.pdf_generated_at = timezone.now()
+    invoice.save(update_fields=['pdf_file', 'pdf_hash', 'pdf_generated_at'])
+
+    if old_name and old_name != name:
+        storage.delete(old_name)
+    return invoice
+
+
+def get_invoice_pdf(invoice, context=None, pdf_hash=None):
+    """
+    Faturanın güncel PDF'ini döndürür (bytes). Veri ve şablon değişmediyse önbellekteki
+    dosya okunur, aksi halde PDF yeniden üretilip önbelleğe yazılır.
+    """
+    context = context or build_invoice_context(invoice)
+    pdf_hash = pdf_hash or compute_invoice_pdf_hash(context)
+
+    if has_cached_invoice_pdf(invoice, pdf_hash):
+        with invoice.pdf_file.open('rb') as f:
+            return f.read()
+
+    pdf_content = render_invoice_pdf(context)
+    store_invoice_pdf(invoice, pdf_hash, pdf_content)
+    return pdf_content
+
+
+# ----------------------------------------------------------------------
+# 4. TOPLU FATURALAMA (ARKA PLAN)
+# ----------------------------------------------------------------------
+# Admin işlemi faturaları keser ve işi sıraya (PENDING) yazar; PDF'ler web sürecinde değil,
+# zamanlanmış görev olarak çalışan process_invoice_batches komutunda üretilir.
+def get_claimable_batch_filter(resume=False):
+    """
+    Başlatılabilecek işler: sıradakiler ve INVOICE_BATCH_STALE_AFTER saniyedir ilerleme
+    kaydetmeyen (işleyen süreci durmuş) işler. resume=True ise tüm İşleniyor durumundakiler.
+    """
+    if resume:
+        return models.Q(status__in=['PENDING', 'RUNNING'])
+
+    cutoff = timezone.now() - timedelta(seconds=settings.INVOICE_BATCH_STALE_AFTER)
+    return models.Q(status='PENDING') | models.Q(status='RUNNING') & (
+        models.Q(heartbeat_at__lt=cutoff) | models.Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+
+
+def record_batch_progress(batch_id, completed=0, failed=0):
+    InvoiceBatch.objects.filter(pk=batch_id).update(
+        completed_count=F('completed_count') + completed,
+        failed_count=F('failed_count') + failed,
+        heartbeat_at=timezone.now(),
+    )
+
+
+def get_pdf_executor(engine, max_workers):
+    """
+    wkhtmltopdf her PDF'i ayrı bir programda üretir, iş parçacıkları yeterlidir. Süreç içi
+    motorlar GIL'e takılmamak için ayrı Python süreçlerinde çalıştırılır.
+    """
+    if get_pdf_backend('invoice', engine).runs_external_process:
+        return ThreadPoolExecutor(max_workers=max_workers)
+    # Açık veritabanı bağlantıları fork ile kopyalanmasın diye süreçler sıfırdan başlatılır
+    # (yalnızca process_invoice_batches komutunda, yani gerçek Python yorumlayıcısında çalışır)
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+    )
+
+
+def process_invoice_batch(batch_id, resume=False, max_workers=None):
+    """
+    Toplu fatura işinin PDF'lerini üretir ve ZIP arşivine yazar.
+
+    process_invoice_batches komutundan çağrılır. Fatura verileri (context) önce okunur, PDF üretimi ise veritabanına
+    dokunmadan INVOICE_PDF_WORKERS kadar paralel yapılır (get_pdf_executor). İlerleme her
+    PDF'ten sonra veritabanına yazılır. Sıradaki ve yarıda kalmış (ilerleme kaydetmeyen) işler
+    alınır; resume=True ise İşleniyor durumundaki tüm işler yeniden başlatılır.
+    """
+    now = timezone.now()
+    claimed = InvoiceBatch.objects.filter(get_claimable_batch_filter(resume), pk=batch_id).update(
+        status='RUNNING',
+        started_at=now,
+        heartbeat_at=now,
+        completed_count=0,
+        failed_count=0,
+        error_log='',
+    )
+    if not claimed:
+        return None
+
+    batch = InvoiceBatch.objects.get(pk=batch_id)
+    invoices = list(batch.invoices.select_related('order', 'dealer').order_by('invoice_number'))
+    max_workers = max_workers or getattr(settings, 'INVOICE_PDF_WORKERS', 4)
+    # Motor burada bir kez seçilir; ayrı süreçlerdeki üretim de aynı motoru kullanır
+    engine = get_pdf_engine_name('invoice')
+
+    errors = []
+    jobs = {}
+    for invoice in invoices:
+        try:
+            context = build_invoice_context(invoice)
+            jobs[invoice.pk] = (invoice, context, compute_invoice_pdf_hash(context))
+        except Exception as e:
+            errors.append(f"{invoice.invoice_number}: {e}")
+            record_batch_progress(batch_id, failed=1)
+
+    with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as tmp:
+        zip_path = tmp.name
+
+    try:
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive, \
+                get_pdf_executor(engine, max_workers) as executor:
+            futures = {}
+            for invoice, context, pdf_hash in jobs.values():
+                # Önbellekte güncel PDF'i olan faturalar yeniden üretilmez
+                if has_cached_invoice_pdf(invoice, pdf_hash):
+                    with invoice.pdf_file.open('rb') as f:
+                        archive.writestr(get_invoice_pdf_filename(invoice), f.read())
+                    record_batch_progress(batch_id, completed=1)
+                    continue
+                futures[executor.submit(render_invoice_pdf, context, engine)] = (invoice, pdf_hash)
+
+            for future in as_completed(futures):
+                invoice, pdf_hash = futures[future]
+                try:
+                    pdf_content = future.result()
+                    store_invoice_pdf(invoice, pdf_hash, pdf_content)
+                    archive.writestr(get_invoice_pdf_filename(invoice), pdf_content)
+                    record_batch_progress(batch_id, completed=1)
+                except Exception as e:
+                    errors.append(f"{invoice.invoice_number}: {e}")
+                    record_batch_progress(batch_id, failed=1)
+
+        batch.refresh_from_db()
+        if batch.completed_count:
+            with open(zip_path, 'rb') as f:
+                batch.archive.save(f"toplu_fatura_{batch.pk}.zip", File(f), save=False)
+
+        batch.status = 'COMPLETED' if batch.completed_count or not invoices else 'FAILED'
+        batch.error_log = "\n".join(errors)
+        batch.finished_at = timezone.now()
+        batch.save(update_fields=['archive', 'status', 'error_log', 'finished_at'])
+    except Exception as e:
+        errors.append(str(e))
+        InvoiceBatch.objects.filter(pk=batch_id).update(
+            status='FAILED', error_log="\n".join(errors), finished_at=timezone.now()
+        )
+        raise
+    finally:
+        os.remove(zip_path)
+
+    return batch
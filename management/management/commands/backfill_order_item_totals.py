@@ -0,0 +1,56 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from management.models import OrderItem, calculate_order_item_amounts, get_conversion_graph
+
+
+class Command(BaseCommand):
+    help = (
+        "Sipariş kalemlerinin ana birim miktarını (base_quantity) ve çevrimli satır "
+        "toplamını (line_total_amount) parça parça yeniden hesaplar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Her işlemde güncellenecek kalem sayısı (varsayılan: 1000)."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        graph = get_conversion_graph()
+        last_pk = 0
+        updated = 0
+
+        while True:
+            rows = list(
+                OrderItem.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', 'ordered_quantity', 'ordered_unit_id', 'product__unit_id', 'unit_price_at_order'
+                )[:batch_size]
+            )
+            if not rows:
+                break
+
+            items = []
+            for pk, quantity, ordered_unit_id, product_unit_id, unit_price in rows:
+                base_quantity, line_total = calculate_order_item_amounts(
+                    quantity, ordered_unit_id, product_unit_id, unit_price, graph
+                )
+                items.append(OrderItem(
+                    pk=pk,
+                    base_quantity=base_quantity.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP),
+                    line_total_amount=line_total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+                ))
+
+            with transaction.atomic():
+                OrderItem.objects.bulk_update(items, ['base_quantity', 'line_total_amount'])
+
+            updated += len(items)
+            last_pk = rows[-1][0]
+            self.stdout.write(f"{updated} kalem güncellendi...")
+
+        self.stdout.write(self.style.SUCCESS(f"Toplam {updated} sipariş kalemi güncellendi."))
@@ -0,0 +1,74 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from management.models import Dealer, Order
+
+
+class BenchmarkRollback(Exception):
+    """Ölçüm verisini geri almak için transaction'dan bilerek çıkılır."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Order.save yolunu ölçer: yeni sipariş, yüklenmiş siparişte durum değişikliği ve "
+        "update_fields ile kayıt için saniyedeki kayıt ve kayıt başına sorgu sayısı. "
+        "Tüm ölçüm verisi transaction sonunda geri alınır."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500, help="Senaryo başına kayıt sayısı.")
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count < 1:
+            raise CommandError("--count en az 1 olmalıdır.")
+
+        header = f"{'Senaryo':<28}{'Kayıt/sn':>12}{'Sorgu/kayıt':>14}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username='__benchmark_order_save__')
+                dealer = Dealer.objects.create(user=user, name="Ölçüm Bayisi", tax_id='__benchmark__')
+
+                self.measure("Yeni sipariş", count, lambda i: Order(dealer=dealer).save())
+
+                orders = list(Order.objects.filter(dealer=dealer).order_by('pk'))
+
+                def change_status(i):
+                    order = orders[i]
+                    order.status = 'PREP' if order.status == 'NEW' else 'NEW'
+                    order.save()
+
+                self.measure("Durum değişikliği (save)", count, change_status)
+
+                def change_status_fields(i):
+                    order = orders[i]
+                    order.status = 'PREP' if order.status == 'NEW' else 'NEW'
+                    order.save(update_fields=['status'])
+
+                self.measure("Durum (update_fields)", count, change_status_fields)
+
+                raise BenchmarkRollback
+        except BenchmarkRollback:
+            pass
+
+    def measure(self, label, count, save):
+        executed = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal executed
+            executed += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            start = time.perf_counter()
+            for i in range(count):
+                save(i)
+            elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"{label:<28}{count / elapsed:>12.0f}{executed / count:>14.1f}")
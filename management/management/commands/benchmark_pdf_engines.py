@@ -0,0 +1,187 @@
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from management.pdf import DOCUMENT_TEMPLATES, PDF_BACKENDS, get_pdf_backend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _child_max_rss_kb():
+    """Alt süreçlerin (wkhtmltopdf) en yüksek bellek kullanımı (KB, Linux)."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def sample_invoice_context(lines):
+    invoice_lines = []
+    for i in range(lines):
+        subtotal = Decimal('100.00') + i
+        vat_amount = subtotal * Decimal('0.10')
+        invoice_lines.append({
+            'product_name': f"Örnek Ürün {i + 1} (Çikolatalı Pasta)",
+            'unit': 'Koli',
+            'quantity': Decimal('5'),
+            'unit_price': subtotal / 5,
+            'subtotal': subtotal,
+            'vat_rate': Decimal('10'),
+            'vat_amount': vat_amount,
+            'line_total': subtotal + vat_amount,
+        })
+    return {
+        'invoice': {
+            'invoice_number': '100000',
+            'invoice_date': timezone.now(),
+            'dealer': SimpleNamespace(name="Örnek Bayi Şubesi"),
+            'order_id': 1,
+            'invoice_lines': invoice_lines,
+            'vat_excluded_total': sum(l['subtotal'] for l in invoice_lines),
+            'total_vat': sum(l['vat_amount'] for l in invoice_lines),
+            'grand_total': sum(l['line_total'] for l in invoice_lines),
+        },
+        'is_pdf': True,
+    }
+
+
+def sample_order_context(lines):
+    items = [
+        SimpleNamespace(
+            product=SimpleNamespace(name=f"Örnek Ürün {i + 1}"),
+            ordered_quantity=Decimal('3'),
+            ordered_unit=SimpleNamespace(name='Adet'),
+            unit_price_at_order=Decimal('12.50'),
+            line_total_amount=Decimal('37.50'),
+        )
+        for i in range(lines)
+    ]
+    order = SimpleNamespace(
+        id=1,
+        order_date=timezone.now(),
+        estimated_total=Decimal('37.50') * lines,
+        items=SimpleNamespace(all=lambda: items),
+    )
+    return {'order': order}
+
+
+def sample_production_list_context(lines):
+    return {
+        'product_totals': [
+            {'product__name': f"Örnek Ürün {i + 1}", 'total_quantity': Decimal('24'), 'birim': 'Adet'}
+            for i in range(lines)
+        ],
+        'intermediate_totals': [
+            {'product__name': f"Ara Ürün {i + 1} (Krema)", 'total_quantity': Decimal('3.5'), 'birim': 'kg'}
+            for i in range(max(1, lines // 4))
+        ],
+        'material_totals': [
+            {'raw_material__name': f"Hammadde {i + 1} (Şeker)", 'needed_amount': Decimal('12.5'), 'birim': 'kg'}
+            for i in range(lines)
+        ],
+        'date': timezone.now(),
+        'order_count': lines,
+    }
+
+
+SAMPLE_CONTEXTS = {
+    'invoice': sample_invoice_context,
+    'order': sample_order_context,
+    'production_list': sample_production_list_context,
+}
+
+
+class Command(BaseCommand):
+    help = "PDF motorlarını (wkhtmltopdf, xhtml2pdf, reportlab) belge başına süre ve bellek kullanımıyla karşılaştırır."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--document', choices=sorted(DOCUMENT_TEMPLATES) + ['all'], default='all',
+            help="Ölçülecek belge türü (varsayılan: hepsi)."
+        )
+        parser.add_argument(
+            '--engine', choices=sorted(PDF_BACKENDS), action='append',
+            help="Yalnızca bu motorları ölç (birden fazla verilebilir)."
+        )
+        parser.add_argument('--iterations', type=int, default=10, help="Belge başına tekrar sayısı.")
+        parser.add_argument('--lines', type=int, default=20, help="Örnek belgelerdeki satır sayısı.")
+        parser.add_argument('--invoice-id', type=int, help="Örnek yerine bu faturanın gerçek verisini kullan.")
+        parser.add_argument('--order-id', type=int, help="Örnek yerine bu siparişin gerçek verisini kullan.")
+
+    def get_context(self, document, options):
+        if document == 'invoice' and options['invoice_id']:
+            from management.invoicing import build_invoice_context
+            from management.models import Invoice
+
+            invoice = Invoice.objects.select_related('order', 'dealer').get(pk=options['invoice_id'])
+            return build_invoice_context(invoice)
+
+        if document == 'order' and options['order_id']:
+            from management.models import Order
+
+            order = Order.objects.prefetch_related('items__product', 'items__ordered_unit').get(pk=options['order_id'])
+            return {'order': order}
+
+        return SAMPLE_CONTEXTS[document](options['lines'])
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations en az 1 olmalıdır.")
+
+        documents = sorted(DOCUMENT_TEMPLATES) if options['document'] == 'all' else [options['document']]
+        engines = options['engine'] or sorted(PDF_BACKENDS)
+
+        header = f"{'Belge':<16}{'Motor':<13}{'Ort. ms':>10}{'p95 ms':>10}{'Py tepe KB':>12}{'Alt süreç KB':>14}{'Boyut B':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for document in documents:
+            context = self.get_context(document, options)
+
+            for engine in engines:
+                backend = get_pdf_backend(document, engine)
+
+                # Isınma: font kaydı, import ve şablon derleme ölçüme katılmaz
+                try:
+                    backend.render(document, context)
+                except Exception as e:
+                    self.stdout.write(f"{document:<16}{engine:<13}  kullanılamıyor: {str(e).splitlines()[0]}")
+                    continue
+
+                timings = []
+                child_rss_before = _child_max_rss_kb()
+
+                for _ in range(options['iterations']):
+                    start = time.perf_counter()
+                    pdf_content = backend.render(document, context)
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                child_rss_after = _child_max_rss_kb()
+                size = len(pdf_content)
+
+                # Bellek ölçümü ayrı yapılır; tracemalloc süre ölçümünü yavaşlatır
+                tracemalloc.start()
+                backend.render(document, context)
+                peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+                tracemalloc.stop()
+                child_rss = '-'
+                if engine == 'wkhtmltopdf' and child_rss_after is not None:
+                    child_rss = str(max(child_rss_after, child_rss_before or 0))
+
+                p95 = sorted(timings)[max(0, int(round(len(timings) * 0.95)) - 1)]
+                self.stdout.write(
+                    f"{document:<16}{engine:<13}{statistics.mean(timings):>10.1f}{p95:>10.1f}"
+                    f"{peak_kb:>12}{child_rss:>14}{size:>10}"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            "Not: 'Py tepe KB' süreç içi Python bellek tepe değeridir (tracemalloc); "
+            "wkhtmltopdf için asıl bellek 'Alt süreç KB' sütunundadır."
+        ))
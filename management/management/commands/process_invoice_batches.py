@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from management.invoicing import get_claimable_batch_filter, process_invoice_batch
+from management.models import InvoiceBatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Bekleyen ve yarıda kalmış (INVOICE_BATCH_STALE_AFTER saniyedir ilerleme kaydetmeyen) "
+        "toplu fatura işlerinin PDF'lerini üretir. Admin işleri yalnızca sıraya yazar; bu komut "
+        "zamanlanmış görev olarak (örn. her dakika) çalıştırılmalıdır. --resume ile İşleniyor "
+        "durumundaki tüm işler beklemeden yeniden çalıştırılır."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resume', action='store_true', help="İşleniyor durumundaki tüm işleri yeniden çalıştır.")
+        parser.add_argument('--workers', type=int, default=None, help="Aynı anda üretilecek PDF sayısı.")
+
+    def handle(self, *args, **options):
+        batch_ids = list(
+            InvoiceBatch.objects.filter(get_claimable_batch_filter(options['resume']))
+            .order_by('created_at').values_list('pk', flat=True)
+        )
+
+        if not batch_ids:
+            self.stdout.write("İşlenecek toplu fatura işi yok.")
+            return
+
+        for batch_id in batch_ids:
+            batch = process_invoice_batch(batch_id, resume=options['resume'], max_workers=options['workers'])
+            if batch is None:
+                continue
+            self.stdout.write(
+                f"Toplu Fatura #{batch.pk}: {batch.completed_count}/{batch.total_count} PDF üretildi, "
+                f"{batch.failed_count} hatalı ({batch.get_status_display()})."
+            )
+
+        self.stdout.write(self.style.SUCCESS("Toplu fatura işleri tamamlandı."))
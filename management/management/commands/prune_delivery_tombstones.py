@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from management.models import DeliveryTombstone
+
+
+class Command(BaseCommand):
+    help = "Saklama süresini aşan teslimat silinme izlerini (kurye senkronizasyonu) temizler."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'COURIER_SYNC_TOMBSTONE_RETENTION_DAYS', 30),
+            help="Bu günden eski izler silinir (varsayılan: COURIER_SYNC_TOMBSTONE_RETENTION_DAYS)."
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = DeliveryTombstone.objects.filter(removed_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} adet silinme izi temizlendi."))
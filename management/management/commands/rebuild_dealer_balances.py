@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from management.models import Dealer, Transaction
+
+
+class Command(BaseCommand):
+    help = "Bayi bakiyelerini (Dealer.balance) cari hareketlerden yeniden hesaplar ve doğrular."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help="Sadece doğrula; farklı bakiye varsa hata koduyla çık, kayıtları değiştirme."
+        )
+
+    def handle(self, *args, **options):
+        verify_only = options['verify']
+        cent = Decimal('0.01')
+
+        with transaction.atomic():
+            dealers = Dealer.objects.only('id', 'name', 'balance').order_by('id')
+            if not verify_only:
+                # Yeniden hesaplama sırasında yeni hareketlerin bakiyeyi değiştirmesini engelle
+                dealers = dealers.select_for_update()
+            dealers = list(dealers)
+
+            ledger = Transaction.objects.all().balance_deltas()
+
+            mismatched = []
+            for dealer in dealers:
+                expected = Decimal(str(ledger.get(dealer.id, Decimal('0.00')))).quantize(cent)
+                if Decimal(str(dealer.balance)).quantize(cent) != expected:
+                    mismatched.append((dealer, dealer.balance, expected))
+                    dealer.balance = expected
+
+            if mismatched and not verify_only:
+                Dealer.objects.bulk_update([dealer for dealer, _, _ in mismatched], ['balance'], batch_size=500)
+
+        for dealer, stored, expected in mismatched:
+            self.stdout.write(f"{dealer.name} (#{dealer.id}): kayıtlı={stored} hesaplanan={expected}")
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS(f"{len(dealers)} bayinin bakiyesi cari hareketlerle tutarlı."))
+        elif verify_only:
+            raise CommandError(f"{len(mismatched)} bayinin bakiyesi cari hareketlerle tutarsız.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(mismatched)} bayinin bakiyesi yeniden hesaplandı."))
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from management.reporting import rebuild_daily_sales_rollup
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Geçersiz tarih: {value} (YYYY-AA-GG bekleniyor)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Günlük satış özetini (DailySalesRollup) sipariş, teslimat ve fatura kayıtlarından yeniden "
+        "oluşturur. Normalde değişiklikte otomatik güncellenir; ilk kurulum, toplu veri aktarımı ve "
+        "ürün KDV oranı değişikliği sonrası için."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date, help="Başlangıç günü (YYYY-AA-GG, dahil).")
+        parser.add_argument('--end', type=parse_date, help="Bitiş günü (YYYY-AA-GG, dahil).")
+
+    def handle(self, *args, **options):
+        start_date, end_date = options['start'], options['end']
+        if start_date and end_date and start_date > end_date:
+            raise CommandError("--start, --end tarihinden sonra olamaz.")
+
+        written = rebuild_daily_sales_rollup(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f"{written} özet satırı yeniden oluşturuldu."))
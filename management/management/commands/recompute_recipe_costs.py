@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from management.production import update_recipe_costs
+
+
+class Command(BaseCommand):
+    help = (
+        "Reçetelerin kayıtlı birim maliyetini (Recipe.unit_cost) hammadde fiyatları ve birim "
+        "çevrimlerinden yeniden hesaplar. Normalde değişiklikte otomatik güncellenir; ilk kurulum "
+        "ve toplu veri aktarımı sonrası için."
+    )
+
+    def handle(self, *args, **options):
+        updated = update_recipe_costs(all_recipes=True)
+        self.stdout.write(self.style.SUCCESS(f"{updated} reçetenin birim maliyeti güncellendi."))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:25
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, Sum, Case, When, Value
+
+
+def populate_dealer_balances(apps, schema_editor):
+    """Mevcut cari hareketlerden her bayinin başlangıç bakiyesini hesaplar."""
+    Dealer = apps.get_model('management', 'Dealer')
+    Transaction = apps.get_model('management', 'Transaction')
+    db_alias = schema_editor.connection.alias
+
+    signed_amount = Case(
+        When(transaction_type='DEBT', then=F('amount')),
+        When(transaction_type__in=['COLLECTION', 'RETURN'], then=-F('amount')),
+        default=Value(Decimal('0.00')),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2)
+    )
+    rows = Transaction.objects.using(db_alias).order_by().values('dealer_id').annotate(delta=Sum(signed_amount))
+
+    for row in rows:
+        Dealer.objects.using(db_alias).filter(pk=row['dealer_id']).update(
+            balance=(row['delta'] or Decimal('0.00'))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0042_product_description_product_image_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dealer',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Cari Bakiye'),
+        ),
+        migrations.RunPython(populate_dealer_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:28
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0043_dealer_balance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='base_quantity',
+            field=models.DecimalField(decimal_places=4, default=Decimal('0'), editable=False, max_digits=14, verbose_name='Ana Birim Cinsinden Miktar'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Satır Toplamı (Çevrimli)'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date'], name='management__order_d_4ba904_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['dealer', 'order_date'], name='management__dealer__ca05a8_idx'),
+        ),
+    ]
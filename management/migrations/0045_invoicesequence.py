@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0044_orderitem_base_quantity_line_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('series', models.CharField(max_length=20, unique=True, verbose_name='Seri')),
+                ('last_number', models.PositiveBigIntegerField(default=0, verbose_name='Son Verilen Numara')),
+            ],
+            options={
+                'verbose_name': 'Fatura Numara Serisi',
+                'verbose_name_plural': 'Fatura Numara Serileri',
+            },
+        ),
+    ]
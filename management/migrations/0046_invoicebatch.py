@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0045_invoicesequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Sırada'), ('RUNNING', 'İşleniyor'), ('COMPLETED', 'Tamamlandı'), ('FAILED', 'Hatalı')], db_index=True, default='PENDING', max_length=10, verbose_name='Durum')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Oluşturulma Tarihi')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Başlama Zamanı')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Bitiş Zamanı')),
+                ('total_count', models.PositiveIntegerField(default=0, verbose_name='Toplam Fatura')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Üretilen PDF')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Hatalı PDF')),
+                ('archive', models.FileField(blank=True, null=True, upload_to='invoice_batches/', verbose_name='PDF Arşivi (ZIP)')),
+                ('error_log', models.TextField(blank=True, verbose_name='Hata Kayıtları')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Oluşturan')),
+                ('invoices', models.ManyToManyField(related_name='batches', to='management.invoice', verbose_name='Faturalar')),
+            ],
+            options={
+                'verbose_name': 'Toplu Fatura İşi',
+                'verbose_name_plural': 'Toplu Fatura İşleri',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0046_invoicebatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf_file',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to='invoices/', verbose_name='Fatura PDF'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf_generated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='PDF Üretim Zamanı'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='PDF Özeti'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0047_invoice_pdf_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0, verbose_name='Sıra')),
+                ('product_name', models.CharField(max_length=200, verbose_name='Ürün Adı')),
+                ('unit_name', models.CharField(blank=True, max_length=50, verbose_name='Birim')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Miktar')),
+                ('unit_price', models.DecimalField(decimal_places=4, max_digits=14, verbose_name='Birim Fiyat (KDV Hariç)')),
+                ('vat_rate', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='KDV Oranı (%)')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Ara Toplam (KDV Hariç)')),
+                ('vat_amount', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='KDV Tutarı')),
+                ('line_total', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Satır Toplamı (KDV Dahil)')),
+                ('delivery', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice_lines', to='management.delivery', verbose_name='Teslimat')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='management.invoice', verbose_name='Fatura')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='management.product', verbose_name='Ürün')),
+            ],
+            options={
+                'verbose_name': 'Fatura Satırı',
+                'verbose_name_plural': 'Fatura Satırları',
+                'ordering': ['invoice', 'position'],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0048_invoiceline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Son Güncelleme'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Son Güncelleme'),
+        ),
+        migrations.CreateModel(
+            name='DeliveryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delivery_id', models.PositiveIntegerField(verbose_name='Teslimat ID')),
+                ('removed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Kaldırılma Zamanı')),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_tombstones', to='management.courier', verbose_name='Kurye')),
+            ],
+            options={
+                'verbose_name': 'Teslimat Silinme İzi',
+                'verbose_name_plural': 'Teslimat Silinme İzleri',
+                'indexes': [models.Index(fields=['courier', 'removed_at'], name='management__courier_b661cc_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0049_delivery_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryConfirmationReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64, verbose_name='İşlem Anahtarı')),
+                ('delivery_id', models.PositiveIntegerField(verbose_name='Teslimat ID')),
+                ('delivered_quantity', models.PositiveIntegerField(default=0, verbose_name='Teslim Edilen Miktar')),
+                ('status', models.CharField(choices=[('APPLIED', 'Uygulandı'), ('REJECTED', 'Reddedildi')], max_length=10, verbose_name='Sonuç')),
+                ('detail', models.CharField(blank=True, max_length=255, verbose_name='Açıklama')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='İşlem Zamanı')),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='confirmation_receipts', to='management.courier', verbose_name='Kurye')),
+            ],
+            options={
+                'verbose_name': 'Teslimat Onay Kaydı',
+                'verbose_name_plural': 'Teslimat Onay Kayıtları',
+                'unique_together': {('courier', 'idempotency_key')},
+            },
+        ),
+    ]
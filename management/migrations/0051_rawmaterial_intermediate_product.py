@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0050_deliveryconfirmationreceipt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rawmaterial',
+            name='intermediate_product',
+            field=models.OneToOneField(blank=True, help_text='Bu hammadde işletmede üretiliyorsa, reçetesi tanımlı ürünü seçin.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='as_raw_material', to='management.product', verbose_name='Ara Ürün (Kendi Reçetesi)'),
+        ),
+    ]
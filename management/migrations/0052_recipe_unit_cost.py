@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:49
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0051_rawmaterial_intermediate_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cost_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Maliyet Hesaplama Zamanı'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=4, default=Decimal('0'), editable=False, max_digits=12, verbose_name='Birim Maliyet (1 Ana Birim)'),
+        ),
+    ]
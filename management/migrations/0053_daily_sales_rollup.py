@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:53
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0052_recipe_unit_cost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Tarih')),
+                ('quantity', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=16, verbose_name='Sipariş Miktarı')),
+                ('delivered_quantity', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=16, verbose_name='Teslim Edilen Miktar')),
+                ('net_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Net Tutar (KDV Hariç)')),
+                ('vat_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='KDV Tutarı')),
+                ('invoiced_net_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Faturalanan Net Tutar')),
+                ('invoiced_vat_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Faturalanan KDV')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Son Hesaplama')),
+                ('dealer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='management.dealer', verbose_name='Bayi')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='management.product', verbose_name='Ürün')),
+            ],
+            options={
+                'verbose_name': 'Günlük Satış Özeti',
+                'verbose_name_plural': 'Günlük Satış Özetleri',
+                'indexes': [models.Index(fields=['dealer', 'date'], name='management__dealer__48eb8f_idx'), models.Index(fields=['product', 'date'], name='management__product_b8ddfc_idx')],
+                'unique_together': {('date', 'dealer', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0053_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartnerLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Tutar (TL)')),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Hareket Sonrası Bakiye (TL)')),
+                ('description', models.CharField(blank=True, max_length=255, verbose_name='Açıklama')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Tarih')),
+                ('distribution', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='management.profitdistribution', verbose_name='Kâr Dağıtım Kaydı')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='management.partner', verbose_name='Ortak')),
+            ],
+            options={
+                'verbose_name': 'Ortak Cari Hareketi',
+                'verbose_name_plural': 'Ortak Cari Hareketleri',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['partner', 'created_at'], name='management__partner_d3a077_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0054_partner_ledger_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoicebatch',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Son İlerleme'),
+        ),
+    ]
@@ -1,5 +1,12 @@
+import threading
+import time
+from collections import deque
 from decimal import Decimal, ROUND_HALF_UP
-from django.db import models
+from fractions import Fraction
+from django.conf import settings
+from django.db import models, transaction as db_transaction, IntegrityError
+from django.db.models import F, Sum, Case, When, Value
+from django.db.models.functions import Cast
 from django.contrib.auth.models import User
 from django.utils import timezone 
 from django.contrib import admin
@@ -8,6 +15,9 @@ from django.contrib.contenttypes.models import ContentType
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError 
+
+from .cache_versions import bump_cache_version, get_cache_version
+
 # ----------------------------------------------------
 # 1. TEMEL YAPILAR (Unit, Conversion, Helper Functions)
 # ----------------------------------------------------
@@ -27,61 +37,216 @@ class Unit(models.Model):
 # BİRİM ÇEVRİM YARDIMCI FONKSİYONU
 # ----------------------------------------------------------------------
 
-def convert_unit(quantity, source_unit, target_unit):
-    """Miktarı, kaynak birimden hedef birime çevirir. Unit objesi alır."""
-    from .models import UnitConversion # Model importu fonk. içine taşındı
-    
+class UnitConversionGraph:
+    """
+    Tüm birim çevrimlerini bellekte tutan graf. Doğrudan (A -> B), ters (B -> A) ve
+    çok adımlı (koli -> adet -> gr) çevrimleri çözer. Çarpanlar Fraction olarak
+    tutulur; ara adımlarda yuvarlama hatası birikmez.
+    """
+
+    def __init__(self, conversions):
+        # conversions: (kaynak_birim_id, hedef_birim_id, çarpan) üçlüleri
+        conversions = [
+            (source_id, target_id, Fraction(Decimal(str(factor))))
+            for source_id, target_id, factor in conversions
+        ]
+        self.edges = {}
+
+        # 1. Tanımlı çevrimler (doğrudan tanım her zaman önceliklidir)
+        for source_id, target_id, factor in conversions:
+            # Çevrim faktörü 0 ise miktarı olduğu gibi bırak (eski davranış: 1 çarpanı)
+            self.edges.setdefault(source_id, {})[target_id] = factor or Fraction(1)
+
+        # 2. Ters çevrimler (yalnızca o yön ayrıca tanımlanmamışsa)
+        for source_id, target_id, factor in conversions:
+            self.edges.setdefault(target_id, {}).setdefault(source_id, 1 / (factor or Fraction(1)))
+
+        self._factors = {}
+
+    def factor(self, source_id, target_id):
+        """Kaynak birimden hedef birime çarpanı döndürür, yol yoksa None."""
+        if source_id == target_id:
+            return Fraction(1)
+
+        key = (source_id, target_id)
+        if key not in self._factors:
+            self._factors[key] = self._find_factor(source_id, target_id)
+        return self._factors[key]
+
+    def _find_factor(self, source_id, target_id):
+        # En az adımlı yolu bul (BFS); kısa yol daha az ara çevrim demektir
+        visited = {source_id: Fraction(1)}
+        queue = deque([source_id])
+        while queue:
+            unit_id = queue.popleft()
+            for next_id, factor in self.edges.get(unit_id, {}).items():
+                if next_id in visited:
+                    continue
+                visited[next_id] = visited[unit_id] * factor
+                if next_id == target_id:
+                    return visited[next_id]
+                queue.append(next_id)
+        return None
+
+
+# Çevrimler saklanan tutarlara (satır toplamı, borç, fatura) yansır: bir süreçteki değişiklik
+# paylaşılan önbellekteki sürüm değiştirilerek diğer süreçlere de bildirilir
+CONVERSION_GRAPH_VERSION_KEY = 'units:conversion_graph:version'
+
+# (graf, paylaşılan sürüm, sürümün kontrol zamanı, yüklenme zamanı)
+_conversion_graph = None
+_conversion_graph_generation = 0
+_conversion_graph_lock = threading.Lock()
+
+
+def get_conversion_graph():
+    """
+    Süreç genelinde paylaşılan çevrim grafını döndürür. Paylaşılan sürüm en fazla
+    UNIT_CONVERSION_CHECK_INTERVAL saniyede bir kontrol edilir; sürüm değiştiyse veya graf
+    UNIT_CONVERSION_MAX_AGE saniyeden eskiyse yeniden yüklenir.
+    """
+    global _conversion_graph
+
+    now = time.monotonic()
+    cached = _conversion_graph
+    if cached is not None and now - cached[2] < settings.UNIT_CONVERSION_CHECK_INTERVAL:
+        return cached[0]
+
+    with _conversion_graph_lock:
+        cached = _conversion_graph
+        if cached is not None and now - cached[2] < settings.UNIT_CONVERSION_CHECK_INTERVAL:
+            return cached[0]
+
+        generation = _conversion_graph_generation
+        version = get_cache_version(CONVERSION_GRAPH_VERSION_KEY)
+        if cached is not None and cached[1] == version and now - cached[3] < settings.UNIT_CONVERSION_MAX_AGE:
+            graph, loaded_at = cached[0], cached[3]
+        else:
+            graph, loaded_at = UnitConversionGraph(
+                UnitConversion.objects.values_list('source_unit_id', 'target_unit_id', 'conversion_factor')
+            ), now
+
+        # Yükleme sırasında çevrimler değiştiyse eski grafı saklama
+        if generation == _conversion_graph_generation:
+            _conversion_graph = (graph, version, now, loaded_at)
+        return graph
+
+
+def invalidate_conversion_graph():
+    """Çevrim grafını bu süreçte geçersiz kılar, paylaşılan sürümü değiştirir (diğer süreçler yeniden yükler)."""
+    global _conversion_graph, _conversion_graph_generation
+    _conversion_graph_generation += 1
+    _conversion_graph = None
+    bump_cache_version(CONVERSION_GRAPH_VERSION_KEY)
+
+
+def fraction_to_decimal(value):
+    return Decimal(value.numerator) / Decimal(value.denominator)
+
+
+def _convert_with_graph(graph, quantity, source_id, target_id):
+    """convert_unit ve convert_units_bulk için ortak çevrim adımı."""
     # 1. Miktar Decimal değilse Decimal'e çevir
     try:
         quantity = Decimal(str(quantity))
     except:
         return Decimal('0.00') # Miktar okunamıyorsa 0 dön
-        
+
     # 2. Birimler aynıysa çevrim yapma
-    if source_unit == target_unit:
+    if source_id == target_id:
         return quantity
-    
-    # 3. Çevrim Tanımlamasını Ara
+
+    if source_id is None or target_id is None:
+        return Decimal('0.00')
+
+    # 3. Çevrim yolunu graf üzerinde ara (doğrudan, ters veya çok adımlı)
     try:
-        # Doğrudan çevrim var mı? (A -> B)
-        conversion = UnitConversion.objects.get(
-            source_unit=source_unit,
-            target_unit=target_unit
-        )
-        factor = Decimal(str(conversion.conversion_factor))
-        
-        # Çevrim faktörü 0 ise bölme hatasını engelle
-        if factor == Decimal('0.00'):
-            return quantity 
-
-        return quantity * factor
-    
-    except UnitConversion.DoesNotExist:
-        try:
-            # Ters çevrim var mı? (B -> A)
-            conversion = UnitConversion.objects.get(
-                source_unit=target_unit,
-                target_unit=source_unit
-            )
-            factor = Decimal(str(conversion.conversion_factor))
+        factor = graph.factor(source_id, target_id)
+        if factor is None:
+            # Çevrim yoksa 0 dön (hesaplamada bu kalem atlanır)
+            return Decimal('0.00')
 
-            # Çevrim faktörü 0 ise ZeroDivisionError hatasını engelle
-            if factor == Decimal('0.00'):
-                return quantity
-                
-            return quantity / factor
-            
-        except UnitConversion.DoesNotExist:
-            # KRİTİK: Çevrim yoksa, HATA VERMELİ veya bu kalemi atlamalıyız.
-            # Hesaplama sırasında 0 dönmek, toplam maliyeti sıfırlar.
-            # Veri kaybetmemek adına, çevrim yoksa miktarı olduğu gibi bırakalım (1 çarpanı gibi).
-            # ANCAK bu, hatalı sonuç verebilir. En güvenlisi 0 dönmektir, ama madem 0 istenmiyor:
-            return Decimal('0.00') 
+        return fraction_to_decimal(Fraction(quantity) * factor)
 
     except Exception:
         # Diğer hatalar (örneğin Decimal çevrim hatası)
         return Decimal('0.00')
 
+
+def convert_unit(quantity, source_unit, target_unit):
+    """
+    Miktarı, kaynak birimden hedef birime çevirir. Unit objesi (veya Unit id) alır.
+    Çevrimler bellekteki graf üzerinden çözülür, veritabanı sorgusu yapılmaz.
+    """
+    return _convert_with_graph(
+        get_conversion_graph(),
+        quantity,
+        getattr(source_unit, 'pk', source_unit),
+        getattr(target_unit, 'pk', target_unit)
+    )
+
+
+def convert_units_bulk(rows):
+    """
+    Birden çok çevrimi tek geçişte, aynı çevrim tablosuyla yapar.
+
+    - (miktar, kaynak_birim_id, hedef_birim_id) üçlüleri verilirse, aynı sırada
+      Decimal listesi döner.
+    - OrderItem QuerySet'i verilirse, kalemler tek sorguda okunur ve
+      {kalem_id: ürün ana birimi cinsinden miktar} sözlüğü döner.
+    """
+    if isinstance(rows, models.QuerySet):
+        items = list(rows.values_list('pk', 'ordered_quantity', 'ordered_unit_id', 'product__unit_id'))
+        converted = convert_units_bulk([(qty, source_id, target_id) for _, qty, source_id, target_id in items])
+        return {item[0]: qty for item, qty in zip(items, converted)}
+
+    graph = get_conversion_graph()
+    return [
+        _convert_with_graph(graph, quantity, source_id, target_id)
+        for quantity, source_id, target_id in rows
+    ]
+
+
+def calculate_order_item_amounts(quantity, ordered_unit_id, product_unit_id, unit_price, graph=None):
+    """
+    Bir sipariş kalemi için (ana birim cinsinden miktar, çevrimli satır toplamı) döndürür.
+    OrderItem.save, toplu fiyatlandırma ve geriye dönük doldurma aynı kuralı kullanır.
+    """
+    if not product_unit_id:
+        return Decimal('0'), Decimal('0.00')
+
+    base_quantity = _convert_with_graph(graph or get_conversion_graph(), quantity, ordered_unit_id, product_unit_id)
+    if not unit_price:
+        return base_quantity, Decimal('0.00')
+    return base_quantity, base_quantity * unit_price
+
+
+def calculate_order_item_totals(items):
+    """
+    OrderItem QuerySet'i için {kalem_id: çevrimli satır toplamı} döndürür.
+    Kalemler tek sorguda okunur, çevrimler bellekteki tablodan yapılır.
+    (OrderItem.get_converted_total ile aynı kurallar)
+    """
+    graph = get_conversion_graph()
+    rows = items.values_list(
+        'pk', 'ordered_quantity', 'ordered_unit_id', 'product__unit_id', 'unit_price_at_order'
+    )
+    return {
+        pk: calculate_order_item_amounts(qty, source_id, target_id, unit_price, graph)[1]
+        for pk, qty, source_id, target_id, unit_price in rows
+    }
+
+
+def normalize_vat_rate(vat_rate):
+    """
+    Ürün KDV oranını 0-1 aralığına getirir (0.10 veya 10 olarak girilmiş olabilir).
+    Tanımsızsa %20 kabul edilir. Fatura satırları ve satış özetleri aynı kuralı kullanır.
+    """
+    vat_rate = Decimal(str(vat_rate)) if vat_rate else Decimal('0.20')
+    if vat_rate > 1:
+        vat_rate = vat_rate / 100
+    return vat_rate
+
 class UnitConversion(models.Model):
     source_unit = models.ForeignKey(Unit, related_name='source_conversions', on_delete=models.CASCADE, verbose_name="Kaynak Birim")
     target_unit = models.ForeignKey(Unit, related_name='target_conversions', on_delete=models.CASCADE, verbose_name="Hedef Birim")
@@ -101,6 +266,14 @@ class UnitConversion(models.Model):
         return f"1 {self.source_unit.name} = {self.conversion_factor} {self.target_unit.name}"
 
 
+@receiver([post_save, post_delete], sender=UnitConversion, dispatch_uid="unit_conversion_graph_invalidate")
+def invalidate_conversion_graph_on_change(sender, **kwargs):
+    """Çevrim eklenince/değişince/silinince bellekteki grafı yeniler."""
+    invalidate_conversion_graph()
+    # İşlem commit edilmeden başka bir thread eski veriyi yüklemiş olabilir
+    db_transaction.on_commit(invalidate_conversion_graph)
+
+
 # ----------------------------------------------------
 # 2. KULLANICI VE ROL İLİŞKİLERİ
 # ----------------------------------------------------
@@ -109,20 +282,34 @@ class Dealer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='dealer_profile', verbose_name="Kullanıcı")
     name = models.CharField(max_length=100, verbose_name="Bayi Adı/Unvanı")
     tax_id = models.CharField(max_length=20, unique=True, verbose_name="Vergi Numarası")
-    # current_balance = models.DecimalField(...) satırını tamamen SİLDİK
+    # Cari bakiye, Transaction kayıtları eklenip/güncellenip/silindikçe aynı DB işlemi
+    # içinde güncellenir. Okuma O(1)'dir; doğrulama için: manage.py rebuild_dealer_balances
+    balance = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name="Cari Bakiye"
+    )
 
     @property
     def current_balance(self):
-        from django.db.models import Sum, Case, When, F, DecimalField
-        result = self.transactions.aggregate(
-            net_balance=Sum(
-                Case(
-                    When(transaction_type='DEBT', then=F('amount')),       # Faturaları ekle (+)
-                    When(transaction_type__in=['COLLECTION', 'RETURN'], then=-F('amount')), # İade ve Tahsilatları çıkar (-)
-                    output_field=DecimalField()
-                )
-            )
-        )
+        """Kalıcı bakiye alanını döndürür (hareket geçmişini taramaz)."""
+        return self.balance
+
+    def save(self, *args, **kwargs):
+        # Bakiye yalnızca cari hareketlerle (F() güncellemesi) değişir; kayıtlı bayi
+        # kaydedilirken bellekteki (eskimiş olabilecek) bakiye geri yazılmaz
+        if self.pk and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'balance'
+            ]
+        super().save(*args, **kwargs)
+
+    def calculate_balance_from_ledger(self):
+        """Bakiyeyi tüm cari hareketlerden yeniden hesaplar (doğrulama için)."""
+        result = self.transactions.aggregate(net_balance=Sum(signed_transaction_amount()))
         return result['net_balance'] or Decimal('0.00')
     
     
@@ -158,6 +345,96 @@ class Courier(models.Model):
 
 
 
+# ----------------------------------------------------------------------
+# CARİ BAKİYE YARDIMCILARI (Dealer.balance alanını güncel tutar)
+# ----------------------------------------------------------------------
+
+# Hareket türünün bakiyeye etkisi: Borç (+), Tahsilat ve İade (-)
+TRANSACTION_BALANCE_SIGNS = {
+    'DEBT': Decimal('1'),
+    'COLLECTION': Decimal('-1'),
+    'RETURN': Decimal('-1'),
+}
+
+# Bu alanlardan biri değişirse bakiye farkı yeniden hesaplanmalıdır
+TRANSACTION_BALANCE_FIELDS = {'dealer', 'dealer_id', 'transaction_type', 'amount'}
+
+
+def signed_transaction_amount():
+    """Hareketin bakiyeye etkisini (işaretli tutar) veren SQL ifadesi."""
+    return Case(
+        When(transaction_type='DEBT', then=F('amount')),
+        When(transaction_type__in=['COLLECTION', 'RETURN'], then=-F('amount')),
+        default=Value(Decimal('0.00')),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+def adjust_dealer_balances(deltas):
+    """
+    {dealer_id: fark} sözlüğündeki bakiye farklarını tek bir UPDATE ile uygular.
+    F() kullanıldığı için eşzamanlı yazımlarda bakiye kaybolmaz.
+    """
+    deltas = {dealer_id: delta for dealer_id, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+
+    return Dealer.objects.filter(pk__in=deltas.keys()).update(
+        balance=F('balance') + Case(
+            *[When(pk=dealer_id, then=Value(delta)) for dealer_id, delta in deltas.items()],
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        )
+    )
+
+
+class TransactionQuerySet(models.QuerySet):
+    """Toplu işlemlerde (bulk_create, update, delete) de bayi bakiyesini güncel tutar."""
+
+    def balance_deltas(self):
+        """Seçili hareketlerin bayi bazında bakiyeye etkisini tek sorguda hesaplar."""
+        rows = self.order_by().values('dealer_id').annotate(delta=Sum(signed_transaction_amount()))
+        return {row['dealer_id']: row['delta'] or Decimal('0.00') for row in rows}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with db_transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+
+            deltas = {}
+            for obj in created:
+                deltas[obj.dealer_id] = deltas.get(obj.dealer_id, Decimal('0.00')) + obj.signed_amount
+            adjust_dealer_balances(deltas)
+        return created
+
+    def update(self, **kwargs):
+        if not TRANSACTION_BALANCE_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+
+        with db_transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            before = self.model.objects.filter(pk__in=pks).balance_deltas()
+            updated = super().update(**kwargs)
+            after = self.model.objects.filter(pk__in=pks).balance_deltas()
+
+            deltas = {dealer_id: -delta for dealer_id, delta in before.items()}
+            for dealer_id, delta in after.items():
+                deltas[dealer_id] = deltas.get(dealer_id, Decimal('0.00')) + delta
+            adjust_dealer_balances(deltas)
+        return updated
+
+    update.alters_data = True
+
+    def delete(self):
+        with db_transaction.atomic(using=self.db):
+            deltas = self.balance_deltas()
+            result = super().delete()
+            adjust_dealer_balances({dealer_id: -delta for dealer_id, delta in deltas.items()})
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+
 class Transaction(models.Model):
     TRANSACTION_TYPE_CHOICES = [
         ('DEBT', 'Borç (Bayi Satış/Fatura)'),
@@ -209,6 +486,35 @@ class Transaction(models.Model):
         null=True, 
         blank=True
     )
+
+    objects = TransactionQuerySet.as_manager()
+
+    @property
+    def signed_amount(self):
+        """Hareketin bayi bakiyesine etkisi (Borç +, Tahsilat/İade -)."""
+        sign = TRANSACTION_BALANCE_SIGNS.get(self.transaction_type, Decimal('0'))
+        return sign * Decimal(str(self.amount or 0))
+
+    def save(self, *args, **kwargs):
+        # Hareket ve bakiye güncellemesi aynı DB işleminde yapılır
+        with db_transaction.atomic():
+            deltas = {}
+            if self.pk:
+                # Güncellemede eski kaydın etkisini geri al
+                deltas = Transaction.objects.select_for_update().filter(pk=self.pk).balance_deltas()
+                deltas = {dealer_id: -delta for dealer_id, delta in deltas.items()}
+
+            super().save(*args, **kwargs)
+
+            deltas[self.dealer_id] = deltas.get(self.dealer_id, Decimal('0.00')) + self.signed_amount
+            adjust_dealer_balances(deltas)
+
+    def delete(self, *args, **kwargs):
+        with db_transaction.atomic():
+            deltas = Transaction.objects.filter(pk=self.pk).balance_deltas()
+            result = super().delete(*args, **kwargs)
+            adjust_dealer_balances({dealer_id: -delta for dealer_id, delta in deltas.items()})
+        return result
  
     class Meta:
         verbose_name = "Cari Hesap Hareketi"
@@ -278,6 +584,8 @@ class Order(models.Model):
     order_date = models.DateTimeField(default=timezone.now, verbose_name="Sipariş Tarihi")
     estimated_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name="Tahmini Toplam Tutar")
     is_confirmed = models.BooleanField(default=False, verbose_name="Onaylandı mı?")   
+    # Kurye uygulamasının artımlı senkronizasyonu için; toplu update() yollarında elle verilmelidir
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Son Güncelleme")
     
     
 
@@ -287,7 +595,20 @@ class Order(models.Model):
         Siparişe bağlı tüm OrderItem kalemlerinin 'total_price' değerlerini toplar.
         """
         # items, OrderItem modelindeki related_name='items' referansıdır.
-        return sum(item.total_price for item in self.items.all())
+        # Kalemler önceden çekildiyse (prefetch_related) ek sorgu yapılmaz.
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum((item.line_total_amount for item in self.items.all()), Decimal('0.00'))
+        # Satır toplamları kalemlerde saklandığı için tek bir SUM sorgusu yeterlidir.
+        return self.items.aggregate(total=Sum('line_total_amount'))['total'] or Decimal('0.00')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Tarihi veya bayisi değişen siparişte eski günün satış özeti de güncellenmeli
+        instance._loaded_rollup_key = (instance.__dict__.get('order_date'), instance.__dict__.get('dealer_id'))
+        # Kilit kontrolü kayıtta veritabanına tekrar gitmeden yüklenen durumla yapılır
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
 
     def full_clean(self, *args, **kwargs):
         # 1. Önce yuvarlamayı yapıyoruz (Hata denetiminden hemen önce)
@@ -302,27 +623,35 @@ class Order(models.Model):
     def clean(self):
         # Global Sipariş Kontrolü (Ayar kapalıysa mesaj göster)
         if not self.pk:
-            config = OrderConfiguration.objects.first()
-            if config and not config.is_ordering_enabled:
+            if not OrderConfiguration.get_solo().is_ordering_enabled:
                 raise ValidationError("Şu anda sistem yeni sipariş alımına kapalıdır.")
         super().clean()
 
-    def save(self, *args, **kwargs):
-        # Kayıt sırasında denetimleri tekrar çalıştır
-        self.full_clean()
-        super().save(*args, **kwargs)
-        
-        # 2. MEVCUT KİLİT MANTIĞI (Bunu aynen koruyoruz)
-        ignore_lock = kwargs.pop('ignore_lock', False) 
+    def save(self, *args, ignore_lock=False, **kwargs):
+        # Kilitli siparişin durumu değiştirilemez (yüklenirken okunan durum korunur)
         if self.pk and self.is_locked and not ignore_lock:
-            try:
-                original = Order.objects.get(pk=self.pk)
-                if original.status != self.status:
-                     self.status = original.status 
-            except Order.DoesNotExist:
-                pass
-        self.full_clean()
+            original_status = self._get_original_status()
+            if original_status is not None and original_status != self.status:
+                self.status = original_status
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # update_fields ile kaydedilirken değişiklik zamanı da yazılmalı; bu yol alan bazlı
+            # güncellemeler içindir, tam denetim (full_clean) yapılmaz
+            kwargs['update_fields'] = set(update_fields) | {'updated_at'}
+        else:
+            # Bayisi değişmeyen kayıtlı siparişte bayi varlığı tekrar sorgulanmaz (FK kısıtı korur)
+            loaded_dealer_id = getattr(self, '_loaded_rollup_key', (None, None))[1]
+            self.full_clean(exclude=['dealer'] if self.pk and self.dealer_id == loaded_dealer_id else None)
+
         super().save(*args, **kwargs)
+        self._loaded_status = self.status
+
+    def _get_original_status(self):
+        if getattr(self, '_loaded_status', None) is not None:
+            return self._loaded_status
+        # Veritabanından yüklenmemiş (pk'si elle verilmiş) veya durumu ertelenmiş nesne
+        return Order.objects.filter(pk=self.pk).values_list('status', flat=True).first()
 
     def __str__(self):
         return f"Sipariş #{self.id} - {self.dealer.name}"
@@ -330,6 +659,15 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Sipariş"
         verbose_name_plural = "Bayi Siparişler"
+        # Bayi ve dönem bazlı toplamlar için
+        indexes = [
+            models.Index(fields=['order_date']),
+            models.Index(fields=['dealer', 'order_date']),
+        ]
+
+# Bu alanlar değiştiğinde OrderItem'ın ana birim miktarı ve satır toplamı yeniden hesaplanır
+ORDER_ITEM_TOTAL_SOURCE_FIELDS = {'ordered_quantity', 'ordered_unit', 'product', 'unit_price_at_order'}
+
 
 class OrderItem(models.Model):
     """Bir Siparişe Ait Ürün Kalemleri (Birim Çevrimini Kullanır)"""
@@ -352,12 +690,49 @@ class OrderItem(models.Model):
     )
     delivered_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    # Ürün ana birimi cinsinden miktar ve çevrimli satır toplamı. Kayıt sırasında hesaplanır;
+    # sipariş, bayi ve dönem toplamları bu alanlar üzerinden veritabanında Sum() ile alınır.
+    # Eski kayıtlar için: manage.py backfill_order_item_totals
+    base_quantity = models.DecimalField(
+        max_digits=14,
+        decimal_places=4,
+        default=Decimal('0'),
+        editable=False,
+        verbose_name="Ana Birim Cinsinden Miktar"
+    )
+    line_total_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name="Satır Toplamı (Çevrimli)"
+    )
+
     class Meta:
         verbose_name = "Sipariş Kalemi"
         verbose_name_plural = "Sipariş Kalemleri"
 
     def __str__(self):
         return f"{self.product.name} ({self.ordered_quantity} {self.ordered_unit.name})"
+
+    def refresh_totals(self):
+        """base_quantity ve line_total_amount alanlarını günceller (kaydetmez)."""
+        product_unit_id = self.product.unit_id if self.product_id else None
+        base_quantity, line_total = calculate_order_item_amounts(
+            self.ordered_quantity, self.ordered_unit_id, product_unit_id, self.unit_price_at_order
+        )
+        self.base_quantity = base_quantity.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+        self.line_total_amount = line_total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def save(self, *args, **kwargs):
+        self.refresh_totals()
+
+        # update_fields ile kaydedilirken, hesaplanan alanlar da birlikte yazılmalı
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ORDER_ITEM_TOTAL_SOURCE_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'base_quantity', 'line_total_amount'}
+
+        super().save(*args, **kwargs)
     
 
 
@@ -367,14 +742,14 @@ class OrderItem(models.Model):
         Sipariş miktarını ürünün fiyatının tanımlandığı birime çevirerek 
         doğru toplam tutarı hesaplar.
         """
-        if not self.product or not self.unit_price_at_order or not self.product.unit:
+        if not self.product or not self.unit_price_at_order or not self.product.unit_id:
             return Decimal('0.00')
 
         # 1. Sipariş edilen miktarı, ürünün fiyat birimine (Product.unit) çevir.
         converted_quantity = convert_unit(
             self.ordered_quantity,
-            self.ordered_unit,          # Kaynak: Unit objesi
-            self.product.unit           # Hedef: Unit objesi
+            self.ordered_unit_id,       # Kaynak birim
+            self.product.unit_id        # Hedef birim
         )
         
         return converted_quantity * self.unit_price_at_order
@@ -416,6 +791,8 @@ class Delivery(models.Model):
     delivered_quantity = models.PositiveIntegerField(default=0, verbose_name="Teslim Edilen Miktar")
     is_confirmed = models.BooleanField(default=False, verbose_name="Teslimat Onaylandı mı?")
     delivery_date = models.DateTimeField(null=True, blank=True, verbose_name="Teslimat Tarihi")
+    # Kurye uygulamasının artımlı senkronizasyonu için; toplu update() yollarında elle verilmelidir
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Son Güncelleme")
 
     class Meta:
         verbose_name = "Teslimat Kaydı"
@@ -424,6 +801,85 @@ class Delivery(models.Model):
     def __str__(self):
         return f"Teslimat ID:{self.id} - {self.order_item.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kurye değişirse eski kuryeye silinme izi bırakmak için yüklenen değeri saklıyoruz
+        instance._loaded_courier_id = instance.__dict__.get('courier_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'updated_at'}
+
+        super().save(*args, **kwargs)
+
+        previous_courier_id = getattr(self, '_loaded_courier_id', None)
+        if previous_courier_id and previous_courier_id != self.courier_id:
+            record_delivery_tombstones([(self.pk, previous_courier_id)])
+        self._loaded_courier_id = self.courier_id
+
+
+class DeliveryTombstone(models.Model):
+    """
+    Kuryenin listesinden çıkan teslimatın izi (silinme veya başka kuryeye atanma).
+    Artımlı senkronizasyonda istemci bu kayıtlarla yerel listesinden satır siler.
+    """
+    delivery_id = models.PositiveIntegerField(verbose_name="Teslimat ID")
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, related_name='delivery_tombstones', verbose_name="Kurye")
+    removed_at = models.DateTimeField(default=timezone.now, verbose_name="Kaldırılma Zamanı")
+
+    class Meta:
+        verbose_name = "Teslimat Silinme İzi"
+        verbose_name_plural = "Teslimat Silinme İzleri"
+        indexes = [
+            models.Index(fields=['courier', 'removed_at']),
+        ]
+
+    def __str__(self):
+        return f"Teslimat ID:{self.delivery_id} - {self.removed_at:%d.%m.%Y %H:%M}"
+
+
+def record_delivery_tombstones(rows):
+    """
+    (delivery_id, eski courier_id) çiftleri için tek sorguda silinme izi oluşturur.
+    Kuryesi olmayan satırlar atlanır (hiçbir kurye listesinde değillerdir).
+    """
+    removed_at = timezone.now()
+    return DeliveryTombstone.objects.bulk_create([
+        DeliveryTombstone(delivery_id=delivery_id, courier_id=courier_id, removed_at=removed_at)
+        for delivery_id, courier_id in rows
+        if courier_id
+    ])
+
+
+class DeliveryConfirmationReceipt(models.Model):
+    """
+    Kurye uygulamasının toplu teslimat onayındaki her işlem için sonuç kaydı.
+    İstemci her onaya kendi ürettiği anahtarı verir; aynı anahtarla tekrar gönderilen
+    işlem yeniden uygulanmaz, ilk sonucu döndürülür (çevrimdışı kuyruk yeniden denemeleri).
+    """
+    STATUS_CHOICES = [
+        ('APPLIED', 'Uygulandı'),
+        ('REJECTED', 'Reddedildi'),
+    ]
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, related_name='confirmation_receipts', verbose_name="Kurye")
+    idempotency_key = models.CharField(max_length=64, verbose_name="İşlem Anahtarı")
+    delivery_id = models.PositiveIntegerField(verbose_name="Teslimat ID")
+    delivered_quantity = models.PositiveIntegerField(default=0, verbose_name="Teslim Edilen Miktar")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, verbose_name="Sonuç")
+    detail = models.CharField(max_length=255, blank=True, verbose_name="Açıklama")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="İşlem Zamanı")
+
+    class Meta:
+        verbose_name = "Teslimat Onay Kaydı"
+        verbose_name_plural = "Teslimat Onay Kayıtları"
+        unique_together = ('courier', 'idempotency_key')
+
+    def __str__(self):
+        return f"{self.idempotency_key} - Teslimat ID:{self.delivery_id} ({self.get_status_display()})"
+
 # ----------------------------------------------------
 # 5. FATURA
 # ----------------------------------------------------
@@ -437,6 +893,12 @@ class Invoice(models.Model):
     invoice_date = models.DateTimeField(default=timezone.now, verbose_name="Fatura Tarihi")
     final_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Nihai Tutar")
 
+    # Üretilmiş PDF önbelleği: dosya adı fatura verisi + şablon sürümünün özetidir (invoices/<hash>.pdf).
+    # Veri veya şablon değiştiğinde özet de değişir ve PDF yeniden üretilir.
+    pdf_file = models.FileField(upload_to='invoices/', null=True, blank=True, editable=False, verbose_name="Fatura PDF")
+    pdf_hash = models.CharField(max_length=64, blank=True, default='', editable=False, verbose_name="PDF Özeti")
+    pdf_generated_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="PDF Üretim Zamanı")
+
     @property
     def items(self):
         """Faturaya bağlı siparişin kalemlerine kolay erişim sağlar."""
@@ -445,7 +907,7 @@ class Invoice(models.Model):
     @property
     def total_amount(self):
         """Siparişteki tüm kalemlerin (OrderItem) toplam tutarını hesaplar."""
-        return sum(item.total_price for item in self.items.all())
+        return self.items.aggregate(total=Sum('line_total_amount'))['total'] or Decimal('0.00')
 
 
     class Meta:
@@ -471,7 +933,166 @@ class Invoice(models.Model):
                 source_model='Invoice',
                 source_id=self.id
             )
-    
+
+
+class InvoiceLine(models.Model):
+    """
+    Fatura satırı. Fatura kesilirken teslimatlardan bir kez hesaplanıp yazılır; fatura
+    görünümü, PDF ve KDV raporları bu satırları okur (ürün/fiyat sonradan değişse de fatura değişmez).
+    """
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='lines', verbose_name="Fatura")
+    delivery = models.ForeignKey('Delivery', on_delete=models.SET_NULL, null=True, blank=True, related_name='invoice_lines', verbose_name="Teslimat")
+    product = models.ForeignKey('Product', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Ürün")
+    position = models.PositiveIntegerField(default=0, verbose_name="Sıra")
+
+    # Fatura anındaki değerlerin kopyası
+    product_name = models.CharField(max_length=200, verbose_name="Ürün Adı")
+    unit_name = models.CharField(max_length=50, blank=True, verbose_name="Birim")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Miktar")
+    unit_price = models.DecimalField(max_digits=14, decimal_places=4, verbose_name="Birim Fiyat (KDV Hariç)")
+    vat_rate = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="KDV Oranı (%)")
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Ara Toplam (KDV Hariç)")
+    vat_amount = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="KDV Tutarı")
+    line_total = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Satır Toplamı (KDV Dahil)")
+
+    class Meta:
+        verbose_name = "Fatura Satırı"
+        verbose_name_plural = "Fatura Satırları"
+        ordering = ['invoice', 'position']
+
+    def __str__(self):
+        return f"{self.product_name} ({self.quantity} {self.unit_name})"
+
+
+class InvoiceSequence(models.Model):
+    """
+    Fatura numarası sayacı. Her seri için tek bir satır tutulur; numaralar bu satır
+    kilitlenerek (UPDATE ... SET last_number = last_number + n) verilir.
+    Fatura tablosu büyüdükçe yavaşlamaz ve eşzamanlı faturalamada çakışma olmaz.
+    """
+    DEFAULT_SERIES = 'GENEL'
+
+    series = models.CharField(max_length=20, unique=True, verbose_name="Seri")
+    last_number = models.PositiveBigIntegerField(default=0, verbose_name="Son Verilen Numara")
+
+    class Meta:
+        verbose_name = "Fatura Numara Serisi"
+        verbose_name_plural = "Fatura Numara Serileri"
+
+    def __str__(self):
+        return f"{self.series}: {self.last_number}"
+
+    @classmethod
+    def series_for(cls, date=None):
+        """INVOICE_NUMBER_SERIES_PER_YEAR açıksa yıl bazlı, değilse genel seri adını döndürür."""
+        if getattr(settings, 'INVOICE_NUMBER_SERIES_PER_YEAR', False):
+            return str((date or timezone.now()).year)
+        return cls.DEFAULT_SERIES
+
+    @classmethod
+    def format_number(cls, series, number):
+        if series == cls.DEFAULT_SERIES:
+            return str(number).zfill(6)
+        # Yıl bazlı seri: 2025000001
+        return f"{series}{number:06d}"
+
+    @classmethod
+    def _initial_value(cls, series):
+        """
+        Seri ilk kez kullanılırken mevcut faturalardan başlangıç değerini bulur
+        (seri başına yalnızca bir kez çalışır).
+        """
+        if series == cls.DEFAULT_SERIES:
+            numbers = Invoice.objects.filter(invoice_number__regex=r'^[0-9]+$')
+            offset = 0
+            # Eski sistem ilk faturayı 100000 numarasıyla başlatıyordu
+            default = 99999
+        else:
+            numbers = Invoice.objects.filter(invoice_number__regex=rf'^{series}[0-9]{{6}}$')
+            offset = int(series) * 1000000
+            default = 0
+
+        last = numbers.aggregate(
+            last=models.Max(Cast('invoice_number', output_field=models.BigIntegerField()))
+        )['last']
+        return (last - offset) if last is not None else default
+
+    @classmethod
+    def allocate(cls, count=1, series=None):
+        """
+        Seriden `count` adet ardışık fatura numarası ayırır ve liste olarak döndürür.
+        Çağıran transaction içinde kullanılmalıdır; transaction geri alınırsa numaralar
+        da geri alınır, böylece seride boşluk oluşmaz. Toplu faturalamada tek çağrıyla
+        blok ayrılabilir.
+        """
+        if count < 1:
+            return []
+        series = series or cls.series_for()
+
+        with db_transaction.atomic():
+            updated = cls.objects.filter(series=series).update(last_number=F('last_number') + count)
+            if not updated:
+                try:
+                    with db_transaction.atomic():
+                        cls.objects.create(series=series, last_number=cls._initial_value(series) + count)
+                except IntegrityError:
+                    # Aynı anda başka bir işlem seriyi oluşturdu
+                    cls.objects.filter(series=series).update(last_number=F('last_number') + count)
+
+            # Satır bu transaction'da güncellendiği için kilitli; okunan değer bize aittir
+            last_number = cls.objects.filter(series=series).values_list('last_number', flat=True).get()
+
+        first_number = last_number - count + 1
+        return [cls.format_number(series, n) for n in range(first_number, last_number + 1)]
+
+    @classmethod
+    def next_number(cls, series=None):
+        """Tek bir fatura numarası ayırır."""
+        return cls.allocate(1, series)[0]
+
+
+class InvoiceBatch(models.Model):
+    """
+    Toplu faturalama işi. Faturalar tek transaction'da kesilir; PDF'ler web isteği dışında
+    process_invoice_batches görevinde üretilip tek bir ZIP dosyasında toplanır.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Sırada'),
+        ('RUNNING', 'İşleniyor'),
+        ('COMPLETED', 'Tamamlandı'),
+        ('FAILED', 'Hatalı'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING', db_index=True, verbose_name="Durum")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Oluşturan")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Oluşturulma Tarihi")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Başlama Zamanı")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Bitiş Zamanı")
+    # İşleyen süreç her ilerlemede günceller; uzun süre güncellenmeyen iş yarıda kalmış sayılır
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Son İlerleme")
+
+    invoices = models.ManyToManyField('Invoice', related_name='batches', verbose_name="Faturalar")
+    total_count = models.PositiveIntegerField(default=0, verbose_name="Toplam Fatura")
+    completed_count = models.PositiveIntegerField(default=0, verbose_name="Üretilen PDF")
+    failed_count = models.PositiveIntegerField(default=0, verbose_name="Hatalı PDF")
+
+    archive = models.FileField(upload_to='invoice_batches/', null=True, blank=True, verbose_name="PDF Arşivi (ZIP)")
+    error_log = models.TextField(blank=True, verbose_name="Hata Kayıtları")
+
+    class Meta:
+        verbose_name = "Toplu Fatura İşi"
+        verbose_name_plural = "Toplu Fatura İşleri"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Toplu Fatura #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def progress_percent(self):
+        if not self.total_count:
+            return 0
+        return int((self.completed_count + self.failed_count) * 100 / self.total_count)
+
 # ----------------------------------------------------
 # 6. FİNANSAL TAKİP
 # ----------------------------------------------------
@@ -621,6 +1242,18 @@ def auto_delete_transaction_on_invoice_delete(sender, instance, **kwargs):
         source_id=instance.id
     ).delete()
 
+@receiver(post_delete, sender=Delivery, dispatch_uid="delivery_sync_tombstone")
+def record_tombstone_on_delivery_delete(sender, instance, **kwargs):
+    """Teslimat silindiğinde (sipariş silinmesiyle zincirleme dahil) kuryesine silinme izi bırakır."""
+    record_delivery_tombstones([(instance.pk, instance.courier_id)])
+
+@receiver(post_delete, sender=Invoice, dispatch_uid="invoice_pdf_file_delete")
+def auto_delete_pdf_on_invoice_delete(sender, instance, **kwargs):
+    """Fatura silindiğinde önbellekteki PDF dosyasını da siler (transaction commit edilince)."""
+    if instance.pdf_file:
+        storage, name = instance.pdf_file.storage, instance.pdf_file.name
+        db_transaction.on_commit(lambda: storage.delete(name))
+
 
 
 
@@ -701,6 +1334,18 @@ class Partner(models.Model):
         verbose_name="Dağıtım Oranı (%)" 
     )
     
+    # Yalnızca kâr dağıtımı / ortak cari hareketiyle (F() güncellemesi) değişen alanlar
+    LEDGER_FIELDS = ('total_profit_received', 'current_receivable')
+
+    def save(self, *args, **kwargs):
+        # Kayıtlı ortak kaydedilirken bellekteki (eskimiş olabilecek) toplamlar geri yazılmaz
+        if self.pk and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.LEDGER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         if self.user:
             # Eğer user varsa, adını kullan (get_full_name veya username)
@@ -712,6 +1357,25 @@ class Partner(models.Model):
         verbose_name = "Ortak"
         verbose_name_plural = "Yönetim Ortaklar"
 
+
+def adjust_partner_balances(deltas):
+    """
+    {partner_id: tutar} sözlüğündeki kâr paylarını ortakların alınan toplamına ve alacak
+    bakiyesine tek bir UPDATE ile ekler (F() ile; eşzamanlı yazımlarda tutar kaybolmaz).
+    """
+    deltas = {partner_id: delta for partner_id, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+
+    delta_expression = Case(
+        *[When(pk=partner_id, then=Value(delta)) for partner_id, delta in deltas.items()],
+        output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+    return Partner.objects.filter(pk__in=deltas.keys()).update(
+        total_profit_received=F('total_profit_received') + delta_expression,
+        current_receivable=F('current_receivable') + delta_expression,
+    )
+
 # YENİ MODEL: Partnerlerin o aydan aldığı payı tutacak
 class PartnerProfitShare(models.Model):
     """Belirli bir ay için ortağın kâr payı detaylarını tutar."""
@@ -748,6 +1412,38 @@ class PartnerProfitShare(models.Model):
         unique_together = ('distribution', 'partner')
 
 
+class PartnerLedgerEntry(models.Model):
+    """
+    Ortak cari hareketi. Kâr dağıtımında her ortak payı için bir kayıt yazılır ve Partner
+    üzerindeki toplamlar aynı işlemde güncellenir; ortak bakiyesi için paylar yeniden toplanmaz.
+    balance_after, hareket sonrası alacak bakiyesidir.
+    """
+    partner = models.ForeignKey('Partner', on_delete=models.PROTECT, related_name='ledger_entries', verbose_name="Ortak")
+    distribution = models.ForeignKey(
+        'ProfitDistribution',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        verbose_name="Kâr Dağıtım Kaydı"
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Tutar (TL)")
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Hareket Sonrası Bakiye (TL)")
+    description = models.CharField(max_length=255, blank=True, verbose_name="Açıklama")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Tarih")
+
+    class Meta:
+        verbose_name = "Ortak Cari Hareketi"
+        verbose_name_plural = "Ortak Cari Hareketleri"
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['partner', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.partner.name} - {self.amount} TL ({self.created_at:%d.%m.%Y})"
+
+
 class ProfitDistribution(models.Model):
     # KRİTİK EKLENTİLER: admin.py'nin referans verdiği alanlar
     month = models.IntegerField(
@@ -799,6 +1495,17 @@ class RawMaterial(models.Model):
         verbose_name="Birim Alış Maliyeti"
     )
     is_active = models.BooleanField(default=True, verbose_name="Aktif")
+    # Ara ürün: hammadde işletmede kendi reçetesiyle üretiliyorsa (örn. krema, hamur),
+    # üretim planında bu ürünün reçetesine açılır.
+    intermediate_product = models.OneToOneField(
+        'Product',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='as_raw_material',
+        verbose_name="Ara Ürün (Kendi Reçetesi)",
+        help_text="Bu hammadde işletmede üretiliyorsa, reçetesi tanımlı ürünü seçin."
+    )
 
     def __str__(self):
         return self.name
@@ -818,64 +1525,30 @@ class Recipe(models.Model):
     )
     description = models.TextField(blank=True, null=True, verbose_name="Açıklama/Hazırlık Notları")
     is_active = models.BooleanField(default=True, verbose_name="Aktif Reçete")
+    # Hammadde fiyatı, reçete veya birim çevrimi değişince yalnızca etkilenen reçeteler için
+    # toplu yeniden hesaplanır (bkz. production.update_recipe_costs). Elle: recompute_recipe_costs
+    unit_cost = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        default=Decimal('0'),
+        editable=False,
+        verbose_name="Birim Maliyet (1 Ana Birim)"
+    )
+    cost_updated_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Maliyet Hesaplama Zamanı")
 
     def __str__(self):
         return f"{self.product.name} Reçetesi"
 
     def calculate_total_cost(self):
-        total_cost = Decimal('0.00')
-        
-        # 1. Reçete için temel birimi al
-        try:
-            # self.product.unit'e erişim (Model Yüklenmesi hatası almamak için)
-            recipe_base_unit = self.product.unit 
-            if not recipe_base_unit:
-                return Decimal('0.00')
-        except AttributeError:
-            return Decimal('0.00') 
-
-        # 2. Reçete kalemlerini döngüye al
-        for item in self.recipeitem_set.select_related('raw_material__unit').all():
-            
-            raw_material = item.raw_material
-            
-            # Gerekli tüm alanların dolu ve geçerli olduğundan emin ol
-            if not (raw_material and 
-                    raw_material.cost_price is not None and 
-                    item.quantity_required is not None and 
-                    raw_material.unit):
-                continue
-
-            try:
-                raw_material_unit = raw_material.unit      # Hammadde Maliyet Birimi
-                required_qty = Decimal(str(item.quantity_required))
-                cost_price = Decimal(str(raw_material.cost_price))
-                
-                # 3. Birim Çevrimi
-                # ÖNEMLİ: Eğer convert_unit'in içinde Unit objesi yerine string kullanıyorsanız:
-                # convert_unit(required_qty, recipe_base_unit.name, raw_material_unit.name)
-                # Ancak varsayılan olarak Unit objeleri gönderiyoruz.
-                converted_qty = convert_unit(
-                    required_qty,
-                    recipe_base_unit,      
-                    raw_material_unit      
-                )
-                
-                # Eğer çevrim başarısız olursa ve 0 dönerse (convert_unit içinde kural yoksa)
-                if converted_qty == Decimal('0.00'):
-                    # Bu noktada, veri hatası veya çevrim tanımı eksikliği var demektir.
-                    # Hata vermemek için bu kalemi atla.
-                    continue
+        """
+        1 ana birim ürünün hammadde maliyetini anlık hesaplar (kaydetmez).
+        Liste ve raporlar bunun yerine kayıtlı unit_cost alanını okur.
+        """
+        from .production import compute_recipe_unit_costs
 
-                # 4. Maliyeti Hesapla
-                item_cost = converted_qty * cost_price
-                total_cost += item_cost
-                
-            except Exception:
-                continue
-        
-        # Sonucu 2 ondalık basamağa yuvarlayarak dön
-        return total_cost.quantize(Decimal('0.01'))
+        if not self.pk:
+            return Decimal('0.00')
+        return compute_recipe_unit_costs([self.pk]).get(self.pk, Decimal('0')).quantize(Decimal('0.01'))
     
 
     class Meta:
@@ -942,6 +1615,9 @@ class DealerPrice(models.Model):
         verbose_name_plural = "Bayi Satış Fiyat Tanımlama"
         unique_together = ('dealer', 'product')
 
+ORDER_CONFIGURATION_VERSION_KEY = 'order_configuration:version'
+
+
 class OrderConfiguration(models.Model):
     """Admin'in global sipariş alım durumunu yönetebileceği tekil ayar modeli."""
     is_ordering_enabled = models.BooleanField(
@@ -949,6 +1625,9 @@ class OrderConfiguration(models.Model):
         verbose_name="Bayi Sipariş Alımı Açık mı?"
     )
     
+    # Süreç içi önbellek: (ayar, paylaşılan sürüm, sürümün kontrol zamanı, yüklenme zamanı)
+    _solo_cache = None
+
     class Meta:
         verbose_name = "Global Sipariş Ayarı"
         verbose_name_plural = "Bayi Sipariş Kontrol"
@@ -956,6 +1635,75 @@ class OrderConfiguration(models.Model):
     def __str__(self):
         return "Global Sipariş Ayarları"
 
+    @classmethod
+    def get_solo(cls):
+        """
+        Tekil ayarı süreç içi önbellekten döndürür; kayıt yoksa varsayılan (kaydedilmemiş) nesne.
+        Paylaşılan önbellekteki sürüm en fazla ORDER_CONFIGURATION_CHECK_INTERVAL saniyede bir
+        okunur, ayar kaydedilince değiştirilir: değişiklik diğer süreçlere bu süre içinde ulaşır.
+        """
+        now = time.monotonic()
+        cached = cls._solo_cache
+        if cached and now - cached[2] < settings.ORDER_CONFIGURATION_CHECK_INTERVAL:
+            return cached[0]
+
+        version = get_cache_version(ORDER_CONFIGURATION_VERSION_KEY)
+
+        # Sürüm artışı kaçırılsa bile (geri alınan transaction, paylaşımsız önbellek) ayar
+        # ORDER_CONFIGURATION_MAX_AGE saniyeden eski kalmaz
+        if cached and cached[1] == version and now - cached[3] < settings.ORDER_CONFIGURATION_MAX_AGE:
+            cls._solo_cache = (cached[0], version, now, cached[3])
+            return cached[0]
+
+        config = cls.objects.first() or cls()
+        cls._solo_cache = (config, version, now, now)
+        return config
+
+    @classmethod
+    def invalidate_solo(cls):
+        """Bu süreçteki önbelleği temizler, paylaşılan sürümü değiştirir (diğer süreçler yeniden yükler)."""
+        cls._solo_cache = None
+        bump_cache_version(ORDER_CONFIGURATION_VERSION_KEY)
+
+
+# ----------------------------------------------------
+# 9. RAPORLAMA ÖZETLERİ
+# ----------------------------------------------------
+
+class DailySalesRollup(models.Model):
+    """
+    Gün / bayi / ürün bazında satış özeti. Tarih siparişin (yerel) tarihidir; iptal edilen
+    siparişler dahil edilmez. Sipariş, kalem, teslimat ve fatura değiştikçe ilgili gün-bayi
+    satırları yeniden hesaplanır (reporting.py). Tamamen yeniden oluşturmak için:
+    manage.py rebuild_sales_rollup
+    """
+    date = models.DateField(verbose_name="Tarih")
+    dealer = models.ForeignKey(Dealer, on_delete=models.CASCADE, related_name='daily_sales', verbose_name="Bayi")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales', verbose_name="Ürün")
+
+    # Miktarlar ürün ana birimi cinsindendir
+    quantity = models.DecimalField(max_digits=16, decimal_places=4, default=Decimal('0'), verbose_name="Sipariş Miktarı")
+    delivered_quantity = models.DecimalField(max_digits=16, decimal_places=4, default=Decimal('0'), verbose_name="Teslim Edilen Miktar")
+    # Sipariş satır toplamları (KDV dahil) ürünün KDV oranıyla ayrıştırılır
+    net_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Net Tutar (KDV Hariç)")
+    vat_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="KDV Tutarı")
+    # Kesilen fatura satırlarının toplamları
+    invoiced_net_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Faturalanan Net Tutar")
+    invoiced_vat_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Faturalanan KDV")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Son Hesaplama")
+
+    class Meta:
+        verbose_name = "Günlük Satış Özeti"
+        verbose_name_plural = "Günlük Satış Özetleri"
+        unique_together = ('date', 'dealer', 'product')
+        indexes = [
+            models.Index(fields=['dealer', 'date']),
+            models.Index(fields=['product', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date:%d.%m.%Y} - {self.dealer.name} / {self.product.name}"
+
 
 from django.dispatch import receiver
 from django.utils import timezone
@@ -974,4 +1722,87 @@ def auto_delete_transaction_on_invoice_delete(sender, instance, **kwargs):
     Transaction.objects.filter(
         source_model='Invoice',
         source_id=instance.id
-    ).delete()
\ No newline at end of file
+    ).delete()
+
+
+@receiver([post_save, post_delete], sender=Recipe, dispatch_uid="production_bom_invalidate_recipe")
+@receiver([post_save, post_delete], sender=RecipeItem, dispatch_uid="production_bom_invalidate_recipe_item")
+@receiver([post_save, post_delete], sender=RawMaterial, dispatch_uid="production_bom_invalidate_raw_material")
+@receiver([post_save, post_delete], sender=Product, dispatch_uid="production_bom_invalidate_product")
+@receiver([post_save, post_delete], sender=UnitConversion, dispatch_uid="production_bom_invalidate_conversion")
+def invalidate_production_bom_on_change(sender, **kwargs):
+    """Reçete, hammadde, ürün birimi veya çevrim değişince önbellekteki ürün ağaçlarını geçersiz kılar."""
+    from .production import invalidate_bill_of_materials
+    db_transaction.on_commit(invalidate_bill_of_materials)
+
+
+@receiver([post_save, post_delete], sender=RecipeItem, dispatch_uid="recipe_cost_on_recipe_item_change")
+def update_recipe_cost_on_recipe_item_change(sender, instance, **kwargs):
+    from .production import schedule_recipe_cost_update
+    schedule_recipe_cost_update(recipe_ids=[instance.recipe_id])
+
+@receiver([post_save, post_delete], sender=Recipe, dispatch_uid="recipe_cost_on_recipe_change")
+def update_recipe_cost_on_recipe_change(sender, instance, **kwargs):
+    """Reçete eklenip silinince ürünün kendisi ve onu ara ürün olarak kullanan reçeteler."""
+    from .production import schedule_recipe_cost_update
+    schedule_recipe_cost_update(product_ids=[instance.product_id])
+
+@receiver([post_save, post_delete], sender=RawMaterial, dispatch_uid="recipe_cost_on_raw_material_change")
+def update_recipe_cost_on_raw_material_change(sender, instance, **kwargs):
+    """Alış maliyeti, birimi veya ara ürünü değişen hammaddeyi kullanan reçeteler yeniden hesaplanır."""
+    from .production import schedule_recipe_cost_update
+    schedule_recipe_cost_update(raw_material_ids=[instance.pk])
+
+@receiver(post_save, sender=Product, dispatch_uid="recipe_cost_on_product_change")
+def update_recipe_cost_on_product_change(sender, instance, **kwargs):
+    """Ürünün ana birimi reçete miktarlarının birimidir; ürünün (ve onu ara ürün olarak kullananların) maliyeti."""
+    from .production import schedule_recipe_cost_update
+    schedule_recipe_cost_update(product_ids=[instance.pk])
+
+@receiver([post_save, post_delete], sender=UnitConversion, dispatch_uid="recipe_cost_on_conversion_change")
+def update_recipe_cost_on_conversion_change(sender, instance, **kwargs):
+    """Çevrimin bağladığı birimlerle (dolaylı dahil) çalışan reçeteler yeniden hesaplanır."""
+    from .production import schedule_recipe_cost_update
+    schedule_recipe_cost_update(unit_ids=[instance.source_unit_id, instance.target_unit_id])
+
+@receiver([post_save, post_delete], sender=Order, dispatch_uid="sales_rollup_on_order_change")
+def update_sales_rollup_on_order_change(sender, instance, **kwargs):
+    """Sipariş tarihi veya bayisi değiştiyse eski gün-bayi özeti de yeniden hesaplanır."""
+    from .reporting import schedule_sales_rollup_update, sales_rollup_key
+    keys = {sales_rollup_key(instance.order_date, instance.dealer_id)}
+    loaded_date, loaded_dealer_id = getattr(instance, '_loaded_rollup_key', (None, None))
+    if loaded_date and loaded_dealer_id:
+        keys.add(sales_rollup_key(loaded_date, loaded_dealer_id))
+    instance._loaded_rollup_key = (instance.order_date, instance.dealer_id)
+    schedule_sales_rollup_update(keys=keys)
+
+@receiver([post_save, post_delete], sender=OrderItem, dispatch_uid="sales_rollup_on_order_item_change")
+@receiver([post_save, post_delete], sender=Invoice, dispatch_uid="sales_rollup_on_invoice_change")
+def update_sales_rollup_on_order_child_change(sender, instance, **kwargs):
+    from .reporting import schedule_sales_rollup_update
+    schedule_sales_rollup_update(order_ids=[instance.order_id])
+
+@receiver([post_save, post_delete], sender=Delivery, dispatch_uid="sales_rollup_on_delivery_change")
+def update_sales_rollup_on_delivery_change(sender, instance, **kwargs):
+    from .reporting import schedule_sales_rollup_update
+    schedule_sales_rollup_update(order_item_ids=[instance.order_item_id])
+
+@receiver([post_save, post_delete], sender=DealerPrice, dispatch_uid="price_book_invalidate_dealer_price")
+def invalidate_price_book_on_dealer_price_change(sender, instance, **kwargs):
+    """Bayiye özel fiyat değişince yalnızca o bayinin fiyat listesi geçersiz olur."""
+    from .pricing import invalidate_price_book
+    dealer_id = instance.dealer_id
+    db_transaction.on_commit(lambda: invalidate_price_book(dealer_id))
+
+@receiver([post_save, post_delete], sender=Product, dispatch_uid="price_book_invalidate_product")
+def invalidate_price_book_on_product_change(sender, **kwargs):
+    """Satış fiyatı (bayiye özel fiyatı olmayanların fiyatı) tüm bayilerin listesinde kullanılır."""
+    from .pricing import invalidate_price_book
+    db_transaction.on_commit(invalidate_price_book)
+
+@receiver([post_save, post_delete], sender=OrderConfiguration, dispatch_uid="order_configuration_invalidate")
+def invalidate_order_configuration(sender, **kwargs):
+    """Sipariş alımı açılıp kapatılınca tüm süreçlerdeki önbellek geçersiz olur."""
+    # Bu süreç hemen yeni değeri görür; commit sonrası artış, arada eski değeri yükleyen süreçler için
+    OrderConfiguration.invalidate_solo()
+    db_transaction.on_commit(OrderConfiguration.invalidate_solo)
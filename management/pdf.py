@@ -0,0 +1,337 @@
+# ----------------------------------------------------------------------
+# management/pdf.py
+# PDF motorları: wkhtmltopdf (harici program), xhtml2pdf ve reportlab (süreç içi)
+# ----------------------------------------------------------------------
+import abc
+import os
+import platform
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+import pdfkit
+from django.conf import settings
+from django.template.defaultfilters import floatformat
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+# **********************************************************************
+# KRİTİK AYAR: wkhtmltopdf YOLU (OTOMATİK SİSTEM KONTROLÜ)
+# **********************************************************************
+if platform.system() == "Windows":
+    # Kendi bilgisayarınız (Local) için
+    WKHTMLTOPDF_PATH = 'C:/Program Files/wkhtmltopdf/bin/wkhtmltopdf.exe'
+else:
+    # PythonAnywhere (Linux) için
+    WKHTMLTOPDF_PATH = '/usr/bin/wkhtmltopdf'
+
+# Türkçe karakter desteği için ayarlar
+PDFKIT_OPTIONS = {
+    'encoding': "UTF-8",
+    'quiet': '',
+}
+
+# Belge türü -> HTML şablonu (HTML tabanlı motorlar için)
+DOCUMENT_TEMPLATES = {
+    'invoice': "admin/management/invoice_view.html",
+    'order': "management/order_pdf_template.html",
+    'production_list': "management/production_list_pdf.html",
+}
+
+# settings.PDF_ENGINES ile belge bazında değiştirilebilir
+DEFAULT_PDF_ENGINES = {
+    'invoice': 'wkhtmltopdf',
+    'order': 'xhtml2pdf',
+    'production_list': 'xhtml2pdf',
+}
+
+
+class PdfRenderError(Exception):
+    """PDF üretilemediğinde fırlatılır."""
+
+
+# ----------------------------------------------------------------------
+# 1. HTML TABANLI MOTORLAR
+# ----------------------------------------------------------------------
+class PdfBackend(abc.ABC):
+    """
+    Tüm PDF motorlarının ortak arayüzü: render(belge_türü, context) -> bytes.
+    Eksik metodu olan motor, toplu işin ortasında değil oluşturulurken hata verir.
+    """
+    name = None
+    # True: üretim harici bir programda yapılır (paralel iş parçacıkları GIL'e takılmaz)
+    runs_external_process = False
+
+    @abc.abstractmethod
+    def render(self, document, context):
+        """Belgeyi PDF olarak (bytes) döndürür."""
+
+
+class HtmlPdfBackend(PdfBackend):
+    """Belgeyi önce Django şablonuyla HTML'e, sonra PDF'e çeviren motorlar."""
+
+    def render(self, document, context):
+        html = render_to_string(DOCUMENT_TEMPLATES[document], context)
+        return self.html_to_pdf(html)
+
+    @abc.abstractmethod
+    def html_to_pdf(self, html):
+        """Şablondan üretilen HTML'i PDF'e (bytes) çevirir."""
+
+
+class WkhtmltopdfBackend(HtmlPdfBackend):
+    """Her belge için harici wkhtmltopdf programını çalıştırır."""
+    name = 'wkhtmltopdf'
+    runs_external_process = True
+
+    def html_to_pdf(self, html):
+        config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
+        return pdfkit.from_string(html, False, configuration=config, options=PDFKIT_OPTIONS)
+
+
+class XhtmlToPdfBackend(HtmlPdfBackend):
+    """xhtml2pdf ile süreç içinde üretir (belge tek sefer işlenir)."""
+    name = 'xhtml2pdf'
+
+    def html_to_pdf(self, html):
+        from xhtml2pdf import pisa
+
+        result = BytesIO()
+        pisa_status = pisa.CreatePDF(html, dest=result, encoding='utf-8')
+        if pisa_status.err:
+            raise PdfRenderError("PDF oluşturulurken hata oluştu")
+        return result.getvalue()
+
+
+# ----------------------------------------------------------------------
+# 2. REPORTLAB MOTORU (HTML YOK, DOĞRUDAN ÇİZİM)
+# ----------------------------------------------------------------------
+# Türkçe karakterler (ğ, ş, ı, İ) için Unicode TTF font gerekir. settings.PDF_FONT_PATH
+# verilmezse sistemdeki DejaVu Sans aranır; bulunamazsa Helvetica kullanılır.
+FONT_SEARCH_PATHS = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    'C:/Windows/Fonts/DejaVuSans.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+]
+
+
+class ReportlabBackend(PdfBackend):
+    """reportlab (platypus) ile şablonsuz, süreç içinde PDF üretir."""
+    name = 'reportlab'
+
+    _fonts = None
+
+    def render(self, document, context):
+        builder = getattr(self, f'build_{document}', None)
+        if builder is None:
+            raise PdfRenderError(f"reportlab motoru '{document}' belgesini desteklemiyor.")
+
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import mm
+        from reportlab.platypus import SimpleDocTemplate
+
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(
+            buffer, pagesize=A4,
+            leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm,
+        )
+        doc.build(builder(context))
+        return buffer.getvalue()
+
+    # --- Yardımcılar ---
+    @classmethod
+    def get_fonts(cls):
+        """(normal, kalın) font adlarını döndürür; TTF fontu bir kez kaydeder."""
+        if cls._fonts is None:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            cls._fonts = ('Helvetica', 'Helvetica-Bold')
+            candidates = [getattr(settings, 'PDF_FONT_PATH', None)] + FONT_SEARCH_PATHS
+            for path in candidates:
+                if path and os.path.exists(path):
+                    pdfmetrics.registerFont(TTFont('PdfSans', path))
+                    bold_path = path.replace('.ttf', '-Bold.ttf')
+                    if os.path.exists(bold_path):
+                        pdfmetrics.registerFont(TTFont('PdfSans-Bold', bold_path))
+                        cls._fonts = ('PdfSans', 'PdfSans-Bold')
+                    else:
+                        cls._fonts = ('PdfSans', 'PdfSans')
+                    break
+        return cls._fonts
+
+    def styles(self):
+        from reportlab.lib.styles import ParagraphStyle
+
+        font, bold = self.get_fonts()
+        return {
+            'title': ParagraphStyle('title', fontName=bold, fontSize=14, leading=18, spaceAfter=6),
+            'normal': ParagraphStyle('normal', fontName=font, fontSize=9, leading=12),
+            'bold': ParagraphStyle('bold', fontName=bold, fontSize=9, leading=12),
+            'right': ParagraphStyle('right', fontName=bold, fontSize=11, leading=14, alignment=2, spaceBefore=8),
+        }
+
+    def table(self, rows, col_widths=None, align_right_from=None):
+        from reportlab.lib import colors
+        from reportlab.platypus import Table, TableStyle
+
+        font, bold = self.get_fonts()
+        style = [
+            ('FONTNAME', (0, 0), (-1, -1), font),
+            ('FONTNAME', (0, 0), (-1, 0), bold),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f2f2f2')),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#999999')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]
+        if align_right_from is not None:
+            style.append(('ALIGN', (align_right_from, 0), (-1, -1), 'RIGHT'))
+
+        table = Table(rows, colWidths=col_widths, repeatRows=1)
+        table.setStyle(TableStyle(style))
+        return table
+
+    @staticmethod
+    def paragraph(text, style):
+        from reportlab.platypus import Paragraph
+
+        return Paragraph(escape(str(text)), style)
+
+    @staticmethod
+    def money(value):
+        return f"{floatformat(value, 2)} TL"
+
+    # --- Belgeler ---
+    def build_invoice(self, context):
+        from reportlab.lib.units import mm
+        from reportlab.platypus import Spacer
+
+        styles = self.styles()
+        invoice = context['invoice']
+        dealer = invoice.get('dealer')
+        invoice_date = invoice.get('invoice_date')
+
+        story = [
+            self.paragraph(f"FATURA #{invoice['invoice_number']}", styles['title']),
+            self.paragraph(f"Bayi: {getattr(dealer, 'name', dealer) or ''}", styles['normal']),
+            self.paragraph(f"Sipariş No: {invoice.get('order_id', '')}", styles['normal']),
+            self.paragraph(f"Tarih: {timezone.localtime(invoice_date).strftime('%d.%m.%Y %H:%M') if invoice_date else ''}", styles['normal']),
+            Spacer(1, 6 * mm),
+        ]
+
+        rows = [['Ürün Adı', 'Miktar', 'Birim', 'Birim Fiyat (KDV Hariç)', 'Ara Toplam', 'KDV', 'Satır Toplamı']]
+        for line in invoice.get('invoice_lines', []):
+            rows.append([
+                self.paragraph(str(line['product_name']), styles['normal']),
+                floatformat(line['quantity'], 0),
+                str(line['unit']),
+                self.money(line['unit_price']),
+                self.money(line['subtotal']),
+                f"%{floatformat(line['vat_rate'], 0)}",
+                self.money(line['line_total']),
+            ])
+        story.append(self.table(rows, col_widths=[55 * mm, 15 * mm, 15 * mm, 28 * mm, 24 * mm, 12 * mm, 28 * mm], align_right_from=3))
+
+        story += [
+            self.paragraph(f"KDV Hariç Toplam: {self.money(invoice.get('vat_excluded_total'))}", styles['right']),
+            self.paragraph(f"Toplam KDV: {self.money(invoice.get('total_vat'))}", styles['right']),
+            self.paragraph(f"GENEL TOPLAM (KDV Dahil): {self.money(invoice.get('grand_total'))}", styles['right']),
+        ]
+        return story
+
+    def build_order(self, context):
+        from reportlab.lib.units import mm
+        from reportlab.platypus import Spacer
+
+        styles = self.styles()
+        order = context['order']
+        story = [
+            self.paragraph("SİPARİŞ FİŞİ", styles['title']),
+            self.paragraph(f"No: #{order.id} | Tarih: {timezone.localtime(order.order_date).strftime('%d.%m.%Y %H:%M')}", styles['normal']),
+            Spacer(1, 6 * mm),
+        ]
+
+        rows = [['Ürün', 'Miktar', 'Birim', 'Birim Fiyat', 'Toplam']]
+        for item in order.items.all():
+            rows.append([
+                self.paragraph(item.product.name, styles['normal']),
+                str(item.ordered_quantity),
+                item.ordered_unit.name,
+                self.money(item.unit_price_at_order),
+                self.money(item.line_total_amount),
+            ])
+        if len(rows) == 1:
+            rows.append(['Siparişe ait ürün bulunamadı.', '', '', '', ''])
+        story.append(self.table(rows, col_widths=[80 * mm, 20 * mm, 20 * mm, 30 * mm, 30 * mm], align_right_from=3))
+
+        story.append(self.paragraph(f"Genel Toplam: {self.money(order.estimated_total)}", styles['right']))
+        return story
+
+    def build_production_list(self, context):
+        from reportlab.lib.units import mm
+        from reportlab.platypus import Spacer
+
+        styles = self.styles()
+        date = context.get('date') or timezone.now()
+        story = [
+            self.paragraph("ÜRETİM ÖZETİ", styles['title']),
+            self.paragraph(f"Tarih: {timezone.localtime(date).strftime('%d.%m.%Y %H:%M')}", styles['normal']),
+            self.paragraph(f"Toplam Sipariş: {context.get('order_count', 0)} adet", styles['normal']),
+            Spacer(1, 6 * mm),
+            self.paragraph("1. ÜRETİLECEK ÜRÜN LİSTESİ (MAMULLER)", styles['bold']),
+        ]
+
+        rows = [['Ürün Adı', 'Toplam Üretim Miktarı']]
+        for p in context.get('product_totals', []):
+            rows.append([
+                self.paragraph(str(p['product__name']), styles['normal']),
+                f"{floatformat(p['total_quantity'], 2)} {p.get('birim') or ''}",
+            ])
+        story.append(self.table(rows, col_widths=[120 * mm, 60 * mm], align_right_from=1))
+
+        if context.get('intermediate_totals'):
+            story += [Spacer(1, 6 * mm), self.paragraph("ARA ÜRÜNLER (ÖNCE HAZIRLANACAK)", styles['bold'])]
+            rows = [['Ara Ürün Adı', 'Toplam Hazırlanacak Miktar']]
+            for p in context['intermediate_totals']:
+                rows.append([
+                    self.paragraph(str(p['product__name']), styles['normal']),
+                    f"{floatformat(p['total_quantity'], 2)} {p.get('birim') or ''}",
+                ])
+            story.append(self.table(rows, col_widths=[120 * mm, 60 * mm], align_right_from=1))
+
+        story += [Spacer(1, 6 * mm), self.paragraph("2. GEREKLİ HAMMADDE LİSTESİ (DEPO ÇIKIŞ)", styles['bold'])]
+        rows = [['Hammadde Adı', 'Gereken Toplam Miktar']]
+        for m in context.get('material_totals', []):
+            rows.append([
+                self.paragraph(str(m['raw_material__name']), styles['normal']),
+                f"{floatformat(m['needed_amount'], 2)} {m.get('birim') or ''}",
+            ])
+        story.append(self.table(rows, col_widths=[120 * mm, 60 * mm], align_right_from=1))
+        return story
+
+
+# ----------------------------------------------------------------------
+# 3. MOTOR SEÇİMİ
+# ----------------------------------------------------------------------
+PDF_BACKENDS = {
+    backend.name: backend
+    for backend in (WkhtmltopdfBackend, XhtmlToPdfBackend, ReportlabBackend)
+}
+
+
+def get_pdf_engine_name(document):
+    engines = dict(DEFAULT_PDF_ENGINES, **getattr(settings, 'PDF_ENGINES', {}))
+    return engines[document]
+
+
+def get_pdf_backend(document, engine=None):
+    engine = engine or get_pdf_engine_name(document)
+    try:
+        return PDF_BACKENDS[engine]()
+    except KeyError:
+        raise PdfRenderError(f"Tanımsız PDF motoru: {engine}")
+
+
+def render_pdf(document, context, engine=None):
+    """Belgeyi seçili (veya settings.PDF_ENGINES'te tanımlı) motorla PDF'e çevirir."""
+    return get_pdf_backend(document, engine).render(document, context)
@@ -0,0 +1,66 @@
+# ----------------------------------------------------------------------
+# management/pricing.py
+# Bayi fiyat listesi: bayiye özel fiyat, yoksa ürünün satış fiyatı (önbellekli)
+# ----------------------------------------------------------------------
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.functions import Coalesce
+
+from .cache_versions import bump_cache_version, get_cache_versions
+from .models import Product
+
+CENT = Decimal('0.01')
+
+PRICE_BOOK_CACHE_TIMEOUT = 60 * 60
+# Ürün değişince tüm bayilerin, bayi fiyatı değişince yalnızca o bayinin listesi geçersiz olur
+PRICE_BOOK_VERSION_KEY = 'pricing:version'
+
+
+def _dealer_version_key(dealer_id):
+    return f'pricing:dealer:{dealer_id}:version'
+
+
+def build_price_book(dealer_id=None):
+    """
+    {ürün_id: birim fiyat} sözlüğünü tek sorguda hesaplar. Bayiye özel fiyat tanımlıysa
+    o, değilse ürünün satış fiyatı kullanılır (fiyat ürün ana birimi cinsindendir).
+    """
+    products = Product.objects.all()
+    if dealer_id is None:
+        return dict(products.values_list('pk', 'selling_price'))
+
+    rows = products.annotate(
+        dealer_price=FilteredRelation('dealer_prices', condition=Q(dealer_prices__dealer_id=dealer_id))
+    ).values_list('pk', Coalesce(F('dealer_price__price'), F('selling_price')))
+    # Her iki fiyat alanı da 2 basamaklıdır; bazı veritabanları ifade sonucunu ölçeksiz döndürür
+    return {product_id: price.quantize(CENT) for product_id, price in rows}
+
+
+def get_price_book(dealer=None):
+    """Bayinin (Dealer veya id) fiyat listesini sürümlü önbellekten döndürür."""
+    dealer_id = getattr(dealer, 'pk', dealer)
+    version_keys = [PRICE_BOOK_VERSION_KEY, _dealer_version_key(dealer_id)]
+
+    versions = get_cache_versions(version_keys)
+    key = 'pricing:book:{}:{}:{}'.format(dealer_id, *(versions.get(k) for k in version_keys))
+    price_book = cache.get(key)
+    if price_book is None:
+        price_book = build_price_book(dealer_id)
+        cache.set(key, price_book, PRICE_BOOK_CACHE_TIMEOUT)
+    return price_book
+
+
+def get_unit_price(product, dealer=None, price_book=None):
+    """Ürünün bayiye göre birim fiyatı. Aynı istekte çok ürün için price_book bir kez alınıp verilmelidir."""
+    if price_book is None:
+        price_book = get_price_book(dealer)
+    price = price_book.get(product.pk)
+    # Önbellek alındıktan sonra eklenen ürün
+    return product.selling_price if price is None else price
+
+
+def invalidate_price_book(dealer_id=None):
+    """Bayinin (dealer_id verilmezse tüm bayilerin) önbellekteki fiyat listesini geçersiz kılar."""
+    bump_cache_version(PRICE_BOOK_VERSION_KEY if dealer_id is None else _dealer_version_key(dealer_id))
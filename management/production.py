@@ -0,0 +1,428 @@
+# ----------------------------------------------------------------------
+# management/production.py
+# Üretim planlama: siparişleri reçeteler üzerinden hammadde ihtiyacına açar,
+# reçete birim maliyetlerini hesaplar
+# ----------------------------------------------------------------------
+import csv
+import io
+import logging
+import threading
+from collections import deque
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache_versions import bump_cache_version, get_cache_version
+from .models import OrderItem, Recipe, RecipeItem, fraction_to_decimal, get_conversion_graph
+
+logger = logging.getLogger(__name__)
+
+# Ürün ağaçları (reçete açılımları) önbellekte bu süre tutulur; reçete, hammadde, ürün
+# veya çevrim değişince sürüm değiştirildiği için eski açılım zaten kullanılmaz.
+BILL_OF_MATERIALS_CACHE_TIMEOUT = 60 * 60
+BILL_OF_MATERIALS_VERSION_KEY = 'production:bom_version'
+
+# Plan miktarlarının hassasiyeti (ana birim / maliyet birimi cinsinden)
+QUANTITY_PRECISION = Decimal('0.0001')
+
+# Reçete birim maliyetinin saklanma hassasiyeti (Recipe.unit_cost)
+UNIT_COST_PRECISION = Decimal('0.0001')
+
+# Ara ürün zincirinin en fazla derinliği (döngüsel reçeteleri yakalamak için)
+MAX_RECIPE_DEPTH = 10
+
+
+class ProductionPlanError(Exception):
+    """Reçete ağacı açılamadığında (döngüsel veya çok derin ara ürün zinciri)."""
+
+
+# ----------------------------------------------------------------------
+# 1. ÜRÜN AĞACI (REÇETE AÇILIMI)
+# ----------------------------------------------------------------------
+def add_quantity(totals, key, quantity):
+    totals[key] = totals.get(key, Decimal('0')) + quantity
+
+
+def convert_or_keep(graph, quantity, source_id, target_id):
+    """
+    Miktarı kaynak birimden hedef birime çevirir. Çevrim yolu yoksa miktar zaten hedef
+    birim cinsinden yazılmış kabul edilir (örn. 1 Adet ürün için 0.2 Kg un).
+    """
+    if source_id == target_id or source_id is None or target_id is None:
+        return quantity
+    factor = graph.factor(source_id, target_id)
+    if factor is None:
+        return quantity
+    return quantity * fraction_to_decimal(factor)
+
+
+def recipe_quantity_in_material_unit(graph, quantity_required, product_unit_id, material_unit_id):
+    """
+    Reçete kalemindeki miktarı (ürünün 1 ana birimi için) hammaddenin maliyet birimine çevirir.
+    Üretim planı ve reçete maliyeti aynı kuralı kullanır: miktar ürün birimiyle yazılmıştır
+    (1 Kg ürün için 0.5 -> 500 Gr); birimler arasında çevrim yoksa hammadde birimindedir.
+    """
+    return convert_or_keep(graph, Decimal(str(quantity_required)), product_unit_id, material_unit_id)
+
+
+def build_bill_of_materials():
+    """
+    Aktif reçeteleri tek sorguda okuyup her ürün için 1 ana birim başına ihtiyacı çıkarır:
+
+        {
+            'products': {ürün_id: {'materials': {hammadde_id: miktar}, 'intermediates': {ara_ürün_id: miktar}}},
+            'materials': {hammadde_id: (ad, birim adı)},
+            'intermediates': {ara_ürün_id: (ad, birim adı)},
+            'invalid': {ürün_id: hata mesajı},
+        }
+
+    Hammadde miktarları hammaddenin maliyet birimi, ara ürün miktarları ara ürünün ana birimi
+    cinsindendir. Ara ürünlerin reçeteleri alt seviyelere kadar açılır. Döngüsel veya çok derin
+    reçete zinciri (ve onu ara ürün olarak kullanan ürünler) 'invalid' altında listelenir; diğer
+    ürünlerin planı bundan etkilenmez.
+    """
+    graph = get_conversion_graph()
+
+    rows = RecipeItem.objects.filter(recipe__is_active=True).values_list(
+        'recipe__product_id', 'recipe__product__name', 'recipe__product__unit_id', 'recipe__product__unit__name',
+        'raw_material_id', 'raw_material__name', 'raw_material__unit_id', 'raw_material__unit__name',
+        'raw_material__intermediate_product_id', 'quantity_required',
+    )
+
+    recipes = {}
+    product_info = {}
+    materials = {}
+    for (product_id, product_name, product_unit_id, product_unit_name,
+         material_id, material_name, material_unit_id, material_unit_name,
+         intermediate_id, quantity_required) in rows:
+        product_info[product_id] = (product_name, product_unit_id, product_unit_name)
+        materials[material_id] = (material_name, material_unit_name)
+        recipes.setdefault(product_id, []).append((
+            material_id,
+            material_unit_id,
+            intermediate_id,
+            recipe_quantity_in_material_unit(graph, quantity_required, product_unit_id, material_unit_id),
+        ))
+
+    exploded = {}
+    invalid = {}
+
+    def explode(product_id, path):
+        if product_id in exploded:
+            return exploded[product_id]
+        if product_id in invalid:
+            raise ProductionPlanError(invalid[product_id])
+        if product_id in path or len(path) >= MAX_RECIPE_DEPTH:
+            names = [product_info[pid][0] for pid in path + (product_id,)]
+            raise ProductionPlanError("Reçete zinciri döngüsel veya çok derin: " + " -> ".join(names))
+
+        needs = {'materials': {}, 'intermediates': {}}
+        for material_id, material_unit_id, intermediate_id, quantity in recipes[product_id]:
+            # Reçetesi olan ara ürün: kendi reçetesine açılır, hammadde olarak listelenmez
+            if intermediate_id in recipes:
+                intermediate_quantity = convert_or_keep(
+                    graph, quantity, material_unit_id, product_info[intermediate_id][1]
+                )
+                add_quantity(needs['intermediates'], intermediate_id, intermediate_quantity)
+
+                sub_needs = explode(intermediate_id, path + (product_id,))
+                for kind in ('materials', 'intermediates'):
+                    for key, sub_quantity in sub_needs[kind].items():
+                        add_quantity(needs[kind], key, sub_quantity * intermediate_quantity)
+            else:
+                add_quantity(needs['materials'], material_id, quantity)
+
+        exploded[product_id] = needs
+        return needs
+
+    for product_id in recipes:
+        try:
+            explode(product_id, ())
+        except ProductionPlanError as e:
+            invalid[product_id] = str(e)
+            logger.warning("Reçete açılamadı (%s): %s", product_info[product_id][0], e)
+
+    return {
+        'products': exploded,
+        'materials': materials,
+        'intermediates': {
+            product_id: (name, unit_name) for product_id, (name, _, unit_name) in product_info.items()
+        },
+        'invalid': invalid,
+    }
+
+
+def get_bill_of_materials():
+    """Ürün ağacını sürümlü önbellekten döndürür; yoksa hesaplayıp önbelleğe yazar."""
+    version = get_cache_version(BILL_OF_MATERIALS_VERSION_KEY)
+    key = f'production:bom:{version}'
+    bom = cache.get(key)
+    if bom is None:
+        bom = build_bill_of_materials()
+        cache.set(key, bom, BILL_OF_MATERIALS_CACHE_TIMEOUT)
+    return bom
+
+
+def invalidate_bill_of_materials():
+    """Önbellekteki ürün ağaçlarını geçersiz kılar (sürüm değiştirilir)."""
+    bump_cache_version(BILL_OF_MATERIALS_VERSION_KEY)
+
+
+# ----------------------------------------------------------------------
+# 2. ÜRETİM PLANI
+# ----------------------------------------------------------------------
+def get_production_items(order_ids=None, start_date=None, end_date=None):
+    """Seçili siparişlerin veya tarih aralığındaki (iptal edilmemiş) siparişlerin kalemleri."""
+    items = OrderItem.objects.all()
+    if order_ids is not None:
+        items = items.filter(order_id__in=order_ids)
+    else:
+        items = items.exclude(order__status='CANCELLED')
+    if start_date:
+        items = items.filter(order__order_date__date__gte=start_date)
+    if end_date:
+        items = items.filter(order__order_date__date__lte=end_date)
+    return items
+
+
+def build_production_plan(items):
+    """
+    Sipariş kalemlerini ürün, ara ürün ve hammadde ihtiyacına açar.
+
+    Kalemler tek sorguda okunur; miktarlar kalemde saklanan ana birim miktarıdır
+    (base_quantity; sipariş birimi -> ürün birimi çevrimi kayıtta yapılmıştır).
+    Reçete açılımı önbellekteki ürün ağacından gelir. Dönen sözlük doğrudan
+    üretim listesi PDF şablonuna verilebilir.
+    """
+    bom = get_bill_of_materials()
+
+    order_ids = set()
+    products = {}
+    for order_id, product_id, product_name, unit_name, base_quantity in items.values_list(
+        'order_id', 'product_id', 'product__name', 'product__unit__name', 'base_quantity'
+    ):
+        order_ids.add(order_id)
+        if product_id not in products:
+            products[product_id] = {'product__name': product_name, 'birim': unit_name, 'total_quantity': Decimal('0')}
+        products[product_id]['total_quantity'] += base_quantity or Decimal('0')
+
+    material_totals = {}
+    intermediate_totals = {}
+    missing_recipes = []
+    invalid_recipes = []
+    for product_id, product in products.items():
+        needs = bom['products'].get(product_id)
+        if needs is None:
+            if product_id in bom['invalid']:
+                invalid_recipes.append(product['product__name'])
+            else:
+                missing_recipes.append(product['product__name'])
+            continue
+        for material_id, quantity in needs['materials'].items():
+            add_quantity(material_totals, material_id, quantity * product['total_quantity'])
+        for intermediate_id, quantity in needs['intermediates'].items():
+            add_quantity(intermediate_totals, intermediate_id, quantity * product['total_quantity'])
+
+    return {
+        'product_totals': sorted(products.values(), key=lambda row: row['product__name']),
+        'intermediate_totals': sorted(
+            (
+                {'product__name': bom['intermediates'][product_id][0],
+                 'birim': bom['intermediates'][product_id][1],
+                 'total_quantity': quantity.quantize(QUANTITY_PRECISION)}
+                for product_id, quantity in intermediate_totals.items()
+            ),
+            key=lambda row: row['product__name']
+        ),
+        'material_totals': sorted(
+            (
+                {'raw_material__name': bom['materials'][material_id][0],
+                 'birim': bom['materials'][material_id][1],
+                 'needed_amount': quantity.quantize(QUANTITY_PRECISION)}
+                for material_id, quantity in material_totals.items()
+            ),
+            key=lambda row: row['raw_material__name']
+        ),
+        'missing_recipes': sorted(missing_recipes),
+        'invalid_recipes': sorted(invalid_recipes),
+        'order_count': len(order_ids),
+    }
+
+
+# ----------------------------------------------------------------------
+# 3. DIŞA AKTARMA
+# ----------------------------------------------------------------------
+def production_plan_to_csv(plan):
+    """Üretim planını (Excel uyumlu, ';' ayraçlı) CSV metnine çevirir."""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=';')
+    writer.writerow(['Tür', 'Ad', 'Miktar', 'Birim'])
+
+    def fmt(value):
+        return f"{value:.3f}".replace('.', ',')
+
+    for row in plan['product_totals']:
+        writer.writerow(['Ürün', row['product__name'], fmt(row['total_quantity']), row['birim'] or ''])
+    for row in plan['intermediate_totals']:
+        writer.writerow(['Ara Ürün', row['product__name'], fmt(row['total_quantity']), row['birim'] or ''])
+    for row in plan['material_totals']:
+        writer.writerow(['Hammadde', row['raw_material__name'], fmt(row['needed_amount']), row['birim'] or ''])
+
+    # Excel'in Türkçe karakterleri doğru açması için BOM ile başlar
+    return '\ufeff' + output.getvalue()
+
+
+# ----------------------------------------------------------------------
+# 4. REÇETE MALİYETİ
+# ----------------------------------------------------------------------
+# Sinyallerden gelen yeniden hesaplama istekleri, transaction commit edilince tek seferde
+# işlenir (aynı kayıtta 10 reçete kalemi değişse de reçete bir kez hesaplanır).
+_pending_cost_updates = threading.local()
+
+
+def get_connected_unit_ids(graph, unit_ids):
+    """Verilen birimlerle çevrimler üzerinden (doğrudan veya dolaylı) bağlı tüm birimler."""
+    connected = {unit_id for unit_id in unit_ids if unit_id is not None}
+    queue = deque(connected)
+    while queue:
+        unit_id = queue.popleft()
+        for next_id in graph.edges.get(unit_id, {}):
+            if next_id not in connected:
+                connected.add(next_id)
+                queue.append(next_id)
+    return connected
+
+
+def get_affected_recipe_ids(raw_material_ids=(), recipe_ids=(), product_ids=(), unit_ids=()):
+    """
+    Değişiklikten etkilenen reçeteler: değişen hammaddeyi kullananlar, değişen ürünün reçetesi,
+    çevrimi değişen birimlerle çalışanlar ve bunları ara ürün olarak kullanan üst reçeteler.
+    Hammadde -> reçete ters indeksi RecipeItem.raw_material üzerindeki indekstir.
+    """
+    connected_units = get_connected_unit_ids(get_conversion_graph(), unit_ids) if unit_ids else set()
+
+    condition = Q(pk__in=recipe_ids) | Q(product_id__in=product_ids) | Q(items__raw_material_id__in=raw_material_ids)
+    if connected_units:
+        condition |= Q(product__unit_id__in=connected_units) | Q(items__raw_material__unit_id__in=connected_units)
+    affected = set(Recipe.objects.filter(condition).values_list('id', flat=True).distinct())
+
+    # Ara ürün olarak kullanıldıkları üst reçetelere doğru yay
+    frontier = affected
+    for _ in range(MAX_RECIPE_DEPTH):
+        if not frontier:
+            break
+        frontier = set(
+            Recipe.objects.filter(items__raw_material__intermediate_product__recipe__in=frontier)
+            .values_list('id', flat=True).distinct()
+        ) - affected
+        affected |= frontier
+    return affected
+
+
+def compute_recipe_unit_costs(recipe_ids):
+    """
+    Reçetelerin 1 ana birim maliyetini tek sorguda hesaplar: {reçete_id: maliyet}.
+    Miktarlar production listesindeki kuralla hammadde birimine çevrilir. Reçetesi olan ara
+    ürünlerde hammadde fiyatı yerine ara ürünün maliyeti kullanılır; ara ürün reçetesi bu
+    hesaplamada yoksa kayıtlı unit_cost değeri okunur.
+    """
+    graph = get_conversion_graph()
+    recipe_ids = set(recipe_ids)
+
+    rows = RecipeItem.objects.filter(recipe_id__in=recipe_ids).values_list(
+        'recipe_id', 'recipe__product__unit_id', 'quantity_required',
+        'raw_material__unit_id', 'raw_material__cost_price',
+        'raw_material__intermediate_product__unit_id',
+        'raw_material__intermediate_product__recipe__id',
+        'raw_material__intermediate_product__recipe__is_active',
+        'raw_material__intermediate_product__recipe__unit_cost',
+    )
+    items = {recipe_id: [] for recipe_id in recipe_ids}
+    for row in rows:
+        items[row[0]].append(row[1:])
+
+    costs = {}
+
+    def cost_of(recipe_id, path):
+        if recipe_id in costs:
+            return costs[recipe_id]
+        path = path | {recipe_id}
+
+        total = Decimal('0')
+        for (product_unit_id, quantity_required, material_unit_id, cost_price,
+             intermediate_unit_id, intermediate_recipe_id, intermediate_active, intermediate_cost) in items[recipe_id]:
+            quantity = recipe_quantity_in_material_unit(graph, quantity_required, product_unit_id, material_unit_id)
+
+            material_cost = Decimal(str(cost_price or 0))
+            if intermediate_recipe_id and intermediate_active:
+                if intermediate_recipe_id in items and intermediate_recipe_id not in path:
+                    intermediate_cost = cost_of(intermediate_recipe_id, path)
+                # Ara ürün maliyeti kendi ana birimi içindir; hammadde birimine çevrilir
+                material_cost = convert_or_keep(
+                    graph, Decimal('1'), material_unit_id, intermediate_unit_id
+                ) * Decimal(str(intermediate_cost or 0))
+
+            total += quantity * material_cost
+
+        costs[recipe_id] = total
+        return total
+
+    for recipe_id in recipe_ids:
+        cost_of(recipe_id, frozenset())
+    return costs
+
+
+def update_recipe_costs(raw_material_ids=(), recipe_ids=(), product_ids=(), unit_ids=(), all_recipes=False):
+    """Etkilenen reçetelerin unit_cost alanını toplu (tek bulk_update) yeniden hesaplar."""
+    if all_recipes:
+        affected = set(Recipe.objects.values_list('id', flat=True))
+    else:
+        affected = get_affected_recipe_ids(raw_material_ids, recipe_ids, product_ids, unit_ids)
+    if not affected:
+        return 0
+
+    now = timezone.now()
+    costs = compute_recipe_unit_costs(affected)
+    Recipe.objects.bulk_update(
+        [
+            Recipe(pk=recipe_id, unit_cost=cost.quantize(UNIT_COST_PRECISION, rounding=ROUND_HALF_UP), cost_updated_at=now)
+            for recipe_id, cost in costs.items()
+        ],
+        ['unit_cost', 'cost_updated_at'],
+        batch_size=500
+    )
+    return len(costs)
+
+
+def schedule_recipe_cost_update(raw_material_ids=(), recipe_ids=(), product_ids=(), unit_ids=()):
+    """Sinyallerden çağrılır: yeniden hesaplamayı transaction commit edilince toplu yapar."""
+    pending = getattr(_pending_cost_updates, 'values', None)
+    if pending is None:
+        pending = _pending_cost_updates.values = {
+            'raw_material_ids': set(), 'recipe_ids': set(), 'product_ids': set(), 'unit_ids': set(),
+        }
+    pending['raw_material_ids'].update(raw_material_ids)
+    pending['recipe_ids'].update(recipe_ids)
+    pending['product_ids'].update(product_ids)
+    pending['unit_ids'].update(unit_ids)
+    # Veri commit edildikten sonra maliyet hesaplanamazsa istek yine başarılı sayılmalı
+    transaction.on_commit(flush_recipe_cost_updates, robust=True)
+
+
+def flush_recipe_cost_updates():
+    # Aynı transaction'daki sonraki çağrılar boş kuyruk bulur ve hiçbir şey yapmaz
+    pending = getattr(_pending_cost_updates, 'values', None)
+    _pending_cost_updates.values = None
+    if not pending or not any(pending.values()):
+        return
+
+    try:
+        update_recipe_costs(**pending)
+    except Exception:
+        logger.exception(
+            "Reçete birim maliyetleri güncellenemedi (%s). Düzeltmek için: manage.py recompute_recipe_costs",
+            {name: sorted(ids) for name, ids in pending.items() if ids},
+        )
@@ -0,0 +1,356 @@
+# ----------------------------------------------------------------------
+# management/reporting.py
+# Günlük satış özeti (DailySalesRollup): artımlı güncelleme ve yeniden oluşturma;
+# aylık kâr hesabı ve ortaklara dağıtımı
+# ----------------------------------------------------------------------
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import (
+    Collection, DailySalesRollup, Expense, InvoiceLine, Order, OrderItem, Partner, PartnerLedgerEntry,
+    PartnerProfitShare, ProfitDistribution, adjust_partner_balances, normalize_vat_rate,
+)
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+QUANTITY_PRECISION = Decimal('0.0001')
+
+# Sinyallerden biriken gün-bayi anahtarları; transaction commit edilince tek seferde işlenir
+_pending_rollup_updates = threading.local()
+
+
+# ----------------------------------------------------------------------
+# 1. ÖZET SATIRLARININ HESAPLANMASI
+# ----------------------------------------------------------------------
+def sales_rollup_key(order_date, dealer_id):
+    """Siparişin özet anahtarı: (yerel sipariş günü, bayi_id)."""
+    return timezone.localdate(order_date), dealer_id
+
+
+def get_day_bounds(day):
+    """Yerel günün [başlangıç, ertesi gün başlangıcı) aralığı."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def build_daily_sales_rollups(orders):
+    """
+    Verilen siparişlerin (Order QuerySet) özet satırlarını (kaydedilmemiş DailySalesRollup)
+    hesaplar. Kalemler ve fatura satırları veritabanında gün/bayi/ürün bazında toplanır:
+    toplam iki sorgu, sipariş sayısından bağımsızdır.
+    """
+    orders = orders.exclude(status='CANCELLED')
+
+    # Teslim edilen miktar sipariş birimindedir; kalemin kendi çevrim oranıyla ana birime çevrilir
+    delivered_base_quantity = Case(
+        When(
+            delivery__is_confirmed=True,
+            ordered_quantity__gt=0,
+            then=F('delivery__delivered_quantity') * F('base_quantity') / F('ordered_quantity')
+        ),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=20, decimal_places=4)
+    )
+    item_rows = OrderItem.objects.filter(order__in=orders).values(
+        'product_id', 'product__vat_rate',
+        day=TruncDate('order__order_date'),
+        dealer_id=F('order__dealer_id'),
+    ).annotate(
+        total_quantity=Sum('base_quantity'),
+        total_amount=Sum('line_total_amount'),
+        total_delivered=Sum(delivered_base_quantity),
+    ).order_by()
+
+    invoice_rows = InvoiceLine.objects.filter(
+        invoice__order__in=orders, product__isnull=False
+    ).values(
+        'product_id',
+        day=TruncDate('invoice__order__order_date'),
+        dealer_id=F('invoice__order__dealer_id'),
+    ).annotate(
+        total_net=Sum('subtotal'),
+        total_vat=Sum('vat_amount'),
+    ).order_by()
+
+    rollups = {}
+
+    def rollup_for(row):
+        key = (row['day'], row['dealer_id'], row['product_id'])
+        if key not in rollups:
+            rollups[key] = DailySalesRollup(date=row['day'], dealer_id=row['dealer_id'], product_id=row['product_id'])
+        return rollups[key]
+
+    for row in item_rows:
+        rollup = rollup_for(row)
+        # Satır toplamları KDV dahildir
+        gross_amount = Decimal(str(row['total_amount'] or 0))
+        net_amount = (gross_amount / (1 + normalize_vat_rate(row['product__vat_rate']))).quantize(CENT, rounding=ROUND_HALF_UP)
+
+        rollup.quantity = Decimal(str(row['total_quantity'] or 0)).quantize(QUANTITY_PRECISION, rounding=ROUND_HALF_UP)
+        rollup.delivered_quantity = Decimal(str(row['total_delivered'] or 0)).quantize(QUANTITY_PRECISION, rounding=ROUND_HALF_UP)
+        rollup.net_amount = net_amount
+        rollup.vat_amount = gross_amount.quantize(CENT, rounding=ROUND_HALF_UP) - net_amount
+
+    for row in invoice_rows:
+        rollup = rollup_for(row)
+        rollup.invoiced_net_amount = row['total_net'] or Decimal('0.00')
+        rollup.invoiced_vat_amount = row['total_vat'] or Decimal('0.00')
+
+    return list(rollups.values())
+
+
+# ----------------------------------------------------------------------
+# 2. ARTIMLI GÜNCELLEME
+# ----------------------------------------------------------------------
+def refresh_daily_sales_rollup(keys):
+    """
+    Verilen (gün, bayi_id) anahtarlarının özet satırlarını yeniden hesaplar: ilgili satırlar
+    tek DELETE ile silinir, yenileri tek bulk_create ile yazılır. Yazılan satır sayısını döndürür.
+    """
+    dealers_by_day = {}
+    for day, dealer_id in keys:
+        if day and dealer_id:
+            dealers_by_day.setdefault(day, set()).add(dealer_id)
+    if not dealers_by_day:
+        return 0
+
+    order_condition = Q()
+    rollup_condition = Q()
+    for day, dealer_ids in dealers_by_day.items():
+        start, end = get_day_bounds(day)
+        order_condition |= Q(order_date__gte=start, order_date__lt=end, dealer_id__in=dealer_ids)
+        rollup_condition |= Q(date=day, dealer_id__in=dealer_ids)
+
+    def write():
+        rollups = build_daily_sales_rollups(Order.objects.filter(order_condition))
+        with transaction.atomic():
+            DailySalesRollup.objects.filter(rollup_condition).delete()
+            DailySalesRollup.objects.bulk_create(rollups, batch_size=500)
+        return len(rollups)
+
+    try:
+        return write()
+    except IntegrityError:
+        # Aynı gün-bayi eşzamanlı başka bir işlemde yeniden yazıldı; güncel veriyle tekrar dene
+        return write()
+
+
+def schedule_sales_rollup_update(keys=(), order_ids=(), order_item_ids=()):
+    """
+    Sinyallerden ve toplu yazma yollarından çağrılır: etkilenen gün-bayi satırları transaction
+    commit edilince toplu yeniden hesaplanır. Sipariş ve kalem id'leri anahtara commit
+    sonrasında tek sorguda çevrilir (silinen siparişlerin anahtarı doğrudan verilmelidir).
+    """
+    pending = getattr(_pending_rollup_updates, 'values', None)
+    if pending is None:
+        pending = _pending_rollup_updates.values = {'keys': set(), 'order_ids': set(), 'order_item_ids': set()}
+    pending['keys'].update(keys)
+    pending['order_ids'].update(order_ids)
+    pending['order_item_ids'].update(order_item_ids)
+    # Veri commit edildikten sonra özet hesaplanamazsa istek yine başarılı sayılmalı
+    transaction.on_commit(flush_sales_rollup_updates, robust=True)
+
+
+def flush_sales_rollup_updates():
+    # Aynı transaction'daki sonraki çağrılar boş kuyruk bulur ve hiçbir şey yapmaz
+    pending = getattr(_pending_rollup_updates, 'values', None)
+    _pending_rollup_updates.values = None
+    if not pending or not any(pending.values()):
+        return
+
+    try:
+        _refresh_pending_sales_rollups(pending)
+    except Exception:
+        logger.exception(
+            "Günlük satış özeti güncellenemedi (siparişler: %s, kalemler: %s, anahtarlar: %s). "
+            "Düzeltmek için: manage.py rebuild_sales_rollup",
+            sorted(pending['order_ids']), sorted(pending['order_item_ids']), sorted(pending['keys'], key=str),
+        )
+
+
+def _refresh_pending_sales_rollups(pending):
+    keys = set(pending['keys'])
+    orders = Order.objects.none()
+    if pending['order_ids']:
+        orders = Order.objects.filter(pk__in=pending['order_ids'])
+    if pending['order_item_ids']:
+        orders = orders | Order.objects.filter(items__in=pending['order_item_ids'])
+    keys.update(
+        sales_rollup_key(order_date, dealer_id)
+        for order_date, dealer_id in orders.values_list('order_date', 'dealer_id').distinct()
+    )
+    refresh_daily_sales_rollup(keys)
+
+
+# ----------------------------------------------------------------------
+# 3. YENİDEN OLUŞTURMA
+# ----------------------------------------------------------------------
+def rebuild_daily_sales_rollup(start_date=None, end_date=None):
+    """
+    Özet tabloyu kaynak tablolardan yeniden oluşturur (tarihler dahil, yerel gün).
+    Tarih verilmezse tüm siparişler işlenir. Bellek kullanımı sınırlı kalsın diye
+    aylık dilimler halinde ve her dilim kendi transaction'ında yazılır.
+    Yazılan satır sayısını döndürür.
+    """
+    if start_date is None or end_date is None:
+        bounds = Order.objects.aggregate(first=Min('order_date'), last=Max('order_date'))
+        if bounds['first'] is None:
+            return 0
+        start_date = start_date or timezone.localdate(bounds['first'])
+        end_date = end_date or timezone.localdate(bounds['last'])
+
+    written = 0
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        next_month = (chunk_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        chunk_end = min(next_month - timedelta(days=1), end_date)
+
+        range_start, _ = get_day_bounds(chunk_start)
+        _, range_end = get_day_bounds(chunk_end)
+        rollups = build_daily_sales_rollups(
+            Order.objects.filter(order_date__gte=range_start, order_date__lt=range_end)
+        )
+        with transaction.atomic():
+            DailySalesRollup.objects.filter(date__gte=chunk_start, date__lte=chunk_end).delete()
+            DailySalesRollup.objects.bulk_create(rollups, batch_size=500)
+        written += len(rollups)
+        chunk_start = chunk_end + timedelta(days=1)
+
+    return written
+
+
+# ----------------------------------------------------------------------
+# 4. AYLIK KÂR HESABI
+# ----------------------------------------------------------------------
+def get_month_bounds(year, month):
+    """Ayın ilk günü ve sonraki ayın ilk günü (tarih olarak)."""
+    return date(year, month, 1), date(year + month // 12, month % 12 + 1, 1)
+
+
+def calculate_monthly_profits(periods, include_cost_of_goods=None):
+    """
+    (yıl, ay) dönemlerinin kâr bileşenlerini döndürür:
+    {(yıl, ay): {'collections', 'expenses', 'cost_of_goods', 'net_profit'}}
+
+    Her kaynak, dönem sayısından bağımsız olarak tek gruplu (aylık) sorguyla okunur:
+    tahsilatlar (Collection.created_at), giderler (Expense.date) ve isteğe bağlı olarak
+    satılan malın maliyeti (günlük satış özetindeki teslim edilen miktar x reçete birim maliyeti).
+    Net kâr = tahsilatlar - giderler - satılan malın maliyeti.
+    """
+    periods = sorted(set(periods))
+    if not periods:
+        return {}
+    if include_cost_of_goods is None:
+        include_cost_of_goods = getattr(settings, 'PROFIT_DEDUCT_COST_OF_GOODS', False)
+
+    first_day, _ = get_month_bounds(*periods[0])
+    _, end_day = get_month_bounds(*periods[-1])
+    range_start, _ = get_day_bounds(first_day)
+    range_end, _ = get_day_bounds(end_day)
+
+    def monthly_totals(queryset, date_field, amount):
+        rows = queryset.annotate(month=TruncMonth(date_field)).values('month').annotate(total=Sum(amount)).order_by()
+        return {(row['month'].year, row['month'].month): row['total'] or Decimal('0') for row in rows}
+
+    collections = monthly_totals(
+        Collection.objects.filter(created_at__gte=range_start, created_at__lt=range_end), 'created_at', 'amount'
+    )
+    expenses = monthly_totals(
+        Expense.objects.filter(date__gte=first_day, date__lt=end_day), 'date', 'amount'
+    )
+    cost_of_goods = {}
+    if include_cost_of_goods:
+        cost_of_goods = monthly_totals(
+            DailySalesRollup.objects.filter(date__gte=first_day, date__lt=end_day, product__recipe__isnull=False),
+            'date',
+            ExpressionWrapper(
+                F('delivered_quantity') * F('product__recipe__unit_cost'),
+                output_field=DecimalField(max_digits=20, decimal_places=4)
+            )
+        )
+
+    profits = {}
+    for period in periods:
+        collected = Decimal(str(collections.get(period, 0))).quantize(CENT, rounding=ROUND_HALF_UP)
+        spent = Decimal(str(expenses.get(period, 0))).quantize(CENT, rounding=ROUND_HALF_UP)
+        goods_cost = Decimal(str(cost_of_goods.get(period, 0))).quantize(CENT, rounding=ROUND_HALF_UP)
+        profits[period] = {
+            'collections': collected,
+            'expenses': spent,
+            'cost_of_goods': goods_cost,
+            'net_profit': collected - spent - goods_cost,
+        }
+    return profits
+
+
+# ----------------------------------------------------------------------
+# 5. KÂR DAĞITIMI (ORTAK HESAPLARI)
+# ----------------------------------------------------------------------
+@transaction.atomic
+def settle_profit_distributions(distributions):
+    """
+    Dağıtılmamış aylık kârları (ProfitDistribution QuerySet) tek geçişte ortaklara dağıtır:
+    paylar ve ortak cari hareketleri tek bulk_create ile yazılır, ortak toplamları tek UPDATE
+    ile (F()) artırılır, aylar tek UPDATE ile dağıtıldı işaretlenir. Sorgu sayısı ay ve ortak
+    sayısından bağımsızdır.
+
+    Pay = aylık net kâr x ortağın dağıtım oranı / 100. Kârı sıfır veya negatif olan aylar
+    dağıtılmaz. (dağıtılan aylar, zarar nedeniyle atlanan aylar) döndürür.
+    """
+    # Aynı ay iki işlemde birden dağıtılamaz; ortak bakiyeleri hareket sonrası bakiye için kilitlenir
+    distributions = list(distributions.filter(is_distributed=False).select_for_update().order_by('year', 'month'))
+    partners = list(Partner.objects.filter(distribution_ratio__gt=0).select_for_update().order_by('pk'))
+    if not distributions or not partners:
+        return [], []
+
+    settled = [distribution for distribution in distributions if distribution.total_net_profit > 0]
+    losses = [distribution for distribution in distributions if distribution.total_net_profit < 0]
+
+    # Önceki yarım kalmış dağıtımların payları (bakiyeye hiç yansımamış) temizlenir
+    PartnerProfitShare.objects.filter(distribution__in=distributions).delete()
+
+    now = timezone.now()
+    balances = {partner.pk: Decimal(str(partner.current_receivable)) for partner in partners}
+    deltas = {partner.pk: Decimal('0.00') for partner in partners}
+    shares = []
+    entries = []
+
+    for distribution in settled:
+        for partner in partners:
+            amount = (distribution.total_net_profit * partner.distribution_ratio / Decimal('100.00')).quantize(
+                CENT, rounding=ROUND_HALF_UP
+            )
+            deltas[partner.pk] += amount
+            balances[partner.pk] += amount
+
+            shares.append(PartnerProfitShare(
+                distribution=distribution,
+                partner=partner,
+                share_ratio=partner.distribution_ratio,
+                calculated_amount=amount,
+            ))
+            entries.append(PartnerLedgerEntry(
+                partner=partner,
+                distribution=distribution,
+                amount=amount,
+                balance_after=balances[partner.pk],
+                description=f"{distribution.month}/{distribution.year} kâr payı",
+                created_at=now,
+            ))
+
+    PartnerProfitShare.objects.bulk_create(shares, batch_size=500)
+    PartnerLedgerEntry.objects.bulk_create(entries, batch_size=500)
+    adjust_partner_balances(deltas)
+    ProfitDistribution.objects.filter(pk__in=[distribution.pk for distribution in settled]).update(is_distributed=True)
+
+    return settled, losses
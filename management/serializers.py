@@ -1,4 +1,6 @@
+from decimal import Decimal, ROUND_HALF_UP
 from rest_framework import serializers
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.db.models import Sum, F
@@ -6,8 +8,10 @@ from rest_framework.exceptions import ValidationError
 from .models import (
     Product, Dealer, DealerPrice, Order, OrderItem, Delivery, 
     Expense, Collection, Partner, ProfitDistribution, Courier, 
-    Transaction 
+    Transaction, Unit, calculate_order_item_amounts, get_conversion_graph
 )
+from .pricing import get_price_book, get_unit_price
+from .reporting import schedule_sales_rollup_update
 
 # ----------------------------------------------------------------------
 # 1. KRİTİK ÖZEL ALAN TANIMI (BAYİ FİYAT HESAPLAMA)
@@ -24,18 +28,18 @@ class DealerPriceField(serializers.ReadOnlyField):
         if not request or not request.user.is_authenticated:
             return final_price
 
-        try:
-            dealer = request.user.dealer_profile 
-        except Dealer.DoesNotExist:
-            return final_price
+        # Bayinin fiyat listesi liste boyunca bir kez alınır (ürün başına sorgu yapılmaz)
+        if 'dealer_price_book' not in self.context:
+            try:
+                dealer = request.user.dealer_profile
+            except Dealer.DoesNotExist:
+                dealer = None
+            self.context['dealer_price_book'] = get_price_book(dealer) if dealer else None
 
-        try:
-            dealer_price = DealerPrice.objects.get(dealer=dealer, product=product)
-            final_price = dealer_price.price
-        except DealerPrice.DoesNotExist:
-            pass 
-
-        return final_price
+        price_book = self.context['dealer_price_book']
+        if price_book is None:
+            return final_price
+        return get_unit_price(product, price_book=price_book)
 
 # ----------------------------------------------------------------------
 # 2. ÜRÜN VE BAYİ SERİLEŞTİRİCİLERİ
@@ -78,53 +82,139 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ('dealer', 'estimated_total', 'order_date', 'status', 'is_locked')
 
 
+class OrderItemCreateSerializer(serializers.Serializer):
+    """Sipariş oluştururken gönderilen kalem; fiyat sunucuda bayinin fiyat listesinden alınır."""
+    product = serializers.IntegerField(min_value=1)
+    ordered_quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    # Verilmezse ürünün ana birimi kullanılır
+    ordered_unit = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+    MAX_ITEMS = 200
+
+    items = OrderItemCreateSerializer(many=True, allow_empty=False, max_length=MAX_ITEMS, write_only=True)
+    item_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
-        fields = ('order_date', 'items')
+        fields = ('id', 'order_date', 'status', 'estimated_total', 'item_count', 'items')
+        read_only_fields = ('status', 'estimated_total')
+
+    def get_item_count(self, order):
+        items = getattr(order, 'created_items', None)
+        return len(items) if items is not None else order.items.count()
+
+    def validate(self, attrs):
+        # Toplu istekte ürün/birim kontrolü tüm siparişler için bir kez, üst serileştiricide yapılır
+        if not isinstance(self.parent, serializers.ListSerializer):
+            errors = resolve_order_items([attrs])
+            if errors[0]:
+                raise ValidationError(errors[0])
+        return attrs
 
-    @transaction.atomic
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        
-        order = Order.objects.create(**validated_data)
-        total_estimated = 0
-        
-        for item_data in items_data:
+        dealer = validated_data.pop('dealer')
+        return create_orders_bulk(dealer, [validated_data])[0]
+
+
+class OrderBatchCreateSerializer(serializers.Serializer):
+    """Bayinin birden çok siparişini tek istekte göndermesi için."""
+    MAX_ORDERS = 50
+
+    orders = OrderCreateSerializer(many=True, allow_empty=False, max_length=MAX_ORDERS)
+
+    def validate(self, attrs):
+        errors = resolve_order_items(attrs['orders'])
+        if any(errors):
+            raise ValidationError({'orders': errors})
+        return attrs
+
+    def create(self, validated_data):
+        return create_orders_bulk(validated_data['dealer'], validated_data['orders'])
+
+
+def resolve_order_items(orders_data):
+    """
+    Sipariş kalemlerindeki ürün ve birim id'lerini tek sorguda doğrular, nesneleriyle değiştirir.
+    Siparişlerle aynı sırada hata listesi döndürür (hatasız sipariş için boş sözlük).
+    """
+    all_items = [item for data in orders_data for item in data['items']]
+    products = Product.objects.in_bulk({item['product'] for item in all_items})
+    units = Unit.objects.in_bulk({item['ordered_unit'] for item in all_items if item.get('ordered_unit')})
+    graph = get_conversion_graph()
+
+    errors = []
+    for data in orders_data:
+        item_errors = []
+        for item in data['items']:
+            item_error = {}
+            product = products.get(item['product'])
+            if product is None or not product.is_active:
+                item_error['product'] = [f"Ürün bulunamadı veya satışta değil: {item['product']}"]
+            else:
+                unit_id = item.get('ordered_unit') or product.unit_id
+                if unit_id not in units and unit_id != product.unit_id:
+                    item_error['ordered_unit'] = [f"Birim bulunamadı: {unit_id}"]
+                elif unit_id is None:
+                    item_error['ordered_unit'] = ["Ürünün ana birimi tanımlı değil, sipariş birimi belirtilmelidir."]
+                elif product.unit_id and unit_id != product.unit_id and graph.factor(unit_id, product.unit_id) is None:
+                    item_error['ordered_unit'] = ["Bu birimden ürünün ana birimine çevrim tanımlı değil."]
+                else:
+                    item['product'] = product
+                    item['ordered_unit'] = unit_id
+            item_errors.append(item_error)
+        errors.append({'items': item_errors} if any(item_errors) else {})
+    return errors
+
+
+@transaction.atomic
+def create_orders_bulk(dealer, orders_data):
+    """
+    Doğrulanmış sipariş verilerinden (resolve_order_items sonrası) siparişleri toplu oluşturur.
+    Fiyatlar bayinin fiyat listesinden bir kez alınır; siparişler ve tüm kalemleri birer
+    bulk_create ile yazılır. Her sipariş yazılmadan önce full_clean ile denetlenir.
+    """
+    price_book = get_price_book(dealer)
+    graph = get_conversion_graph()
+
+    orders = []
+    for data in orders_data:
+        items = []
+        for item_data in data['items']:
             product = item_data['product']
-            ordered_quantity = item_data['ordered_quantity']
-            
-            final_price = product.selling_price
-            
-            request = self.context.get('request')
-            if request and request.user.is_authenticated:
-                try:
-                    dealer = order.dealer 
-                except AttributeError:
-                    dealer = get_object_or_404(Dealer, user=request.user)
-
-                try:
-                    dealer_price = DealerPrice.objects.get(dealer=dealer, product=product)
-                    final_price = dealer_price.price
-                except DealerPrice.DoesNotExist:
-                    pass
-
-            OrderItem.objects.create(
-                order=order,
+            item = OrderItem(
                 product=product,
-                ordered_quantity=ordered_quantity,
-                unit_price_at_order=final_price 
+                ordered_quantity=item_data['ordered_quantity'],
+                ordered_unit_id=item_data['ordered_unit'],
+                unit_price_at_order=get_unit_price(product, price_book=price_book),
             )
-            
-            total_estimated += ordered_quantity * final_price
-        
-        order.estimated_total = total_estimated
-        order.status = 'NEW' 
-        order.save()
-        
-        return order
+            base_quantity, line_total = calculate_order_item_amounts(
+                item.ordered_quantity, item.ordered_unit_id, product.unit_id, item.unit_price_at_order, graph
+            )
+            item.base_quantity = base_quantity.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+            item.line_total_amount = line_total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            items.append(item)
+
+        order = Order(dealer=dealer, status='NEW', estimated_total=sum(item.line_total_amount for item in items))
+        if data.get('order_date'):
+            order.order_date = data['order_date']
+        try:
+            # Bayi isteği yapan kullanıcıdan gelir; her sipariş için ayrıca sorgulanmaz
+            order.full_clean(exclude=['dealer'])
+        except DjangoValidationError as e:
+            raise ValidationError(e.message_dict if hasattr(e, 'error_dict') else e.messages)
+        order.created_items = items
+        orders.append(order)
+
+    Order.objects.bulk_create(orders)
+    for order in orders:
+        for item in order.created_items:
+            item.order = order
+    OrderItem.objects.bulk_create([item for order in orders for item in order.created_items])
+
+    schedule_sales_rollup_update(order_ids=[order.pk for order in orders])
+    return orders
 
 
 # ----------------------------------------------------------------------
@@ -172,6 +262,20 @@ class DeliveryConfirmationSerializer(serializers.ModelSerializer):
         model = Delivery
         fields = ('delivered_quantity',)
 
+class DeliveryBatchConfirmationItemSerializer(serializers.Serializer):
+    """Toplu onaydaki tek teslimat; anahtarı kurye uygulaması üretir (örn. UUID)."""
+    key = serializers.CharField(max_length=64)
+    delivery_id = serializers.IntegerField(min_value=1)
+    delivered_quantity = serializers.IntegerField(min_value=0)
+    # Çevrimdışı onaylarda teslimatın gerçek zamanı; verilmezse sunucu zamanı kullanılır
+    delivered_at = serializers.DateTimeField(required=False)
+
+class DeliveryBatchConfirmationSerializer(serializers.Serializer):
+    """Kuryenin kuyruktaki teslimat onaylarını tek istekte göndermesi için."""
+    MAX_ITEMS = 500
+
+    confirmations = DeliveryBatchConfirmationItemSerializer(many=True, allow_empty=False, max_length=MAX_ITEMS)
+
 class TransactionSerializer(serializers.ModelSerializer):
     """Bayi hareketlerini görüntülemek için (Admin ve Bayi)."""
     transaction_type_display = serializers.CharField(source='get_transaction_type_display', read_only=True)
@@ -1,3 +1,1126 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from fractions import Fraction
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .admin import create_invoice_for_order
+from .cache_versions import bump_cache_version
+from .invoicing import create_invoice_lines
+from .models import (
+    Courier, DailySalesRollup, Dealer, DealerPrice, Delivery, Invoice, InvoiceSequence, Order, OrderConfiguration,
+    OrderItem, Partner, PartnerLedgerEntry, Product, ProfitDistribution, RawMaterial, Recipe, RecipeItem,
+    Transaction, Unit, UnitConversion, UnitConversionGraph, CONVERSION_GRAPH_VERSION_KEY, convert_unit,
+    convert_units_bulk, get_conversion_graph, invalidate_conversion_graph,
+)
+from .pricing import get_price_book, get_unit_price
+from .production import build_production_plan, get_bill_of_materials, get_production_items
+from .reporting import rebuild_daily_sales_rollup, settle_profit_distributions
+from .views import CourierDeliverySyncView
+
+
+class BulkDeliveryViewTests(TestCase):
+    """OrderAdmin.bulk_delivery_view: toplu teslimat onayı ve sorgu bütçesi"""
+
+    # Oturum, yetki, form ve toplu yazma sorguları dahil; teslimat sayısından bağımsızdır
+    QUERY_BUDGET = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        dealer_user = User.objects.create_user('bayi')
+        cls.dealer = Dealer.objects.create(user=dealer_user, name="Test Bayi", tax_id="1234567890")
+
+        cls.koli = Unit.objects.create(name="Koli")
+        cls.adet = Unit.objects.create(name="Adet")
+        UnitConversion.objects.create(source_unit=cls.koli, target_unit=cls.adet, conversion_factor=Decimal('12'))
+
+        cls.product = Product.objects.create(name="Poğaça", selling_price=Decimal('1.50'), unit=cls.adet)
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def create_orders(self, count, items_per_order=3):
+        orders = []
+        for _ in range(count):
+            order = Order(dealer=self.dealer, status='TESLİMATTA')
+            order.save()
+            for _ in range(items_per_order):
+                item = OrderItem.objects.create(
+                    order=order,
+                    product=self.product,
+                    ordered_quantity=Decimal('2'),
+                    ordered_unit=self.koli,
+                    unit_price_at_order=Decimal('1.50'),
+                )
+                Delivery.objects.create(order_item=item)
+            orders.append(order)
+        return orders
+
+    def post_bulk_delivery(self, orders):
+        url = reverse('admin:management_order_bulk_delivery') + '?orders=' + ','.join(str(o.pk) for o in orders)
+        data = {
+            f'delivered_quantity_{pk}': '2'
+            for pk in Delivery.objects.filter(order_item__order__in=orders).values_list('pk', flat=True)
+        }
+        # Çevrim tablosu her istekte aynı koşullarda (soğuk) başlasın
+        invalidate_conversion_graph()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_deliveries(self):
+        _, small_count = self.post_bulk_delivery(self.create_orders(2))
+        response, large_count = self.post_bulk_delivery(self.create_orders(30))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, self.QUERY_BUDGET)
+
+    def test_confirms_deliveries_posts_debts_and_completes_orders(self):
+        orders = self.create_orders(3)
+        self.post_bulk_delivery(orders)
+
+        self.assertFalse(Delivery.objects.filter(order_item__order__in=orders, is_confirmed=False).exists())
+        self.assertEqual(
+            set(Order.objects.filter(pk__in=[o.pk for o in orders]).values_list('status', flat=True)),
+            {'CONFIRMED'}
+        )
+
+        # 2 Koli = 24 Adet x 1.50 TL = 36.00 TL (teslimat başına)
+        debts = Transaction.objects.filter(source_model='Delivery', transaction_type='DEBT')
+        self.assertEqual(debts.count(), 9)
+        self.assertEqual(set(debts.values_list('amount', flat=True)), {Decimal('36.00')})
+
+        self.dealer.refresh_from_db()
+        self.assertEqual(self.dealer.balance, Decimal('324.00'))
+
+    def test_repeated_entry_replaces_previous_debts(self):
+        orders = self.create_orders(1)
+        self.post_bulk_delivery(orders)
+        Delivery.objects.filter(order_item__order__in=orders).update(is_confirmed=False)
+        self.post_bulk_delivery(orders)
+
+        self.assertEqual(Transaction.objects.filter(source_model='Delivery').count(), 3)
+        self.dealer.refresh_from_db()
+        self.assertEqual(self.dealer.balance, Decimal('108.00'))
+
+
+class CourierDeliveryUpdateViewTests(TestCase):
+    """courier_delivery_update: düzenlenen ve eklenen satırlar çevrimli tutarla borçlandırılır"""
+
+    # Oturum, yetki, toplu okuma ve toplu yazma sorguları dahil; satır sayısından bağımsızdır
+    QUERY_BUDGET = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi'), name="Bayi", tax_id="1234567890")
+
+        cls.koli = Unit.objects.create(name="Koli")
+        cls.adet = Unit.objects.create(name="Adet")
+        UnitConversion.objects.create(source_unit=cls.koli, target_unit=cls.adet, conversion_factor=Decimal('12'))
+
+        cls.product = Product.objects.create(name="Poğaça", selling_price=Decimal('1.50'), unit=cls.adet)
+        cls.other_product = Product.objects.create(name="Simit", selling_price=Decimal('2.00'), unit=cls.adet)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin_user)
+
+    def create_order(self, item_count=1):
+        order = Order(dealer=self.dealer, status='TESLİMATTA')
+        order.save()
+        for _ in range(item_count):
+            OrderItem.objects.create(
+                order=order, product=self.product, ordered_quantity=Decimal('1'),
+                ordered_unit=self.adet, unit_price_at_order=Decimal('1.50'),
+            )
+        return order
+
+    def post_update(self, order, added_rows=()):
+        data = {}
+        for item_id in order.items.values_list('pk', flat=True):
+            data[f'delivered_qty_{item_id}'] = '2'
+            data[f'delivered_unit_{item_id}'] = str(self.koli.pk)
+        data['add_product_id[]'] = [str(product.pk) for product, _, _ in added_rows]
+        data['add_qty[]'] = [qty for _, qty, _ in added_rows]
+        data['add_unit_id[]'] = [str(unit.pk) for _, _, unit in added_rows]
+        # Çevrim tablosu ve fiyat listesi her istekte aynı koşullarda (soğuk) başlasın
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('management:courier_delivery_update', args=[order.pk]), data)
+        return response, len(queries)
+
+    def test_edited_and_added_lines_post_converted_debts(self):
+        order = self.create_order()
+        response, _ = self.post_update(order, added_rows=[(self.other_product, '1,5', self.koli)])
+
+        self.assertRedirects(response, reverse('management:courier_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'CONFIRMED')
+
+        # 2 Koli = 24 Adet x 1.50 TL = 36.00 TL; eklenen 1,5 Koli = 18 Adet x 2.00 TL = 36.00 TL
+        items = OrderItem.objects.filter(order=order).order_by('pk')
+        self.assertEqual(
+            [(i.product_id, i.delivered_quantity, i.line_total_amount) for i in items],
+            [(self.product.pk, Decimal('2'), Decimal('36.00')), (self.other_product.pk, Decimal('1.5'), Decimal('36.00'))]
+        )
+        debts = Transaction.objects.filter(source_model='Order', source_id=order.pk, transaction_type='DEBT')
+        self.assertEqual(sorted(debts.values_list('amount', flat=True)), [Decimal('36.00'), Decimal('36.00')])
+
+        self.dealer.refresh_from_db()
+        self.assertEqual(self.dealer.balance, Decimal('72.00'))
+
+    def test_repeated_update_replaces_previous_debts(self):
+        order = self.create_order()
+        self.post_update(order)
+        self.post_update(order)
+
+        self.assertEqual(Transaction.objects.filter(source_model='Order', source_id=order.pk).count(), 1)
+        self.dealer.refresh_from_db()
+        self.assertEqual(self.dealer.balance, Decimal('36.00'))
+
+    def test_query_count_does_not_grow_with_lines(self):
+        _, small_count = self.post_update(self.create_order(2), added_rows=[(self.other_product, '1', self.adet)])
+        response, large_count = self.post_update(
+            self.create_order(20), added_rows=[(self.other_product, '1', self.adet)] * 10
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, self.QUERY_BUDGET)
+
+
+class DealerBalanceTests(TestCase):
+    """Dealer.balance: her cari hareket yolundan sonra hareket geçmişiyle aynı kalmalı"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi1'), name="Bayi 1", tax_id="1111111111")
+        cls.other_dealer = Dealer.objects.create(user=User.objects.create_user('bayi2'), name="Bayi 2", tax_id="2222222222")
+
+    def assertBalancesMatchLedger(self):
+        for dealer in (self.dealer, self.other_dealer):
+            dealer.refresh_from_db()
+            self.assertEqual(dealer.balance, dealer.calculate_balance_from_ledger())
+
+    def test_create_update_and_delete(self):
+        debt = Transaction.objects.create(dealer=self.dealer, transaction_type='DEBT', amount=Decimal('100.00'))
+        Transaction.objects.create(dealer=self.dealer, transaction_type='COLLECTION', amount=Decimal('30.00'))
+        self.dealer.refresh_from_db()
+        self.assertEqual(self.dealer.balance, Decimal('70.00'))
+
+        # Tutar ve bayi değişikliği: eski bayiden düşülür, yenisine eklenir
+        debt.amount = Decimal('120.00')
+        debt.dealer = self.other_dealer
+        debt.save()
+        self.assertBalancesMatchLedger()
+        self.assertEqual(self.other_dealer.balance, Decimal('120.00'))
+
+        debt.delete()
+        self.assertBalancesMatchLedger()
+        self.assertEqual(self.other_dealer.balance, Decimal('0.00'))
+
+    def test_bulk_create_queryset_update_and_delete(self):
+        Transaction.objects.bulk_create([
+            Transaction(dealer=self.dealer, transaction_type='DEBT', amount=Decimal('50.00')),
+            Transaction(dealer=self.dealer, transaction_type='RETURN', amount=Decimal('5.00')),
+            Transaction(dealer=self.other_dealer, transaction_type='DEBT', amount=Decimal('20.00')),
+        ])
+        self.assertBalancesMatchLedger()
+        self.assertEqual(self.dealer.balance, Decimal('45.00'))
+
+        Transaction.objects.filter(transaction_type='DEBT').update(amount=Decimal('10.00'))
+        self.assertBalancesMatchLedger()
+        self.assertEqual(self.dealer.balance, Decimal('5.00'))
+
+        Transaction.objects.filter(dealer=self.other_dealer).update(dealer=self.dealer)
+        self.assertBalancesMatchLedger()
+        self.assertEqual(self.other_dealer.balance, Decimal('0.00'))
+
+        Transaction.objects.filter(transaction_type='RETURN').delete()
+        self.assertBalancesMatchLedger()
+        self.assertEqual(self.dealer.balance, Decimal('20.00'))
+
+    def test_dealer_save_does_not_overwrite_balance(self):
+        dealer = Dealer.objects.get(pk=self.dealer.pk)
+        Transaction.objects.create(dealer=self.dealer, transaction_type='DEBT', amount=Decimal('7.00'))
+
+        dealer.name = "Bayi 1 (Yeni Unvan)"
+        dealer.save()
+
+        dealer.refresh_from_db()
+        self.assertEqual(dealer.name, "Bayi 1 (Yeni Unvan)")
+        self.assertEqual(dealer.balance, Decimal('7.00'))
+
+
+class PartnerBalanceTests(TestCase):
+    """Partner toplamları: yalnızca kâr dağıtımıyla değişir, ortak kaydı geri yazmaz"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.partner = Partner.objects.create(name="Ortak 1", distribution_ratio=Decimal('60.00'))
+        cls.other_partner = Partner.objects.create(name="Ortak 2", distribution_ratio=Decimal('40.00'))
+        ProfitDistribution.objects.create(month=1, year=2026, total_net_profit=Decimal('1000.00'))
+        ProfitDistribution.objects.create(month=2, year=2026, total_net_profit=Decimal('-50.00'))
+
+    def test_partner_save_after_settlement_keeps_settled_amounts(self):
+        # Dağıtımdan önce yüklenmiş (eskimiş toplamlı) ortak kaydı, ör. admin formu
+        stale_partner = Partner.objects.get(pk=self.partner.pk)
+
+        settled, losses = settle_profit_distributions(ProfitDistribution.objects.all())
+        self.assertEqual([(d.month, d.year) for d in settled], [(1, 2026)])
+        self.assertEqual([(d.month, d.year) for d in losses], [(2, 2026)])
+
+        stale_partner.distribution_ratio = Decimal('55.00')
+        stale_partner.save()
+
+        self.partner.refresh_from_db()
+        self.assertEqual(self.partner.distribution_ratio, Decimal('55.00'))
+        self.assertEqual(self.partner.current_receivable, Decimal('600.00'))
+        self.assertEqual(self.partner.total_profit_received, Decimal('600.00'))
+        entry = PartnerLedgerEntry.objects.get(partner=self.partner)
+        self.assertEqual(entry.balance_after, self.partner.current_receivable)
+
+        self.other_partner.refresh_from_db()
+        self.assertEqual(self.other_partner.current_receivable, Decimal('400.00'))
+
+
+class InvoiceSequenceTests(TestCase):
+    """InvoiceSequence.allocate: ardışık, boşluksuz ve mevcut faturalarla uyumlu numaralar"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi'), name="Bayi", tax_id="1234567890")
+
+    def create_invoice(self, invoice_number):
+        order = Order(dealer=self.dealer)
+        order.save()
+        return Invoice.objects.create(
+            order=order, dealer=self.dealer, invoice_number=invoice_number, final_amount=Decimal('0.00')
+        )
+
+    def test_first_number_matches_legacy_numbering(self):
+        self.assertEqual(InvoiceSequence.next_number(), '100000')
+
+    def test_new_series_continues_after_existing_invoices(self):
+        self.create_invoice('100041')
+        self.assertEqual(InvoiceSequence.allocate(3), ['100042', '100043', '100044'])
+
+    def test_blocks_are_consecutive_and_do_not_overlap(self):
+        first = InvoiceSequence.allocate(5)
+        second = InvoiceSequence.allocate(2)
+
+        self.assertEqual(first, ['100000', '100001', '100002', '100003', '100004'])
+        self.assertEqual(second, ['100005', '100006'])
+        self.assertEqual(InvoiceSequence.allocate(0), [])
+
+    def test_rolled_back_numbers_are_reused(self):
+        InvoiceSequence.allocate(2)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            InvoiceSequence.allocate(10)
+            raise RuntimeError("faturalama iptal")
+
+        self.assertEqual(InvoiceSequence.next_number(), '100002')
+
+    @override_settings(INVOICE_NUMBER_SERIES_PER_YEAR=True)
+    def test_yearly_series(self):
+        series = InvoiceSequence.series_for()
+        self.create_invoice(f'{series}000007')
+
+        self.assertEqual(InvoiceSequence.allocate(2), [f'{series}000008', f'{series}000009'])
+
+
+class CourierDeliveryBatchConfirmTests(TestCase):
+    """/api/courier/deliveries/confirm/: tekrar gönderilen anahtar ikinci kez uygulanmamalı"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.courier_user = User.objects.create_user('kurye')
+        cls.courier = Courier.objects.create(user=cls.courier_user, name="Kurye")
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi'), name="Bayi", tax_id="1234567890")
+        cls.adet = Unit.objects.create(name="Adet")
+        cls.product = Product.objects.create(name="Simit", selling_price=Decimal('1.50'), unit=cls.adet)
+
+        order = Order(dealer=cls.dealer, status='TESLİMATTA')
+        order.save()
+        cls.deliveries = []
+        for _ in range(2):
+            item = OrderItem.objects.create(
+                order=order, product=cls.product, ordered_quantity=Decimal('4'),
+                ordered_unit=cls.adet, unit_price_at_order=Decimal('1.50'),
+            )
+            cls.deliveries.append(Delivery.objects.create(order_item=item, courier=cls.courier))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.courier_user)
+
+    def confirm(self, *confirmations):
+        return self.client.post(
+            reverse('management:courier_delivery_batch_confirm'),
+            {'confirmations': [
+                {'key': key, 'delivery_id': delivery.pk, 'delivered_quantity': quantity}
+                for key, delivery, quantity in confirmations
+            ]},
+            format='json',
+        )
+
+    def test_replayed_key_does_not_post_second_debt(self):
+        first = self.confirm(('anahtar-1', self.deliveries[0], 4))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['results'][0]['status'], 'APPLIED')
+        self.assertFalse(first.data['results'][0]['replayed'])
+
+        # Kuyruk yeniden gönderildi: ilk onay tekrar, ikincisi yeni (farklı miktar yok sayılır)
+        second = self.confirm(('anahtar-1', self.deliveries[0], 3), ('anahtar-2', self.deliveries[1], 4))
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(
+            [(r['key'], r['status'], r['replayed']) for r in second.data['results']],
+            [('anahtar-1', 'APPLIED', True), ('anahtar-2', 'APPLIED', False)]
+        )
+
+        debts = Transaction.objects.filter(source_model='Delivery', transaction_type='DEBT')
+        self.assertEqual(debts.count(), 2)
+        self.assertEqual(set(debts.values_list('amount', flat=True)), {Decimal('6.00')})
+        self.assertEqual(Delivery.objects.get(pk=self.deliveries[0].pk).delivered_quantity, 4)
+
+        self.dealer.refresh_from_db()
+        self.assertEqual(self.dealer.balance, Decimal('12.00'))
+
+    def test_confirmed_delivery_with_new_key_is_rejected(self):
+        self.confirm(('anahtar-1', self.deliveries[0], 4))
+        response = self.confirm(('anahtar-3', self.deliveries[0], 4))
+
+        self.assertEqual(response.data['results'][0]['status'], 'REJECTED')
+        self.assertEqual(Transaction.objects.filter(source_model='Delivery').count(), 1)
+
+
+class OrderBatchCreateTests(TestCase):
+    """/api/orders/batch/: siparişler birlikte doğrulanır, hata varsa hiçbiri oluşturulmaz"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dealer_user = User.objects.create_user('bayi')
+        cls.dealer = Dealer.objects.create(user=cls.dealer_user, name="Bayi", tax_id="1234567890")
+
+        cls.koli = Unit.objects.create(name="Koli")
+        cls.adet = Unit.objects.create(name="Adet")
+        cls.kg = Unit.objects.create(name="Kg")
+        UnitConversion.objects.create(source_unit=cls.koli, target_unit=cls.adet, conversion_factor=Decimal('12'))
+
+        cls.products = [
+            Product.objects.create(name=f"Ürün {i}", selling_price=Decimal('2.00'), unit=cls.adet)
+            for i in range(20)
+        ]
+        cls.inactive_product = Product.objects.create(
+            name="Satışta Değil", selling_price=Decimal('2.00'), unit=cls.adet, is_active=False
+        )
+        DealerPrice.objects.create(dealer=cls.dealer, product=cls.products[0], price=Decimal('1.25'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.dealer_user)
+        # Fiyat listesi, ayar ve çevrim önbellekleri her testte soğuk başlasın
+        cache.clear()
+        OrderConfiguration._solo_cache = None
+        invalidate_conversion_graph()
+
+    def post_orders(self, orders):
+        return self.client.post(reverse('management:api_order_batch_create'), {'orders': orders}, format='json')
+
+    def test_creates_orders_with_dealer_prices(self):
+        response = self.post_orders([
+            {'items': [
+                {'product': self.products[0].pk, 'ordered_quantity': '2', 'ordered_unit': self.koli.pk},
+                {'product': self.products[1].pk, 'ordered_quantity': '3'},
+            ]},
+            {'items': [{'product': self.products[1].pk, 'ordered_quantity': '1.5'}]},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        # 2 Koli = 24 Adet x 1.25 (bayi fiyatı) + 3 Adet x 2.00
+        self.assertEqual(
+            [(o['estimated_total'], o['item_count'], o['status']) for o in response.data['orders']],
+            [('36.00', 2, 'NEW'), ('3.00', 1, 'NEW')]
+        )
+
+        item = OrderItem.objects.get(product=self.products[1], order_id=response.data['orders'][0]['id'])
+        self.assertEqual(item.ordered_unit, self.adet)
+        self.assertEqual(item.unit_price_at_order, Decimal('2.00'))
+        self.assertEqual(Order.objects.filter(dealer=self.dealer).count(), 2)
+
+    def test_query_count_does_not_grow_with_items(self):
+        def post(item_count):
+            self.setUp()
+            items = [{'product': p.pk, 'ordered_quantity': '1'} for p in self.products[:item_count]]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_orders([{'items': items}])
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        self.assertEqual(post(2), post(20))
+
+    def test_invalid_item_rejects_whole_batch(self):
+        response = self.post_orders([
+            {'items': [{'product': self.products[0].pk, 'ordered_quantity': '1'}]},
+            {'items': [
+                {'product': self.inactive_product.pk, 'ordered_quantity': '1'},
+                {'product': self.products[1].pk, 'ordered_quantity': '1'},
+                {'product': self.products[2].pk, 'ordered_quantity': '1', 'ordered_unit': self.kg.pk},
+            ]},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['orders']
+        self.assertEqual(errors[0], {})
+        item_errors = errors[1]['items']
+        self.assertIn('product', item_errors[0])
+        self.assertEqual(item_errors[1], {})
+        self.assertIn('ordered_unit', item_errors[2])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_rejected_when_ordering_is_closed(self):
+        OrderConfiguration.objects.create(is_ordering_enabled=False)
+        # Test geri alındığında sinyal gelmez; süreç içi önbellekte kapalı ayar kalmasın
+        self.addCleanup(setattr, OrderConfiguration, '_solo_cache', None)
+
+        response = self.post_orders([{'items': [{'product': self.products[0].pk, 'ordered_quantity': '1'}]}])
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Order.objects.exists())
+
+
+class ProductionPlanTests(TestCase):
+    """build_production_plan: hatalı (döngüsel) reçete yalnızca kendi ürününü etkiler"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi'), name="Bayi", tax_id="1234567890")
+        adet = Unit.objects.create(name="Adet")
+        kg = Unit.objects.create(name="Kg")
+
+        bread = Product.objects.create(name="Ekmek", selling_price=Decimal('5.00'), unit=adet)
+        dough = Product.objects.create(name="Hamur", selling_price=Decimal('0.00'), unit=kg)
+        sauce_a = Product.objects.create(name="Sos A", selling_price=Decimal('1.00'), unit=kg)
+        sauce_b = Product.objects.create(name="Sos B", selling_price=Decimal('1.00'), unit=kg)
+
+        flour = RawMaterial.objects.create(name="Un", unit=kg, cost_price=Decimal('10.00'))
+        dough_material = RawMaterial.objects.create(name="Hamur (ara)", unit=kg, intermediate_product=dough)
+        sauce_a_material = RawMaterial.objects.create(name="Sos A (ara)", unit=kg, intermediate_product=sauce_a)
+        sauce_b_material = RawMaterial.objects.create(name="Sos B (ara)", unit=kg, intermediate_product=sauce_b)
+
+        for product, material, quantity in (
+            (bread, dough_material, '0.5'),
+            (dough, flour, '1'),
+            # Sos A -> Sos B -> Sos A: döngüsel reçete
+            (sauce_a, sauce_b_material, '1'),
+            (sauce_b, sauce_a_material, '1'),
+        ):
+            RecipeItem.objects.create(
+                recipe=Recipe.objects.get_or_create(product=product)[0],
+                raw_material=material,
+                quantity_required=Decimal(quantity),
+            )
+
+        cls.bread_order = cls.create_order(bread, adet, '10')
+        cls.sauce_order = cls.create_order(sauce_a, kg, '1')
+
+    @classmethod
+    def create_order(cls, product, unit, quantity):
+        order = Order(dealer=cls.dealer)
+        order.save()
+        OrderItem.objects.create(
+            order=order, product=product, ordered_quantity=Decimal(quantity),
+            ordered_unit=unit, unit_price_at_order=product.selling_price,
+        )
+        return order
+
+    def setUp(self):
+        cache.clear()
+        invalidate_conversion_graph()
+        # Ürün ağacı tüm reçeteler için bir kez kurulur; döngü uyarı olarak loglanır
+        with self.assertLogs('management.production', 'WARNING') as logs:
+            get_bill_of_materials()
+        self.assertIn("Sos A -> Sos B -> Sos A", logs.output[0])
+
+    def plan(self, *orders):
+        return build_production_plan(get_production_items([order.pk for order in orders]))
+
+    def test_cyclic_recipe_does_not_block_other_products(self):
+        plan = self.plan(self.bread_order)
+
+        self.assertEqual(plan['invalid_recipes'], [])
+        self.assertEqual(
+            [(row['raw_material__name'], row['needed_amount']) for row in plan['material_totals']],
+            [("Un", Decimal('5.0000'))]
+        )
+
+    def test_cyclic_recipe_is_listed_for_its_product(self):
+        plan = self.plan(self.bread_order, self.sauce_order)
+
+        self.assertEqual(plan['invalid_recipes'], ["Sos A"])
+        self.assertEqual(plan['missing_recipes'], [])
+        self.assertEqual(
+            [(row['raw_material__name'], row['needed_amount']) for row in plan['material_totals']],
+            [("Un", Decimal('5.0000'))]
+        )
+
+
+class OrderSaveTests(TestCase):
+    """Order.save: kilitli durum korunur, kayıt tek doğrulama ve tek yazma ile yapılır"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi'), name="Bayi", tax_id="1234567890")
+        order = Order(dealer=cls.dealer, is_locked=True)
+        order.save()
+        cls.order_id = order.pk
+
+    def setUp(self):
+        cache.clear()
+        OrderConfiguration._solo_cache = None
+
+    def assertStoredStatus(self, status):
+        self.assertEqual(Order.objects.get(pk=self.order_id).status, status)
+
+    def test_locked_order_keeps_status_on_save(self):
+        order = Order.objects.get(pk=self.order_id)
+        order.status = 'PREP'
+        order.save()
+
+        self.assertEqual(order.status, 'NEW')
+        self.assertStoredStatus('NEW')
+
+    def test_locked_order_keeps_status_on_update_fields_save(self):
+        order = Order.objects.get(pk=self.order_id)
+        order.status = 'PREP'
+        order.save(update_fields=['status'])
+
+        self.assertStoredStatus('NEW')
+
+    def test_locked_status_is_read_when_not_loaded(self):
+        # pk'si elle verilmiş (veritabanından yüklenmemiş) nesnede kilit kontrolü durumu sorgular
+        order = Order(pk=self.order_id, dealer=self.dealer, is_locked=True, status='PREP')
+        order.save(update_fields=['status'])
+
+        self.assertStoredStatus('NEW')
+
+    def test_ignore_lock_overrides_lock(self):
+        order = Order.objects.get(pk=self.order_id)
+        order.status = 'PREP'
+        order.save(ignore_lock=True)
+        self.assertStoredStatus('PREP')
+
+        order.status = 'TESLİMATTA'
+        order.save(update_fields=['status'], ignore_lock=True)
+        self.assertStoredStatus('TESLİMATTA')
+
+    def test_objects_create_inserts_one_row(self):
+        with CaptureQueriesContext(connection) as queries:
+            order = Order.objects.create(dealer=self.dealer)
+
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO "management_order"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Order.objects.filter(dealer=self.dealer).count(), 2)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'NEW')
+
+    def test_status_change_is_a_single_query(self):
+        order = Order.objects.get(pk=self.order_id)
+        order.is_locked = False
+        order.save()
+
+        order.status = 'PREP'
+        with self.assertNumQueries(1):
+            order.save()
+        order.status = 'TESLİMATTA'
+        with self.assertNumQueries(1):
+            order.save(update_fields=['status'])
+        self.assertStoredStatus('TESLİMATTA')
+
+
+class SendToDeliveryActionTests(TestCase):
+    """send_to_delivery: kalemler toplu sevk edilir, kilitli siparişler ayrı bildirilir"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi'), name="Bayi", tax_id="1234567890")
+        cls.adet = Unit.objects.create(name="Adet")
+        cls.product = Product.objects.create(name="Poğaça", selling_price=Decimal('1.50'), unit=cls.adet)
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def create_order(self, is_locked=False):
+        order = Order(dealer=self.dealer, is_locked=is_locked)
+        order.save()
+        OrderItem.objects.create(
+            order=order, product=self.product, ordered_quantity=Decimal('2'), ordered_unit=self.adet,
+            unit_price_at_order=Decimal('1.50'),
+        )
+        return order
+
+    def test_locked_orders_are_reported_separately(self):
+        open_order = self.create_order()
+        locked_order = self.create_order(is_locked=True)
+
+        response = self.client.post(
+            reverse('admin:management_order_changelist'),
+            {'action': 'send_to_delivery', '_selected_action': [open_order.pk, locked_order.pk]},
+            follow=True,
+        )
+
+        self.assertEqual(Delivery.objects.filter(order_item__order__in=[open_order, locked_order]).count(), 2)
+        self.assertEqual(Order.objects.get(pk=open_order.pk).status, 'TESLİMATTA')
+        self.assertEqual(Order.objects.get(pk=locked_order.pk).status, 'NEW')
+
+        messages = [str(m) for m in response.context['messages']]
+        self.assertIn(f"1 sipariş teslimata gönderildi (sipariş: kalem) — #{open_order.pk}: 1", messages)
+        self.assertIn(
+            f"Kilitli siparişlerin kalemleri sevkiyata hazırlandı ancak durumları değiştirilmedi: #{locked_order.pk}",
+            messages,
+        )
+
+
+class DailySalesRollupTests(TestCase):
+    """DailySalesRollup: sinyallerle artımlı güncellenen satırlar yeniden oluşturmayla aynı olmalı"""
+
+    DAY_1 = date(2026, 3, 10)
+    DAY_2 = date(2026, 3, 11)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi1'), name="Bayi 1", tax_id="1111111111")
+        cls.other_dealer = Dealer.objects.create(user=User.objects.create_user('bayi2'), name="Bayi 2", tax_id="2222222222")
+
+        cls.koli = Unit.objects.create(name="Koli")
+        cls.adet = Unit.objects.create(name="Adet")
+        UnitConversion.objects.create(source_unit=cls.koli, target_unit=cls.adet, conversion_factor=Decimal('12'))
+
+        cls.product = Product.objects.create(
+            name="Poğaça", selling_price=Decimal('1.50'), unit=cls.adet, vat_rate=Decimal('10.00')
+        )
+        cls.other_product = Product.objects.create(
+            name="Simit", selling_price=Decimal('2.00'), unit=cls.adet, vat_rate=Decimal('1.00')
+        )
+
+    def setUp(self):
+        invalidate_conversion_graph()
+
+    def create_order(self, day, dealer=None, items=((None, '2', 'koli'),)):
+        """items: (ürün, miktar, birim) üçlüleri; ürün verilmezse Poğaça."""
+        with self.captureOnCommitCallbacks(execute=True):
+            order_date = timezone.make_aware(datetime(day.year, day.month, day.day, 12))
+            order = Order(dealer=dealer or self.dealer, order_date=order_date)
+            order.save()
+            for product, quantity, unit in items:
+                product = product or self.product
+                item = OrderItem.objects.create(
+                    order=order, product=product, ordered_quantity=Decimal(quantity),
+                    ordered_unit=getattr(self, unit), unit_price_at_order=product.selling_price,
+                )
+                Delivery.objects.create(order_item=item)
+        return order
+
+    def confirm_deliveries(self, order, delivered_quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            for delivery in Delivery.objects.filter(order_item__order=order):
+                delivery.delivered_quantity = delivered_quantity
+                delivery.is_confirmed = True
+                delivery.save()
+
+    def invoice(self, order, invoice_number):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            create_invoice_lines([create_invoice_for_order(order, invoice_number)])
+
+    def rollup_rows(self):
+        return {
+            (row.date, row.dealer_id, row.product_id): (
+                row.quantity, row.delivered_quantity, row.net_amount, row.vat_amount,
+                row.invoiced_net_amount, row.invoiced_vat_amount,
+            )
+            for row in DailySalesRollup.objects.all()
+        }
+
+    def test_new_order_creates_rows(self):
+        self.create_order(self.DAY_1)
+
+        # 2 Koli = 24 Adet x 1.50 TL = 36.00 TL (KDV %10 dahil)
+        self.assertEqual(self.rollup_rows(), {
+            (self.DAY_1, self.dealer.pk, self.product.pk): (
+                Decimal('24.0000'), Decimal('0.0000'), Decimal('32.73'), Decimal('3.27'),
+                Decimal('0.00'), Decimal('0.00'),
+            ),
+        })
+
+    def test_moved_order_refreshes_old_and_new_keys(self):
+        order = self.create_order(self.DAY_1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.get(pk=order.pk)
+            order.order_date = order.order_date.replace(day=self.DAY_2.day)
+            order.dealer = self.other_dealer
+            order.save()
+
+        self.assertEqual(list(self.rollup_rows()), [(self.DAY_2, self.other_dealer.pk, self.product.pk)])
+
+    def test_cancelled_order_rows_are_removed(self):
+        order = self.create_order(self.DAY_1)
+        self.create_order(self.DAY_1, items=((self.other_product, '3', 'adet'),))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'CANCELLED'
+            order.save()
+
+        self.assertEqual(list(self.rollup_rows()), [(self.DAY_1, self.dealer.pk, self.other_product.pk)])
+
+    def test_delivery_and_invoice_update_rows(self):
+        order = self.create_order(self.DAY_1)
+
+        self.confirm_deliveries(order, 1)
+        row = DailySalesRollup.objects.get()
+        # 1 Koli teslim edildi = 12 Adet
+        self.assertEqual(row.delivered_quantity, Decimal('12.0000'))
+        self.assertEqual(row.invoiced_net_amount, Decimal('0.00'))
+
+        self.invoice(order, '100000')
+        # Satırlar silinip yeniden yazılır
+        row = DailySalesRollup.objects.get()
+        # 1 Koli = 12 x 1.50 = 18.00 TL KDV dahil -> 16.36 + 1.64
+        self.assertEqual((row.invoiced_net_amount, row.invoiced_vat_amount), (Decimal('16.36'), Decimal('1.64')))
+
+    def test_incremental_rows_match_rebuild(self):
+        first = self.create_order(self.DAY_1, items=((None, '2', 'koli'), (self.other_product, '5', 'adet')))
+        self.create_order(self.DAY_1, items=((None, '7', 'adet'),))
+        third = self.create_order(self.DAY_2, dealer=self.other_dealer)
+        cancelled = self.create_order(self.DAY_2, items=((self.other_product, '4', 'adet'),))
+
+        self.confirm_deliveries(first, 2)
+        self.confirm_deliveries(third, 1)
+        self.invoice(first, '100000')
+        with self.captureOnCommitCallbacks(execute=True):
+            cancelled.status = 'CANCELLED'
+            cancelled.save()
+
+        incremental = self.rollup_rows()
+        self.assertEqual(len(incremental), 3)
+
+        rebuild_daily_sales_rollup()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+
+class PriceBookTests(TestCase):
+    """get_price_book: bayi fiyatı, yoksa satış fiyatı; değişiklikler önbelleği geçersiz kılar"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi1'), name="Bayi 1", tax_id="1111111111")
+        cls.other_dealer = Dealer.objects.create(user=User.objects.create_user('bayi2'), name="Bayi 2", tax_id="2222222222")
+        adet = Unit.objects.create(name="Adet")
+        cls.product = Product.objects.create(name="Poğaça", selling_price=Decimal('1.50'), unit=adet)
+        cls.other_product = Product.objects.create(name="Simit", selling_price=Decimal('2.00'), unit=adet)
+        cls.dealer_price = DealerPrice.objects.create(dealer=cls.dealer, product=cls.product, price=Decimal('1.25'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_dealer_price_then_selling_price(self):
+        fallback = {self.product.pk: Decimal('1.50'), self.other_product.pk: Decimal('2.00')}
+        self.assertEqual(get_price_book(self.dealer), {**fallback, self.product.pk: Decimal('1.25')})
+        self.assertEqual(get_price_book(self.other_dealer.pk), fallback)
+        self.assertEqual(get_price_book(), fallback)
+
+        self.assertEqual(get_unit_price(self.product, self.dealer), Decimal('1.25'))
+        self.assertEqual(get_unit_price(self.product, self.other_dealer), Decimal('1.50'))
+
+    def test_price_book_is_cached(self):
+        get_price_book(self.dealer)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_price_book(self.dealer)[self.product.pk], Decimal('1.25'))
+
+    def test_dealer_price_change_invalidates_only_that_dealer(self):
+        get_price_book(self.dealer)
+        get_price_book(self.other_dealer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dealer_price.price = Decimal('1.10')
+            self.dealer_price.save()
+
+        self.assertEqual(get_price_book(self.dealer)[self.product.pk], Decimal('1.10'))
+        with self.assertNumQueries(0):
+            get_price_book(self.other_dealer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dealer_price.delete()
+        self.assertEqual(get_price_book(self.dealer)[self.product.pk], Decimal('1.50'))
+
+    def test_product_change_invalidates_every_dealer(self):
+        get_price_book(self.dealer)
+        get_price_book(self.other_dealer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_product.selling_price = Decimal('2.25')
+            self.other_product.save()
+            new_product = Product.objects.create(name="Açma", selling_price=Decimal('3.00'), unit=self.product.unit)
+
+        for dealer in (self.dealer, self.other_dealer):
+            price_book = get_price_book(dealer)
+            self.assertEqual(price_book[self.other_product.pk], Decimal('2.25'))
+            self.assertEqual(price_book[new_product.pk], Decimal('3.00'))
+        self.assertEqual(get_price_book(self.dealer)[self.product.pk], Decimal('1.25'))
+
+
+class CourierDeliverySyncTests(TestCase):
+    """/api/courier/deliveries/sync/: imleç, örtüşme penceresi, silinme izleri ve sayfalama"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.courier_user = User.objects.create_user('kurye')
+        cls.courier = Courier.objects.create(user=cls.courier_user, name="Kurye")
+        cls.other_courier = Courier.objects.create(user=User.objects.create_user('kurye2'), name="Kurye 2")
+        cls.dealer = Dealer.objects.create(user=User.objects.create_user('bayi'), name="Bayi", tax_id="1234567890")
+        adet = Unit.objects.create(name="Adet")
+        product = Product.objects.create(name="Simit", selling_price=Decimal('1.50'), unit=adet)
+
+        cls.deliveries = []
+        for is_confirmed in (False, False, False, True):
+            order = Order(dealer=cls.dealer, status='TESLİMATTA')
+            order.save()
+            item = OrderItem.objects.create(
+                order=order, product=product, ordered_quantity=Decimal('4'),
+                ordered_unit=adet, unit_price_at_order=Decimal('1.50'),
+            )
+            cls.deliveries.append(
+                Delivery.objects.create(order_item=item, courier=cls.courier, is_confirmed=is_confirmed)
+            )
+        cls.pending_ids = [delivery.pk for delivery in cls.deliveries[:3]]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.courier_user)
+        # Tüm satırlar bir saat önce değişmiş olsun
+        self.now = timezone.now()
+        Delivery.objects.update(updated_at=self.now - timedelta(hours=1))
+        Order.objects.update(updated_at=self.now - timedelta(hours=1))
+
+    def sync(self, cursor=None, **params):
+        if cursor is not None:
+            params['cursor'] = cursor
+        response = self.client.get(reverse('management:courier_delivery_sync'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def cursor_at(self, moment):
+        return CourierDeliverySyncView.encode_cursor(moment, 0)
+
+    def changed_ids(self, data):
+        return [row[data['fields'].index('id')] for row in data['changed']]
+
+    def touch(self, delivery, moment):
+        Delivery.objects.filter(pk=delivery.pk).update(updated_at=moment)
+
+    def test_first_sync_returns_pending_deliveries(self):
+        data = self.sync()
+
+        self.assertTrue(data['reset'])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(sorted(self.changed_ids(data)), self.pending_ids)
+
+    def test_incremental_sync_returns_changed_deliveries_and_orders(self):
+        cursor = self.cursor_at(self.now - timedelta(minutes=10))
+        self.assertEqual(self.sync(cursor)['changed'], [])
+
+        self.touch(self.deliveries[0], self.now)
+        # Siparişi değişen teslimat da (durum vb.) gönderilir
+        Order.objects.filter(pk=self.deliveries[1].order_item.order_id).update(updated_at=self.now)
+
+        data = self.sync(cursor)
+        self.assertFalse(data['reset'])
+        self.assertEqual(sorted(self.changed_ids(data)), self.pending_ids[:2])
+
+    def test_overlap_window_resends_late_commits(self):
+        cursor_time = self.now - timedelta(minutes=10)
+        # İmleçten önce damgalanıp sonra commit edilen değişiklik pencere içinde tekrar gelir
+        self.touch(self.deliveries[0], cursor_time - timedelta(seconds=10))
+        self.touch(self.deliveries[1], cursor_time - timedelta(seconds=60))
+
+        with override_settings(COURIER_SYNC_OVERLAP_SECONDS=30):
+            data = self.sync(self.cursor_at(cursor_time))
+        self.assertEqual(self.changed_ids(data), [self.deliveries[0].pk])
+
+    def test_removed_deliveries_are_reported(self):
+        cursor = self.cursor_at(self.now - timedelta(minutes=10))
+        reassigned = Delivery.objects.get(pk=self.deliveries[0].pk)
+        reassigned.courier = self.other_courier
+        reassigned.save()
+        Delivery.objects.get(pk=self.deliveries[1].pk).delete()
+
+        data = self.sync(cursor)
+        self.assertEqual(data['removed'], self.pending_ids[:2])
+        self.assertEqual(data['changed'], [])
+        # İmleç son izin zamanına ilerler
+        self.assertGreater(CourierDeliverySyncView.decode_cursor(data['cursor'])[0], self.now - timedelta(minutes=10))
+
+    def test_pages_continue_from_exact_position(self):
+        # Aynı damgalı satırlar sayfalar arasında ID ile bölünür
+        for delivery in self.deliveries[:3]:
+            self.touch(delivery, self.now)
+
+        first = self.sync(self.cursor_at(self.now - timedelta(minutes=10)), limit=2)
+        self.assertTrue(first['has_more'])
+        self.assertTrue(CourierDeliverySyncView.decode_cursor(first['cursor'])[2])
+
+        second = self.sync(first['cursor'], limit=2)
+        self.assertFalse(second['has_more'])
+        self.assertEqual(self.changed_ids(first) + self.changed_ids(second), self.pending_ids)
+
+    def test_expired_cursor_resets(self):
+        data = self.sync(self.cursor_at(self.now - timedelta(days=365)))
+
+        self.assertTrue(data['reset'])
+        self.assertEqual(sorted(self.changed_ids(data)), self.pending_ids)
+
+
+class CourierDashboardTests(TestCase):
+    """courier_dashboard: yetki kontrolü ETag (304) cevabından önce yapılır"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.courier_user = User.objects.create_user('kurye')
+        cls.courier_user.groups.add(Group.objects.create(name='Kurye'))
+        cls.other_user = User.objects.create_user('bayi')
+
+    def get_dashboard(self, user, etag=None):
+        self.client.force_login(user)
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(reverse('management:courier_dashboard'), headers=headers)
+
+    def test_unchanged_dashboard_returns_not_modified(self):
+        response = self.get_dashboard(self.courier_user)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.get_dashboard(self.courier_user, response['ETag']).status_code, 304)
+
+    def test_non_courier_is_redirected_before_etag_check(self):
+        etag = self.get_dashboard(self.courier_user)['ETag']
+        # Kurye olmayan kullanıcının ETag'i de kullanıcıya özeldir; yine de önce yönlendirilmeli
+        etag = etag.replace(f'"{self.courier_user.pk}-', f'"{self.other_user.pk}-')
+
+        response = self.get_dashboard(self.other_user, etag)
+        self.assertRedirects(response, reverse('management:landing_page'), fetch_redirect_response=False)
+
+
+class UnitConversionGraphTests(SimpleTestCase):
+    """UnitConversionGraph: doğrudan, ters ve çok adımlı çarpanlar (veritabanı kullanılmaz)"""
+
+    KOLI, ADET, KG, GR, LITRE = 1, 2, 3, 4, 5
+
+    def setUp(self):
+        self.graph = UnitConversionGraph([
+            (self.KOLI, self.ADET, Decimal('12')),
+            (self.ADET, self.KG, Decimal('0.25')),
+            (self.KG, self.GR, Decimal('1000')),
+        ])
+
+    def test_direct_and_multi_hop_factors(self):
+        self.assertEqual(self.graph.factor(self.KOLI, self.ADET), 12)
+        self.assertEqual(self.graph.factor(self.KOLI, self.KG), 3)
+        self.assertEqual(self.graph.factor(self.KOLI, self.GR), 3000)
+        self.assertEqual(self.graph.factor(self.GR, self.GR), 1)
+
+    def test_inverse_factors_are_exact(self):
+        self.assertEqual(self.graph.factor(self.ADET, self.KOLI), Fraction(1, 12))
+        self.assertEqual(self.graph.factor(self.GR, self.KOLI), Fraction(1, 3000))
+        # Ara adımlarda yuvarlama yok: 1/12 x 12 tam olarak 1
+        self.assertEqual(self.graph.factor(self.ADET, self.KOLI) * self.graph.factor(self.KOLI, self.ADET), 1)
+
+    def test_unknown_or_unconnected_units_return_none(self):
+        self.assertIsNone(self.graph.factor(self.KOLI, self.LITRE))
+        self.assertIsNone(self.graph.factor(99, self.KOLI))
+
+    def test_defined_direction_wins_over_inverse(self):
+        graph = UnitConversionGraph([(self.KOLI, self.ADET, Decimal('12')), (self.ADET, self.KOLI, Decimal('0.1'))])
+
+        self.assertEqual(graph.factor(self.ADET, self.KOLI), Fraction(1, 10))
+        self.assertEqual(graph.factor(self.KOLI, self.ADET), 12)
+
+    def test_zero_factor_keeps_quantity(self):
+        graph = UnitConversionGraph([(self.KOLI, self.ADET, Decimal('0'))])
+
+        self.assertEqual(graph.factor(self.KOLI, self.ADET), 1)
+        self.assertEqual(graph.factor(self.ADET, self.KOLI), 1)
+
+
+class ConversionGraphCacheTests(TestCase):
+    """get_conversion_graph: süreç içi graf, paylaşılan sürüm değişince ve en geç MAX_AGE'de yenilenir"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.koli = Unit.objects.create(name="Koli")
+        cls.adet = Unit.objects.create(name="Adet")
+        cls.gram = Unit.objects.create(name="Gr")
+        cls.conversion = UnitConversion.objects.create(
+            source_unit=cls.koli, target_unit=cls.adet, conversion_factor=Decimal('12')
+        )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_conversion_graph()
+
+    def test_converts_with_loaded_graph(self):
+        self.assertEqual(convert_unit(Decimal('2'), self.koli, self.adet), Decimal('24'))
+        self.assertEqual(convert_unit(Decimal('6'), self.adet.pk, self.koli.pk), Decimal('0.5'))
+        # Çevrim yolu yoksa 0
+        self.assertEqual(convert_unit(Decimal('6'), self.adet, self.gram), Decimal('0.00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                convert_units_bulk([(1, self.koli.pk, self.adet.pk), (3, self.adet.pk, self.adet.pk)]),
+                [Decimal('12'), Decimal('3')]
+            )
+
+    def test_change_in_this_process_is_seen_immediately(self):
+        get_conversion_graph()
+        self.conversion.conversion_factor = Decimal('10')
+        self.conversion.save()
+
+        self.assertEqual(convert_unit(1, self.koli, self.adet), Decimal('10'))
+
+    @override_settings(UNIT_CONVERSION_CHECK_INTERVAL=0)
+    def test_shared_version_change_reloads_graph(self):
+        get_conversion_graph()
+        # Başka bir süreçteki değişiklik: sinyal bu süreçte çalışmaz, yalnızca paylaşılan sürüm değişir
+        UnitConversion.objects.filter(pk=self.conversion.pk).update(conversion_factor=Decimal('6'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_conversion_graph().factor(self.koli.pk, self.adet.pk), 12)
+
+        bump_cache_version(CONVERSION_GRAPH_VERSION_KEY)
+        self.assertEqual(get_conversion_graph().factor(self.koli.pk, self.adet.pk), 6)
+
+    def test_version_is_checked_only_after_interval(self):
+        get_conversion_graph()
+        UnitConversion.objects.filter(pk=self.conversion.pk).update(conversion_factor=Decimal('6'))
+        bump_cache_version(CONVERSION_GRAPH_VERSION_KEY)
+
+        with override_settings(UNIT_CONVERSION_CHECK_INTERVAL=60):
+            self.assertEqual(get_conversion_graph().factor(self.koli.pk, self.adet.pk), 12)
+        with override_settings(UNIT_CONVERSION_CHECK_INTERVAL=0):
+            self.assertEqual(get_conversion_graph().factor(self.koli.pk, self.adet.pk), 6)
+
+    @override_settings(UNIT_CONVERSION_CHECK_INTERVAL=0, UNIT_CONVERSION_MAX_AGE=0)
+    def test_graph_is_reloaded_after_max_age_without_version_change(self):
+        get_conversion_graph()
+        UnitConversion.objects.filter(pk=self.conversion.pk).update(conversion_factor=Decimal('6'))
+
+        self.assertEqual(get_conversion_graph().factor(self.koli.pk, self.adet.pk), 6)
@@ -27,6 +27,9 @@ urlpatterns = [
     path('order/<int:order_id>/', views.order_detail_view, name='order_detail'),
     path('cari-hareketler/', views.dealer_transactions_view, name='dealer_transactions'),
     path('order/edit/<int:pk>/', views.edit_order_view, name='order_edit'),
+    path('api/courier/deliveries/sync/', views.CourierDeliverySyncView.as_view(), name='courier_delivery_sync'),
+    path('api/courier/deliveries/confirm/', views.CourierDeliveryBatchConfirmView.as_view(), name='courier_delivery_batch_confirm'),
+    path('api/orders/batch/', views.OrderBatchCreateView.as_view(), name='api_order_batch_create'),
 
 ]
     # ... (Diğer url patternleriniz buraya gelecek) ...
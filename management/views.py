@@ -2,30 +2,39 @@
 # management/views.py
 # ----------------------------------------------------------------------    
 import json
-from decimal import Decimal, InvalidOperation
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from io import BytesIO
+import datetime
+from functools import wraps
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from django.http import JsonResponse, HttpResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, F, DecimalField
+from django.db.models import Sum, F, DecimalField, Exists, OuterRef, Max, Count, Q
+from django.db.models.functions import Greatest
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework import generics, views, status, viewsets, serializers
 from rest_framework.response import Response
-from django.db import transaction
+from django.db import transaction, IntegrityError
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.conf import settings
+from .pdf import render_pdf
+from .production import build_production_plan, get_production_items, production_plan_to_csv
+from .pricing import get_price_book, get_unit_price
+from .reporting import schedule_sales_rollup_update
 from .permissions import IsDealerUser, IsCourierUser, IsAdminUser, OrderPermissions
 from .models import (
     OrderConfiguration, Product, RecipeItem, Dealer, Delivery, OrderItem, Order,
     Expense, Collection, Partner, ProfitDistribution, Transaction,
-    Courier, DealerPrice, Unit, UnitConversion
+    Courier, DealerPrice, Unit, UnitConversion, DeliveryTombstone, DeliveryConfirmationReceipt,
+    convert_units_bulk
 )
 from .serializers import (
     ProductSerializer, DealerSerializer, OrderCreateSerializer,
     OrderSerializer, DeliveryConfirmationSerializer, ExpenseSerializer,
     CollectionSerializer, PartnerSerializer, ProfitDistributionSerializer,
-    ProfitCalculationSerializer, CourierDeliveryListSerializer, TransactionSerializer
+    ProfitCalculationSerializer, CourierDeliveryListSerializer, TransactionSerializer,
+    DeliveryBatchConfirmationSerializer, OrderBatchCreateSerializer
 )
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages # Kullanıcıya hata mesajı göstermek için
@@ -61,9 +70,10 @@ def new_order(request):
 
                     # Sipariş Kalemlerini Kaydet
                     items = formset.save(commit=False)
+                    price_book = get_price_book(order.dealer_id)
                     for item in items:
                         item.order = order
-                        item.unit_price_at_order = item.product.selling_price
+                        item.unit_price_at_order = get_unit_price(item.product, price_book=price_book)
                         item.save()
 
                         # KRİTİK: Stoktan Düşme İşlemi
@@ -209,12 +219,12 @@ def edit_order_view(request, pk):
                     items = formset.save(commit=False)
                     
                     total_amount = Decimal('0.00')
+                    price_book = get_price_book(dealer)
                     for item in items:
                         # Bayiye özel fiyatı tekrar kontrol et
-                        dealer_price_obj = DealerPrice.objects.filter(dealer=dealer, product=item.product).first()
-                        item.unit_price_at_order = dealer_price_obj.price if dealer_price_obj else item.product.selling_price
+                        item.unit_price_at_order = get_unit_price(item.product, price_book=price_book)
                         item.save()
-                        total_amount += item.get_converted_total()
+                        total_amount += item.line_total_amount
 
                     # 3. Silinmesi istenen satırları temizle
                     for deleted_obj in formset.deleted_objects:
@@ -268,6 +278,7 @@ def dealer_order_update(request, pk):
                 # 2. Yeni eklenen satırları işle
                 new_p_ids = request.POST.getlist('new_product_id[]')
                 new_qtys = request.POST.getlist('new_qty[]')
+                price_book = get_price_book(order.dealer_id)
                 
                 for p_id, qty in zip(new_p_ids, new_qtys):
                     if p_id and qty:
@@ -277,7 +288,7 @@ def dealer_order_update(request, pk):
                             product=product,
                             ordered_quantity=Decimal(qty.replace(',', '.')),
                             ordered_unit=product.unit,
-                            unit_price_at_order=product.selling_price
+                            unit_price_at_order=get_unit_price(product, price_book=price_book)
                         )
 
                 messages.success(request, "Siparişiniz başarıyla güncellendi.")
@@ -322,14 +333,12 @@ def new_order_view(request):
                     items = formset.save(commit=False)
 
                     total_order_amount = Decimal('0.00')
+                    price_book = get_price_book(dealer)
 
                     for item in items:
-                        dealer_price_obj = DealerPrice.objects.filter(dealer=dealer, product=item.product).first()
-                        price_to_use = dealer_price_obj.price if dealer_price_obj else item.product.selling_price
-
-                        item.unit_price_at_order = price_to_use
+                        item.unit_price_at_order = get_unit_price(item.product, price_book=price_book)
                         item.save()
-                        total_order_amount += item.get_converted_total()
+                        total_order_amount += item.line_total_amount
 
                         product = item.product
                         if hasattr(product, 'current_stock'):
@@ -369,9 +378,8 @@ def get_product_info(request):
         # Mevcut kullanıcıya bağlı bayiyi alıyoruz
         dealer = Dealer.objects.get(user=request.user)
 
-        # Bayi fiyatı var mı kontrol et, yoksa ürünün genel satış fiyatını al
-        dealer_price_obj = DealerPrice.objects.filter(dealer=dealer, product=product).first()
-        price = dealer_price_obj.price if dealer_price_obj else product.selling_price
+        # Bayi fiyatı var mı kontrol et, yoksa ürünün genel satış fiyatını al (önbellekteki fiyat listesinden)
+        price = get_unit_price(product, dealer)
 
         return JsonResponse({
             'price': float(price),
@@ -523,11 +531,8 @@ class DeliveryConfirmationView(views.APIView):
 
         if total_debt_amount > 0:
 
-            # 1. CARİ HESAP BAKİYESİNİ GÜNCELLE (Borç Ekle)
-            dealer.current_balance += total_debt_amount
-            dealer.save(update_fields=['current_balance'])
-
-            # 2. TRANSACTION (HAREKET) KAYDI OLUŞTUR (Borç)
+            # TRANSACTION (HAREKET) KAYDI OLUŞTUR (Borç)
+            # Bayi bakiyesi (Dealer.balance) Transaction kaydıyla birlikte otomatik güncellenir.
             Transaction.objects.create(
                 dealer=dealer,
                 transaction_type='DEBT',
@@ -538,6 +543,180 @@ class DeliveryConfirmationView(views.APIView):
 
         return True
 
+    @transaction.atomic
+    def create_debt_transactions_bulk(self, deliveries):
+        """
+        HELPER METOT: Birden fazla teslimat için borç kayıtlarını toplu oluşturur.
+        Önceki borç kayıtları tek DELETE ile silinir, yenileri tek bulk_create ile yazılır
+        (bayi bakiyeleri her iki işlemde de toplu güncellenir). Teslim edilen miktar,
+        fiyatın birimi olan ürün ana birimine çevrilir.
+
+        deliveries: order_item__order ve order_item__product önceden çekilmiş Delivery listesi
+        """
+        deliveries = list(deliveries)
+        if not deliveries:
+            return []
+
+        Transaction.objects.filter(
+            source_model='Delivery',
+            source_id__in=[delivery.id for delivery in deliveries],
+            transaction_type='DEBT'
+        ).delete()
+
+        base_quantities = convert_units_bulk([
+            (
+                Decimal(str(delivery.delivered_quantity)),
+                delivery.order_item.ordered_unit_id,
+                delivery.order_item.product.unit_id,
+            )
+            for delivery in deliveries
+        ])
+
+        transactions = []
+        for delivery, base_quantity in zip(deliveries, base_quantities):
+            unit_price = delivery.order_item.unit_price_at_order or Decimal('0')
+            total_debt_amount = (base_quantity * unit_price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+            if total_debt_amount > 0:
+                transactions.append(Transaction(
+                    dealer_id=delivery.order_item.order.dealer_id,
+                    transaction_type='DEBT',
+                    amount=total_debt_amount,
+                    source_id=delivery.id,
+                    source_model='Delivery'
+                ))
+
+        return Transaction.objects.bulk_create(transactions)
+
+
+def complete_fully_delivered_orders(order_ids):
+    """
+    Bekleyen (onaylanmamış) teslimatı kalmayan siparişleri tek UPDATE ile CONFIRMED yapar.
+    Kilitli siparişlerin durumu değiştirilmez. Güncellenen sipariş sayısını döndürür.
+    """
+    pending_deliveries = Delivery.objects.filter(
+        order_item__order=OuterRef('pk'),
+        is_confirmed=False
+    )
+    return Order.objects.filter(
+        id__in=order_ids,
+        is_locked=False
+    ).exclude(
+        status='CONFIRMED'
+    ).filter(
+        ~Exists(pending_deliveries)
+    ).update(status='CONFIRMED', updated_at=timezone.now())
+
+
+class CourierDeliveryBatchConfirmView(views.APIView):
+    """
+    Kuryenin çevrimdışı kuyruğundaki teslimat onaylarını tek istekte uygular.
+
+    POST /api/courier/deliveries/confirm/
+    {"confirmations": [{"key": "<uuid>", "delivery_id": 12, "delivered_quantity": 3, "delivered_at": "..."}]}
+
+    Tüm onaylar tek transaction içinde toplu yazılır (teslimatlar, borç kayıtları, sipariş durumları).
+    Her işlemin sonucu anahtarıyla saklanır; aynı anahtar tekrar gelirse yeniden uygulanmaz,
+    ilk sonuç 'replayed': true ile döndürülür. Yanıt, gönderim sırasıyla işlem bazında sonuçlardır.
+    """
+    permission_classes = [IsCourierUser]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            courier = Courier.objects.get(user=request.user)
+        except Courier.DoesNotExist:
+            raise PermissionDenied("Bu işlem için yetkili Kurye profili bulunamadı.")
+
+        serializer = DeliveryBatchConfirmationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        confirmations = serializer.validated_data['confirmations']
+
+        try:
+            results = self.apply_confirmations(courier, confirmations)
+        except IntegrityError:
+            # Aynı anahtarlar eşzamanlı bir istekte (aynı kuyruğun tekrarı) yazıldı:
+            # ikinci denemede kayıtlı sonuçlar döndürülür
+            results = self.apply_confirmations(courier, confirmations)
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @transaction.atomic
+    def apply_confirmations(self, courier, confirmations):
+        receipts = {
+            receipt.idempotency_key: receipt
+            for receipt in DeliveryConfirmationReceipt.objects.filter(
+                courier=courier,
+                idempotency_key__in={item['key'] for item in confirmations}
+            )
+        }
+
+        # Onaylanacak teslimatlar kilitlenir; aynı teslimat iki istekte birden onaylanamaz
+        deliveries = Delivery.objects.select_for_update(of=('self',)).select_related(
+            'order_item__order', 'order_item__product'
+        ).in_bulk({item['delivery_id'] for item in confirmations if item['key'] not in receipts})
+
+        now = timezone.now()
+        new_receipts = {}
+        confirmed_deliveries = []
+        results = []
+
+        for item in confirmations:
+            receipt = receipts.get(item['key']) or new_receipts.get(item['key'])
+            if receipt is not None:
+                results.append(self.receipt_result(receipt, replayed=True))
+                continue
+
+            delivery = deliveries.get(item['delivery_id'])
+            result_status, detail = 'REJECTED', ''
+            if delivery is None:
+                detail = "Teslimat bulunamadı."
+            elif delivery.courier_id != courier.id:
+                detail = "Bu teslimat size atanmamış."
+            elif delivery.is_confirmed:
+                detail = "Teslimat zaten onaylanmış."
+            else:
+                result_status = 'APPLIED'
+                delivery.delivered_quantity = item['delivered_quantity']
+                delivery.is_confirmed = True
+                # İleri tarihli cihaz saati kabul edilmez
+                delivery.delivery_date = min(item.get('delivered_at') or now, now)
+                delivery.updated_at = now
+                confirmed_deliveries.append(delivery)
+
+            receipt = DeliveryConfirmationReceipt(
+                courier=courier,
+                idempotency_key=item['key'],
+                delivery_id=item['delivery_id'],
+                delivered_quantity=item['delivered_quantity'],
+                status=result_status,
+                detail=detail,
+            )
+            new_receipts[item['key']] = receipt
+            results.append(self.receipt_result(receipt, replayed=False))
+
+        if confirmed_deliveries:
+            Delivery.objects.bulk_update(
+                confirmed_deliveries, ['delivered_quantity', 'is_confirmed', 'delivery_date', 'updated_at']
+            )
+            DeliveryConfirmationView().create_debt_transactions_bulk(confirmed_deliveries)
+            order_ids = {delivery.order_item.order_id for delivery in confirmed_deliveries}
+            complete_fully_delivered_orders(order_ids)
+            # bulk_update sinyal göndermez; satış özeti açıkça güncellenir
+            schedule_sales_rollup_update(order_ids=order_ids)
+
+        DeliveryConfirmationReceipt.objects.bulk_create(new_receipts.values())
+        return results
+
+    @staticmethod
+    def receipt_result(receipt, replayed):
+        return {
+            'key': receipt.idempotency_key,
+            'delivery_id': receipt.delivery_id,
+            'status': receipt.status,
+            'detail': receipt.detail,
+            'replayed': replayed,
+        }
+
 # ----------------------------------------------------------------------
 # 3. KURYEYE AİT TESLİMAT LİSTESİ API'SI
 # ----------------------------------------------------------------------
@@ -563,6 +742,157 @@ class CourierDeliveryListView(generics.ListAPIView):
         except Courier.DoesNotExist:
             raise PermissionDenied("Bu kullanıcı bir Kurye profiline sahip değil.")
 
+
+class CourierDeliverySyncView(views.APIView):
+    """
+    Kurye uygulaması için artımlı senkronizasyon.
+
+    İmleçsiz ilk istek bekleyen teslimatların tamamını, sonraki istekler yalnızca imleçten sonra
+    değişen satırları (teslimat veya siparişi güncellenenler) ve kuryenin listesinden çıkan
+    teslimatların ID'lerini (removed) döndürür. Satırlar alan adları tekrar edilmeden dizi olarak
+    gönderilir; sütun sırası 'fields' içindedir. has_more true ise dönen imleçle hemen tekrar istenir.
+
+    Geç commit edilen değişiklikler kaçmasın diye her senkronizasyon imleçten
+    COURIER_SYNC_OVERLAP_SECONDS öncesinden başlar: daha önce gönderilmiş satırlar tekrar
+    gelebilir, istemci satırları id ile günceller. Sayfa devam imleçleri (has_more) tam konumdan
+    devam eder.
+
+    GET /api/courier/deliveries/sync/?cursor=<imleç>&limit=<satır>
+    """
+    permission_classes = [IsCourierUser]
+
+    DEFAULT_LIMIT = 200
+    MAX_LIMIT = 500
+
+    # İstemciye dönen sütunlar (values_list alanı -> kısa ad)
+    SYNC_FIELDS = (
+        ('id', 'id'),
+        ('order_item__order_id', 'order_id'),
+        ('order_item__order__status', 'order_status'),
+        ('order_item__order__dealer__name', 'dealer_name'),
+        ('order_item__product__name', 'product_name'),
+        ('order_item__ordered_quantity', 'ordered_quantity'),
+        ('order_item__ordered_unit__name', 'unit'),
+        ('delivered_quantity', 'delivered_quantity'),
+        ('is_confirmed', 'is_confirmed'),
+    )
+
+    # İmleç: mikro saniye cinsinden zaman damgası + son satır ID'si ("<mikrosaniye>-<id>");
+    # sayfa devam imleçlerinin sonunda "-p" bulunur (örtüşme penceresi uygulanmaz)
+    EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    PAGE_SUFFIX = 'p'
+
+    @classmethod
+    def encode_cursor(cls, changed_at, last_id, is_page=False):
+        cursor = f"{(changed_at - cls.EPOCH) // datetime.timedelta(microseconds=1)}-{last_id}"
+        return f"{cursor}-{cls.PAGE_SUFFIX}" if is_page else cursor
+
+    @classmethod
+    def decode_cursor(cls, cursor):
+        try:
+            parts = cursor.split('-')
+            is_page = len(parts) == 3 and parts[2] == cls.PAGE_SUFFIX
+            if len(parts) != 2 and not is_page:
+                raise ValueError(cursor)
+            return cls.EPOCH + datetime.timedelta(microseconds=int(parts[0])), int(parts[1]), is_page
+        except (ValueError, OverflowError, OSError):
+            raise ValidationError({'cursor': "Geçersiz senkronizasyon imleci."})
+
+    @staticmethod
+    def filter_changed_since(deliveries, since, inclusive=False):
+        """
+        Teslimatı veya siparişi since'ten sonra değişenler. Greatest(...) ya da iki tabloya yayılan
+        OR koşuluyla süzmek kuryenin tüm teslimat geçmişini tarar; bu yüzden değişenler iki ayrı
+        (delivery.updated_at ve order.updated_at indeksli) sorgunun birleşimi (UNION) olarak bulunur.
+        """
+        lookup = 'gte' if inclusive else 'gt'
+        changed_ids = deliveries.filter(**{f'updated_at__{lookup}': since}).values('pk').union(
+            deliveries.filter(**{f'order_item__order__updated_at__{lookup}': since}).values('pk')
+        )
+        return Delivery.objects.filter(pk__in=changed_ids)
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': "Geçersiz sayı."})
+        return max(1, min(limit, self.MAX_LIMIT))
+
+    def get(self, request):
+        try:
+            courier = Courier.objects.get(user=request.user)
+        except Courier.DoesNotExist:
+            raise PermissionDenied("Bu kullanıcı bir Kurye profiline sahip değil.")
+
+        limit = self.get_limit()
+        started_at = timezone.now()
+        cursor = request.query_params.get('cursor')
+        since, last_id, is_page = self.decode_cursor(cursor) if cursor else (None, 0, False)
+
+        # İzler temizlenmiş olabilir: çok eski imleçle gelen istemci listeyi baştan kurar
+        retention = datetime.timedelta(days=getattr(settings, 'COURIER_SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+        reset = since is not None and since < started_at - retention
+        if reset:
+            since, last_id = None, 0
+
+        deliveries = Delivery.objects.filter(courier=courier)
+        if since is None:
+            # İlk senkronizasyon: geçmiş (onaylanmış) teslimatlar indirilmez
+            deliveries = deliveries.filter(is_confirmed=False)
+            removed_since = None
+        elif is_page:
+            removed_since = since
+            deliveries = self.filter_changed_since(deliveries, since, inclusive=True)
+        else:
+            # Damgası imleçten önce olup sonradan commit edilen değişiklikler için örtüşme penceresi
+            removed_since = since - datetime.timedelta(seconds=getattr(settings, 'COURIER_SYNC_OVERLAP_SECONDS', 30))
+            deliveries = self.filter_changed_since(deliveries, removed_since)
+
+        # Sıralama ve imleç için değişiklik zamanı; yalnızca süzülen satırlar için hesaplanır
+        deliveries = deliveries.annotate(changed_at=Greatest('updated_at', 'order_item__order__updated_at'))
+        if is_page:
+            # Aynı damgalı satırlar ID ile kalınan yerden devam eder
+            deliveries = deliveries.filter(Q(changed_at__gt=since) | Q(changed_at=since, id__gt=last_id))
+
+        value_fields = [field for field, _ in self.SYNC_FIELDS]
+        rows = list(
+            deliveries.order_by('changed_at', 'id').values_list(*value_fields, 'changed_at')[:limit + 1]
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        removed = []
+        if removed_since is not None:
+            tombstones = DeliveryTombstone.objects.filter(courier=courier, removed_at__gt=removed_since)
+            if has_more:
+                # Sonraki sayfanın imleci son satırdır; sonrasındaki izler o sayfayla gelir
+                tombstones = tombstones.filter(removed_at__lte=rows[-1][-1])
+            tombstones = list(tombstones.values_list('delivery_id', 'removed_at'))
+            removed = sorted({delivery_id for delivery_id, _ in tombstones})
+        else:
+            tombstones = []
+
+        # Yeni imleç: döndürülen son satır ya da son iz (hangisi daha yeniyse)
+        if rows:
+            next_at, next_id = rows[-1][-1], rows[-1][0]
+        elif since is not None:
+            next_at, next_id = since, last_id
+        else:
+            next_at, next_id = started_at, 0
+        if not has_more and tombstones:
+            newest_removed_at = max(removed_at for _, removed_at in tombstones)
+            if newest_removed_at > next_at:
+                next_at, next_id = newest_removed_at, 0
+
+        return Response({
+            'cursor': self.encode_cursor(next_at, next_id, is_page=has_more),
+            'has_more': has_more,
+            'reset': reset or since is None,
+            'fields': [name for _, name in self.SYNC_FIELDS],
+            'changed': [list(row[:-1]) for row in rows],
+            'removed': removed,
+        })
+
 # ----------------------------------------------------------------------
 # 4. BAYİ CARİ HAREKET LİSTESİ API'SI
 # ----------------------------------------------------------------------
@@ -615,15 +945,44 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Order.objects.none()
 
     def perform_create(self, serializer):
-        try:
-            dealer = self.request.user.dealer_profile
-        except Dealer.DoesNotExist:
-            raise PermissionDenied("Sipariş oluşturmak için bir Bayi profili gereklidir.")
+        serializer.save(dealer=get_ordering_dealer(self.request.user))
+
+
+class OrderBatchCreateView(views.APIView):
+    """
+    Bayinin birden çok siparişini tek istekte oluşturur.
+
+    POST /api/orders/batch/
+    {"orders": [{"order_date": "...", "items": [{"product": 3, "ordered_quantity": "2.5", "ordered_unit": 1}]}]}
+
+    Ürünler ve birimler tüm siparişler için tek sorguda doğrulanır; herhangi bir siparişte hata
+    varsa hiçbiri oluşturulmaz. Siparişler ve kalemleri tek transaction içinde toplu yazılır.
+    """
+    permission_classes = [IsDealerUser]
+
+    def post(self, request, *args, **kwargs):
+        dealer = get_ordering_dealer(request.user)
+
+        serializer = OrderBatchCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        orders = serializer.save(dealer=dealer)
 
-        if OrderConfiguration.objects.exists() and not OrderConfiguration.objects.first().is_ordering_enabled:
-            raise PermissionDenied("Şu anda yeni sipariş alımı kapalıdır.")
+        return Response(
+            {'orders': OrderCreateSerializer(orders, many=True).data},
+            status=status.HTTP_201_CREATED
+        )
 
-        serializer.save(dealer=dealer)
+
+def get_ordering_dealer(user):
+    """Sipariş verebilecek bayiyi döndürür; profil yoksa veya sipariş alımı kapalıysa PermissionDenied."""
+    try:
+        dealer = user.dealer_profile
+    except Dealer.DoesNotExist:
+        raise PermissionDenied("Sipariş oluşturmak için bir Bayi profili gereklidir.")
+
+    if not OrderConfiguration.get_solo().is_ordering_enabled:
+        raise PermissionDenied("Şu anda yeni sipariş alımı kapalıdır.")
+    return dealer
 
 # ----------------------------------------------------------------------
 # 6. DİĞER API VIEW'LAR
@@ -634,67 +993,58 @@ class ProductListView(generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [IsDealerUser]
 
-def render_to_pdf(template_src, context_dict={}):
-    template = get_template(template_src)
-    html  = template.render(context_dict)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result, encoding='utf-8')
+def render_to_pdf(document, context_dict={}, filename="siparis.pdf"):
+    """
+    Belgeyi settings.PDF_ENGINES'te seçili motorla (xhtml2pdf, reportlab, wkhtmltopdf)
+    PDF'e çevirip indirme yanıtı olarak döndürür.
+    """
+    try:
+        pdf_content = render_pdf(document, context_dict)
+    except Exception:
+        return HttpResponse('PDF oluşturulurken hata oluştu', status=400)
 
-    options = {
-        'encoding': "UTF-8",
-        'quiet': '',
-    }
-    response = HttpResponse(content_type='application/pdf')
+    response = HttpResponse(pdf_content, content_type='application/pdf')
     # İndirme ismini belirle
-    response['Content-Disposition'] = 'attachment; filename="siparis.pdf"'
-    # PDF oluştur
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-       return HttpResponse('PDF oluşturulurken hata oluştu', status=400)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 # PDF View
 def order_pdf(request, pk):
     # .prefetch_related('items') ekleyerek ürünlerin gelmesini garanti ediyoruz
     # Not: Eğer related_name farklıysa 'items' yerine onu yazın
-    order = get_object_or_404(Order.objects.prefetch_related('items'), pk=pk)
+    order = get_object_or_404(Order.objects.prefetch_related('items__product', 'items__ordered_unit'), pk=pk)
     context = {'order': order}
-    return render_to_pdf('management/order_pdf_template.html', context)
+    return render_to_pdf('order', context)
 
 @login_required
 def production_pdf_view(request):
+    """
+    Üretim listesi: ?ids=1,2,3 ile seçili siparişler veya ?start=YYYY-AA-GG&end=YYYY-AA-GG ile
+    tarih aralığındaki siparişler. ?format=csv ile Excel uyumlu CSV indirilir.
+    """
     ids = request.GET.get('ids')
-    if not ids:
-        return HttpResponse("Lütfen sipariş seçin.")
-
-    id_list = ids.split(',')
-
-    # 1. Ürün Bazlı Toplamlar (Aynı kalıyor)
-    product_totals = OrderItem.objects.filter(order_id__in=id_list).values(
-        'product__name'
-    ).annotate(
-        total_quantity=Sum('ordered_quantity')
-    ).order_by('product__name')
-
-    # 2. Hammadde Bazlı Toplamlar (HATA VEREN KISIM BURASIYDI)
-    material_totals = RecipeItem.objects.filter(
-        recipe__product__orderitem__order_id__in=id_list
-    ).values(
-        'raw_material__name'
-    ).annotate(
-        needed_amount=Sum(F('quantity_required') * F('recipe__product__orderitem__ordered_quantity')),
-        # Birimi burada 'birim' ismiyle basitçe tanımlıyoruz:
-        birim=F('raw_material__unit__name')
-    ).order_by('raw_material__name')
+    try:
+        id_list = [int(pk) for pk in ids.split(',') if pk] if ids else None
+        start_date = parse_date(request.GET.get('start', ''))
+        end_date = parse_date(request.GET.get('end', ''))
+    except ValueError:
+        return HttpResponse("Geçersiz sipariş numarası veya tarih.", status=400)
 
-    context = {
-        'product_totals': product_totals,
-        'material_totals': material_totals,
-        'date': timezone.now(),
-        'order_count': len(id_list)
-    }
+    if not id_list and not (start_date or end_date):
+        return HttpResponse("Lütfen sipariş veya tarih aralığı seçin.")
 
-    return render_to_pdf('management/production_list_pdf.html', context)
+    # Ürün, ara ürün ve hammadde toplamları birim çevrimleriyle (bkz. management/production.py).
+    # Reçetesi eksik veya hatalı (döngüsel) ürünler planda ayrıca listelenir.
+    plan = build_production_plan(get_production_items(id_list, start_date, end_date))
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(production_plan_to_csv(plan), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="uretim_listesi.csv"'
+        return response
+
+    context = dict(plan, date=timezone.now(), start_date=start_date, end_date=end_date)
+
+    return render_to_pdf('production_list', context, filename="uretim_listesi.pdf")
 
 
 
@@ -704,16 +1054,43 @@ def courier_delivery_update(request, pk):
         raise PermissionDenied("Erişim yetkiniz yok.")
 
     # prefetch_related ile performansı artırıyoruz
-    order = get_object_or_404(Order.objects.prefetch_related('items__product', 'items__ordered_unit'), pk=pk)
+    order = get_object_or_404(
+        Order.objects.select_related('dealer').prefetch_related('items__product__unit', 'items__ordered_unit'),
+        pk=pk
+    )
 
     if request.method == 'POST':
         try:
             with transaction.atomic():
+                items = list(order.items.all())
+
+                new_p_ids = request.POST.getlist('add_product_id[]')
+                new_qtys = request.POST.getlist('add_qty[]')
+                new_u_ids = request.POST.getlist('add_unit_id[]')
+                new_rows = [
+                    (p_id, q_raw, u_id)
+                    for p_id, q_raw, u_id in zip(new_p_ids, new_qtys, new_u_ids)
+                    if p_id and q_raw
+                ]
+
+                # Formda geçen birim ve ürünler tek sorguda okunur (satır başına get() yapılmaz)
+                unit_ids = {request.POST.get(f'delivered_unit_{item.id}') for item in items}
+                unit_ids.update(u_id for _, _, u_id in new_rows)
+                unit_map = Unit.objects.in_bulk({int(u_id) for u_id in unit_ids if u_id})
+                product_map = Product.objects.select_related('unit').in_bulk({int(p_id) for p_id, _, _ in new_rows})
+
+                def get_unit(unit_id):
+                    unit = unit_map.get(int(unit_id)) if unit_id else None
+                    if unit is None:
+                        raise Unit.DoesNotExist(f"Birim bulunamadı: {unit_id}")
+                    return unit
+
                 # 1. Eski finansal kayıtları sil (Mükerrer bakiye olmaması için)
                 Transaction.objects.filter(source_id=order.id, source_model='Order').delete()
 
                 # 2. Mevcut Satırları Güncelle
-                for item in order.items.all():
+                updated_items = []
+                for item in items:
                     qty_val = request.POST.get(f'delivered_qty_{item.id}')
                     unit_id = request.POST.get(f'delivered_unit_{item.id}')
                     
@@ -726,50 +1103,56 @@ def courier_delivery_update(request, pk):
                         item.ordered_quantity = new_qty # Fatura için eşitleme
                         
                         if unit_id:
-                            item.ordered_unit = Unit.objects.get(id=unit_id)
-                        
-                        # --- BİRİM ÇEVRİMLİ FİYAT HESABI ---
-                        # Eğer KG dışında bir birimse, fiyatı o birime göre ayarla
-                        # factor = convert_unit(Decimal('1.0'), item.product.unit, item.ordered_unit)
-                        # if factor > 0:
-                        #    item.unit_price_at_order = item.product.selling_price / factor
-                        
-                        item.save()
-
-                        # Finansal kaydı oluştur (Borç)
-                        if item.delivered_quantity > 0:
-                            Transaction.objects.create(
-                                dealer=order.dealer,
-                                transaction_type='DEBT',
-                                amount=item.delivered_quantity * item.unit_price_at_order,
-                                description=f"Sipariş #{order.id} - {item.product.name} ({item.delivered_quantity} {item.ordered_unit.name})",
-                                source_id=order.id,
-                                source_model='Order'
-                            )
-
-                # 3. Yeni Eklenen Ürünleri İşle
-                new_p_ids = request.POST.getlist('add_product_id[]')
-                new_qtys = request.POST.getlist('add_qty[]')
-                new_u_ids = request.POST.getlist('add_unit_id[]')
-
-                for p_id, q_raw, u_id in zip(new_p_ids, new_qtys, new_u_ids):
-                    if p_id and q_raw:
-                        q_clean = q_raw.replace(',', '.')
-                        q_val = Decimal(q_clean)
-                        product = Product.objects.get(id=p_id)
-                        unit = Unit.objects.get(id=u_id)
-
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            ordered_quantity=q_val,
-                            delivered_quantity=q_val,
-                            ordered_unit=unit,
-                            unit_price_at_order=product.selling_price
-                        )
-                        # Finansal kayıt... (Buraya da Transaction.create eklenebilir)
-
-                # 4. Durumu Güncelle (CONFIRMED yapıyoruz ki dashboard'da 'Tamamlananlar'a geçsin)
+                            item.ordered_unit = get_unit(unit_id)
+
+                        # bulk_update save() çağırmadığı için çevrimli toplamlar burada hesaplanır
+                        item.refresh_totals()
+                        updated_items.append(item)
+
+                OrderItem.objects.bulk_update(
+                    updated_items,
+                    ['delivered_quantity', 'ordered_quantity', 'ordered_unit', 'base_quantity', 'line_total_amount']
+                )
+
+                # 3. Yeni Eklenen Ürünleri İşle (bayinin fiyat listesinden)
+                price_book = get_price_book(order.dealer_id) if new_rows else {}
+                new_items = []
+                for p_id, q_raw, u_id in new_rows:
+                    q_clean = q_raw.replace(',', '.')
+                    q_val = Decimal(q_clean)
+                    product = product_map.get(int(p_id))
+                    if product is None:
+                        raise Product.DoesNotExist(f"Ürün bulunamadı: {p_id}")
+
+                    new_item = OrderItem(
+                        order=order,
+                        product=product,
+                        ordered_quantity=q_val,
+                        delivered_quantity=q_val,
+                        ordered_unit=get_unit(u_id),
+                        unit_price_at_order=get_unit_price(product, price_book=price_book)
+                    )
+                    new_item.refresh_totals()
+                    new_items.append(new_item)
+
+                OrderItem.objects.bulk_create(new_items)
+
+                # 4. Finansal kayıtlar (Borç): teslim edilen her satır için tek bulk_create.
+                # Tutar, ürün ana birimine çevrilmiş satır toplamıdır (line_total_amount).
+                Transaction.objects.bulk_create([
+                    Transaction(
+                        dealer_id=order.dealer_id,
+                        transaction_type='DEBT',
+                        amount=item.line_total_amount,
+                        description=f"Sipariş #{order.id} - {item.product.name} ({item.delivered_quantity} {item.ordered_unit.name})",
+                        source_id=order.id,
+                        source_model='Order'
+                    )
+                    for item in updated_items + new_items
+                    if item.delivered_quantity > 0 and item.line_total_amount > 0
+                ])
+
+                # 5. Durumu Güncelle (CONFIRMED yapıyoruz ki dashboard'da 'Tamamlananlar'a geçsin)
                 order.status = 'CONFIRMED'
                 order.save()
 
@@ -780,44 +1163,63 @@ def courier_delivery_update(request, pk):
             messages.error(request, f"Hata oluştu: {str(e)}")
 
     # GET Kısmı: Birimlerin gelmesi için ALL_UNITS ekledik
-    all_products = Product.objects.filter(is_active=True)
+    all_products = Product.objects.filter(is_active=True).select_related('unit')
     all_units = Unit.objects.all() 
-    # Tüm birim çevrimlerini çekiyoruz
-    conversions = UnitConversion.objects.all()
     # JS için bir sözlük oluşturuyoruz: { 'kaynak_id-hedef_id': katsayı }
+    # (yalnızca ID'ler okunur; birim nesneleri için ek sorgu yapılmaz)
     conversion_map = {
-        f"{c.source_unit.id}-{c.target_unit.id}": float(c.conversion_factor)
-        for c in conversions
+        f"{source_id}-{target_id}": float(factor)
+        for source_id, target_id, factor in UnitConversion.objects.values_list(
+            'source_unit_id', 'target_unit_id', 'conversion_factor'
+        )
     }
 
 
     context = {
         'order': order,
-        'all_units': Unit.objects.all(),
-        'all_products': Product.objects.filter(is_active=True),
+        'all_products': all_products,
         'all_units': all_units, # Bu satır birimlerin boş gelmesini önler
         'conversion_map': conversion_map, # JS için conversion sözlüğü
     }
     return render(request, 'management/courier_delivery_form.html', context)
 
 
+def courier_or_superuser_required(view_func):
+    """Kurye grubunda olmayan kullanıcıyı ana sayfaya yönlendirir; ETag (304) kontrolünden önce çalışır."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not (request.user.is_superuser or request.user.groups.filter(name='Kurye').exists()):
+            return redirect('management:landing_page')
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def courier_dashboard_etag(request):
+    """Panel yalnızca ilgili siparişler değiştiğinde yeniden üretilir (If-None-Match ile 304)."""
+    # Bekleyen bir mesaj varsa sayfa gösterilmeli; önbellekten dönülmez
+    if len(messages.get_messages(request)):
+        return None
+    summary = Order.objects.filter(status__in=['TESLİMATTA', 'CONFIRMED']).aggregate(
+        last_change=Max('updated_at'), count=Count('id')
+    )
+    last_change = summary['last_change'].timestamp() if summary['last_change'] else 0
+    return f"{request.user.pk}-{summary['count']}-{last_change}"
+
+
 @login_required
+@courier_or_superuser_required
+@condition(etag_func=courier_dashboard_etag)
 def courier_dashboard(request):
-    # Yetki kontrolü
-    is_courier = request.user.groups.filter(name='Kurye').exists()
-    if not (is_courier or request.user.is_superuser):
-        return redirect('management:landing_page')
-
     # 1. BEKLEYENLER: Sadece 'TESLİMATTA' olanlar
     pending_orders = Order.objects.filter(
         status='TESLİMATTA'
-    ).order_by('-order_date')
+    ).select_related('dealer').order_by('-order_date')
 
     # 2. TAMAMLANANLAR: 'CONFIRMED' olan ama henüz fatura kesilmemiş olanlar
     # Fatura kesildikten sonra (Örn: 'INVOICED' statüsü) listeden tamamen kalkabilir
     completed_orders = Order.objects.filter(
         status='CONFIRMED'
-    ).order_by('-order_date')[:20] # Son 20 teslimat
+    ).select_related('dealer').order_by('-order_date')[:20] # Son 20 teslimat
 
     context = {
         'pending_orders': pending_orders,